@@ -3,10 +3,51 @@ Sistema de Análise de CMV - ARV Industrial
 Aplicação Principal Streamlit
 """
 
+import time
+
 import streamlit as st
 import pandas as pd
 from io import BytesIO
 
+from cmv.anomalias import EXECUCAO_ATIPICA, GASTO_ATIPICO, anomalias_agregados
+from cmv.cache import abrir_cache, chave
+from cmv.fila import FilaLeitura
+from cmv.filtros import (
+    agregar_mascara,
+    contar_bits,
+    desempacotar,
+    filtrar_linhas,
+    filtrar_status,
+    indexar_filtros,
+    indexar_status,
+    selecionar_status,
+)
+from cmv.formatacao import (
+    ESTILO_CARDS,
+    formatar_moeda,
+    formatar_moeda_compacto,
+    get_classe_risco,
+    get_cor_risco,
+)
+from cmv.ingestao import IngestaoPlanilha
+from cmv.leitores import TIPOS
+from cmv.limites import aplicar_limites, indexar_execucoes, normalizar_limites
+from cmv.particoes import calcular_particoes, combinar_particoes, particionar
+from cmv.previsao import COLUNAS_PREVISAO, ESTOURO_PREVISTO, prever_agregados, snapshots_anteriores
+from cmv.processamento import CHAVE_OS, LIMITES_PADRAO, PARSERS, classificar_familias, classificar_os
+from cmv.projetos import COLUNAS_PROJETO, SEM_CLIENTE, carregar_projetos, classificar_clientes, enriquecer, versao_projetos
+from cmv.rebalanceamento import COLUNAS_TRANSFERENCIA, propor_transferencias
+from cmv.snapshots import carregar_particao, carregar_validacao, empresas_snapshot, ultimo_snapshot, versao_snapshots
+from cmv.visoes import (
+    assinatura_visao,
+    calcular_visao,
+    carregar_visoes,
+    definir_visao,
+    remover_visao,
+    resultado_precalculado,
+    salvar_visao,
+)
+
 # Configuração da página
 st.set_page_config(
     page_title="Análise de CMV - ARV",
@@ -15,244 +56,31 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS customizado
-st.markdown("""
-<style>
-    .os-header {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        padding: 10px 0;
-    }
-    .os-title {
-        font-size: 20px;
-        font-weight: bold;
-    }
-    .status-badge {
-        display: inline-block;
-        padding: 4px 12px;
-        border-radius: 15px;
-        font-size: 12px;
-        font-weight: bold;
-        margin-left: 10px;
-    }
-    .badge-estourado { background-color: #e74c3c; color: white; }
-    .badge-critico { background-color: #e67e22; color: white; }
-    .badge-atencao { background-color: #f1c40f; color: black; }
-    .badge-ok { background-color: #27ae60; color: white; }
-    .badge-cinza { background-color: #95a5a6; color: white; }
-
-    .metric-row {
-        display: flex;
-        gap: 30px;
-        margin: 10px 0;
-        flex-wrap: wrap;
-    }
-    .metric-item {
-        text-align: center;
-    }
-    .metric-label {
-        font-size: 11px;
-        color: #888;
-        text-transform: uppercase;
-    }
-    .metric-value {
-        font-size: 18px;
-        font-weight: bold;
-    }
-    .metric-value-red { color: #e74c3c; }
-    .metric-value-green { color: #27ae60; }
-
-    .exec-bar-container {
-        background-color: rgba(255,255,255,0.1);
-        border-radius: 5px;
-        height: 12px;
-        margin: 10px 0;
-        overflow: hidden;
-    }
-    .exec-bar {
-        height: 100%;
-        border-radius: 5px;
-        transition: width 0.3s ease;
-    }
+# Ingestão em segundo plano: espera antes do primeiro resumo parcial,
+# intervalo entre atualizações e tamanho da lista de piores OSs
+ESPERA_INICIAL = 0.5
+INTERVALO_ATUALIZACAO = 0.75
+TOP_OSS_PARCIAL = 10
 
-    .familia-row {
-        display: flex;
-        align-items: center;
-        padding: 8px 12px;
-        margin: 4px 0;
-        border-radius: 8px;
-        border-left: 4px solid;
-    }
-    .familia-estourado { background-color: rgba(231, 76, 60, 0.15); border-left-color: #e74c3c; }
-    .familia-critico { background-color: rgba(230, 126, 34, 0.15); border-left-color: #e67e22; }
-    .familia-atencao { background-color: rgba(241, 196, 15, 0.15); border-left-color: #f1c40f; }
-    .familia-ok { background-color: rgba(39, 174, 96, 0.15); border-left-color: #27ae60; }
-    .familia-cinza { background-color: rgba(149, 165, 166, 0.15); border-left-color: #95a5a6; }
-
-    .familia-name {
-        flex: 2;
-        font-weight: 500;
-    }
-    .familia-values {
-        flex: 3;
-        display: flex;
-        gap: 15px;
-        font-size: 13px;
-    }
-    .familia-exec {
-        flex: 1;
-        text-align: right;
-        font-weight: bold;
-    }
+# Linhas exibidas no resumo "o que mudou desde a última exportação"
+TOP_MUDANCAS = 100
 
-    .summary-card {
-        padding: 20px;
-        border-radius: 10px;
-        text-align: center;
-    }
-</style>
-""", unsafe_allow_html=True)
+TODAS_EMPRESAS = "Todas as empresas"
+
+# Abas da análise (só a aberta é montada) e cards de OS por página da lista
+ABA_OS = "🎯 OSs por Execução"
+ABA_FAMILIAS = "📦 Visão por Família"
+ABA_CLIENTES = "👥 Visão por Cliente"
+ABA_EXPORTAR = "📋 Exportar"
+OSS_POR_PAGINA = 100
+
+# CSS customizado (layout dos cards, compartilhado com os relatórios executivos)
+st.markdown(f"<style>{ESTILO_CARDS}</style>", unsafe_allow_html=True)
 
 # =====================================================
 # FUNÇÕES DE PROCESSAMENTO
 # =====================================================
 
-def detectar_formato(df_raw):
-    """Detecta o formato da planilha: 'raw_erp' ou 'comprador'"""
-    first_row = [str(c).strip().upper() for c in df_raw.iloc[0].tolist()]
-    if 'EMPRESA' in first_row or 'NUMERO_SERVICO' in first_row:
-        return 'raw_erp'
-    return 'comprador'
-
-
-def processar_raw_erp(df_raw):
-    """Parser para o formato RAW-ERP (6 colunas com EMPRESA e NUMERO_SERVICO)"""
-    df = df_raw.copy()
-    df.columns = [str(c).strip().upper() for c in df.iloc[0]]
-    df = df.iloc[1:].reset_index(drop=True)
-
-    df = df.rename(columns={
-        'NUMERO_SERVICO': 'OS',
-        'VALORTOTALCOMPRADO': 'REALIZADO'
-    })
-
-    df = df[['OS', 'FAMILIA', 'PREVISTO', 'REALIZADO', 'SALDO']].copy()
-
-    df = df[df['OS'].notna()].copy()
-
-    for col in ['PREVISTO', 'REALIZADO', 'SALDO']:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-    df['OS'] = df['OS'].astype(str).str.strip()
-    df['FAMILIA'] = df['FAMILIA'].astype(str).str.strip()
-
-    return df
-
-
-def processar_planilha(uploaded_file):
-    """Pipeline de processamento da planilha"""
-    df_raw = pd.read_excel(uploaded_file, header=None)
-
-    formato = detectar_formato(df_raw)
-
-    if formato == 'raw_erp':
-        st.info("ℹ️ Formato detectado: **RAW-ERP** (exportação direta do sistema)")
-        return processar_raw_erp(df_raw)
-
-    st.info("ℹ️ Formato detectado: **Planilha Formatada** (layout padrão comprador)")
-
-    header_row = None
-    for idx in range(min(10, len(df_raw))):
-        first_cell = str(df_raw.iloc[idx, 0]).strip().upper()
-        if first_cell in ['O_S', 'OS', 'O.S.', 'O.S']:
-            header_row = idx
-            break
-
-    if header_row is None:
-        st.error("❌ Não foi possível identificar o cabeçalho.")
-        return None
-
-    df = df_raw.iloc[header_row + 1:].copy()
-    df.columns = ['OS', 'FAMILIA', 'PREVISTO', 'REALIZADO', 'SALDO']
-    df = df.reset_index(drop=True)
-
-    df = df[df['OS'].notna()].copy()
-    df = df[~df['OS'].astype(str).str.upper().isin(['O_S', 'OS', 'O.S.', 'O.S'])].copy()
-
-    for col in ['PREVISTO', 'REALIZADO', 'SALDO']:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-    df['OS'] = df['OS'].astype(str).str.strip()
-    df['FAMILIA'] = df['FAMILIA'].astype(str).str.strip()
-
-    return df
-
-def agregar_por_os(df):
-    """Agrega dados por OS"""
-    return df.groupby('OS').agg({
-        'PREVISTO': 'sum',
-        'REALIZADO': 'sum',
-        'SALDO': 'sum'
-    }).reset_index()
-
-def classificar_risco(previsto, realizado):
-    """Classifica o risco baseado na execução"""
-    if previsto == 0:
-        if realizado > 0:
-            return 'CRÍTICO'
-        return 'SEM ORÇAMENTO'
-
-    exec_pct = (realizado / previsto) * 100
-
-    if exec_pct > 100:
-        return 'ESTOURADO'
-    elif exec_pct >= 90:
-        return 'CRÍTICO'
-    elif exec_pct >= 70:
-        return 'ATENÇÃO'
-    else:
-        return 'OK'
-
-def get_cor_risco(risco):
-    """Retorna cor baseada no risco"""
-    cores = {
-        'OK': '#27ae60',
-        'ATENÇÃO': '#f1c40f',
-        'CRÍTICO': '#e67e22',
-        'ESTOURADO': '#e74c3c',
-        'SEM ORÇAMENTO': '#95a5a6'
-    }
-    return cores.get(risco, '#95a5a6')
-
-def get_classe_risco(risco):
-    """Retorna classe CSS baseada no risco"""
-    classes = {
-        'OK': 'ok',
-        'ATENÇÃO': 'atencao',
-        'CRÍTICO': 'critico',
-        'ESTOURADO': 'estourado',
-        'SEM ORÇAMENTO': 'cinza'
-    }
-    return classes.get(risco, 'cinza')
-
-def formatar_moeda(valor):
-    """Formata valor para padrão brasileiro"""
-    if pd.isna(valor):
-        return "R$ 0,00"
-    return f"R$ {valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-
-def formatar_moeda_compacto(valor):
-    """Formata valor de forma compacta"""
-    if pd.isna(valor) or valor == 0:
-        return "R$ 0"
-    if abs(valor) >= 1_000_000:
-        milhoes = f"{valor/1_000_000:.1f}".replace(".", ",")
-        return f"R$ {milhoes}M"
-    if abs(valor) >= 1_000:
-        return f"R$ {valor/1_000:.0f}K"
-    return f"R$ {valor:.0f}"
-
 def criar_excel_download(df):
     """Cria arquivo Excel para download"""
     output = BytesIO()
@@ -260,23 +88,51 @@ def criar_excel_download(df):
         df.to_excel(writer, index=False, sheet_name='Dados')
     return output.getvalue()
 
-def render_os_card(os_num, df_os_row, df_familias):
-    """Renderiza um card de OS com expander para famílias"""
+def descrever_previsao(linha):
+    """Tendência de consumo e datas projetadas de uma OS/família (None sem previsão)"""
+    if pd.isna(linha.get('TENDENCIA_DIA', float('nan'))):
+        return None
+    partes = [f"📈 Tendência: {formatar_moeda(linha['TENDENCIA_DIA'])}/dia ({linha['PONTOS']:.0f} exportações)"]
+    for marco, rotulo in [('DATA_90', '90%'), ('DATA_100', '100%')]:
+        if pd.notna(linha[marco]):
+            partes.append(f"{rotulo} do previsto em {linha[marco]:%d/%m/%Y}")
+    if linha['PREVISAO'] == ESTOURO_PREVISTO:
+        partes.append(f"**{ESTOURO_PREVISTO}**")
+    return " · ".join(partes)
+
+def marcar_estouro_previsto(linha):
+    """Selo HTML da linha de família com estouro previsto no horizonte ('' se não houver)"""
+    if linha.get('PREVISAO', '') != ESTOURO_PREVISTO:
+        return ''
+    return f'<span class="metric-value-red">📈 100% em {linha["DATA_100"]:%d/%m/%Y}</span>'
+
+def marcar_anomalia(linha):
+    """Selo HTML da linha com gasto atípico para a família ('' se não houver)"""
+    anomalia = linha.get('ANOMALIA', '')
+    if not anomalia:
+        return ''
+    if EXECUCAO_ATIPICA in anomalia:
+        alvo = "execução e gasto atípicos" if GASTO_ATIPICO in anomalia else "execução atípica"
+        texto = f"🔍 {alvo} (mediana da família: {linha['EXEC_MEDIANA_%']:.0f}%)"
+    else:
+        texto = "🔍 gasto atípico para a família"
+    return f'<span class="metric-value-red">{texto}</span>'
+
+def render_os_card(os_num, df_os_row, familias, empresa=None, chave=None, remanejamento=None):
+    """
+    Renderiza um card de OS com expander para famílias (empresa no título em visões multiempresa).
+    Com `chave`, o breakdown só é montado com o card aberto; `familias` devolve as linhas da OS
+    e `remanejamento`, as transferências sugeridas para ela.
+    """
 
     previsto = df_os_row['PREVISTO']
     realizado = df_os_row['REALIZADO']
     saldo = df_os_row['SALDO']
     exec_pct = (realizado / previsto * 100) if previsto > 0 else 0
-    risco = classificar_risco(previsto, realizado)
+    risco = df_os_row['RISCO']
     cor = get_cor_risco(risco)
     classe = get_classe_risco(risco)
 
-    # Contagem de famílias por status
-    fam_status = {}
-    for _, fam in df_familias.iterrows():
-        fam_risco = classificar_risco(fam['PREVISTO'], fam['REALIZADO'])
-        fam_status[fam_risco] = fam_status.get(fam_risco, 0) + 1
-
     # Emoji indicador
     emoji_risco = {'ESTOURADO': '🔴', 'CRÍTICO': '🟠', 'ATENÇÃO': '🟡', 'OK': '🟢'}.get(risco, '⚪')
 
@@ -285,12 +141,26 @@ def render_os_card(os_num, df_os_row, df_familias):
     previsto_label = formatar_moeda_compacto(previsto).replace("R$", r"R\$")
     realizado_label = formatar_moeda_compacto(realizado).replace("R$", r"R\$")
     saldo_label = formatar_moeda_compacto(saldo).replace("R$", r"R\$")
+    cliente = df_os_row.get('CLIENTE', SEM_CLIENTE)
     titulo = (
-        f"{emoji_risco} OS {os_num} • {risco} • "
+        f"{emoji_risco} OS {os_num}{f' ({empresa})' if empresa else ''}"
+        f"{f' • {cliente}' if cliente != SEM_CLIENTE else ''} • {risco} • "
         f"{previsto_label} → {realizado_label} • Saldo: {saldo_label} • {exec_pct:.0f}%"
     )
+    if df_os_row.get('PREVISAO', '') == ESTOURO_PREVISTO:
+        titulo += f" • 📈 estoura em {df_os_row['DATA_100']:%d/%m/%Y}"
+    if df_os_row.get('ANOMALIAS', 0) > 0:
+        titulo += f" • 🔍 {df_os_row['ANOMALIAS']:.0f} família(s) atípica(s)"
 
-    with st.expander(titulo, expanded=False):
+    card = st.expander(titulo, expanded=False, key=chave, on_change="rerun" if chave else "ignore")
+    if card.open is False:
+        return
+
+    # Contagem de famílias por status (RISCO já calculado com os limites configurados)
+    df_familias = familias()
+    fam_status = df_familias['RISCO'].value_counts()
+
+    with card:
         # Header com métricas principais
         st.markdown(f"""
         <div class="metric-row">
@@ -320,6 +190,9 @@ def render_os_card(os_num, df_os_row, df_familias):
             <div class="exec-bar" style="width: {bar_width}%; background-color: {cor};"></div>
         </div>
         """, unsafe_allow_html=True)
+        previsao = descrever_previsao(df_os_row)
+        if previsao:
+            st.caption(previsao)
 
         # Resumo de status das famílias
         st.markdown("#### 📦 Breakdown por Família")
@@ -348,7 +221,7 @@ def render_os_card(os_num, df_os_row, df_familias):
             fam_real = fam['REALIZADO']
             fam_saldo = fam['SALDO']
             fam_exec = fam['EXEC_%']
-            fam_risco = classificar_risco(fam_prev, fam_real)
+            fam_risco = fam['RISCO']
             fam_classe = get_classe_risco(fam_risco)
             fam_cor = get_cor_risco(fam_risco)
 
@@ -361,295 +234,924 @@ def render_os_card(os_num, df_os_row, df_familias):
                     <span>Prev: {formatar_moeda(fam_prev)}</span>
                     <span>Real: {formatar_moeda(fam_real)}</span>
                     <span class="{saldo_class}">Saldo: {formatar_moeda(fam_saldo)}</span>
+                    {marcar_estouro_previsto(fam)}{marcar_anomalia(fam)}
                 </div>
                 <div class="familia-exec" style="color: {fam_cor}">{fam_exec:.0f}%</div>
             </div>
             """, unsafe_allow_html=True)
 
-# =====================================================
-# INTERFACE PRINCIPAL
-# =====================================================
-
-st.title("📊 Análise de CMV - ARV Industrial")
-
-# Sidebar
-with st.sidebar:
-    st.header("⚙️ Configurações")
-    uploaded_file = st.file_uploader(
-        "Carregar Planilha CMV",
-        type=["xlsx", "xls"],
-        help="Aceita dois formatos: Planilha Formatada (O_S | FAMILIA | PREVISTO | REALIZADO | SALDO) ou RAW-ERP (EMPRESA | NUMERO_SERVICO | FAMILIA | PREVISTO | VALORTOTALCOMPRADO | SALDO)"
-    )
-    st.markdown("---")
-
-if uploaded_file is not None:
-    with st.spinner("Processando..."):
-        df = processar_planilha(uploaded_file)
-
-    if df is not None:
-        # Filtros na sidebar
-        with st.sidebar:
-            st.header("🔍 Filtros")
-
-            def limpar_filtros():
-                st.session_state["filtro_status"] = []
-                st.session_state["os_selecionadas"] = []
-                st.session_state["familias_selecionadas"] = []
-                st.session_state["busca_os"] = ""
-
-            st.button("Limpar filtros", on_click=limpar_filtros, use_container_width=True)
-
-            filtro_status = st.multiselect(
-                "Status",
-                options=['ESTOURADO', 'CRÍTICO', 'ATENÇÃO', 'OK', 'SEM ORÇAMENTO'],
-                key="filtro_status",
-                help="Filtrar por classificação de risco"
-            )
-
-            os_list = sorted(df['OS'].unique().tolist())
-            busca_os = st.text_input(
-                "Buscar OS",
-                key="busca_os",
-                placeholder="Ex: 3185",
-                help="Filtra as opções de OS pelo texto digitado"
+        df_transferencias = remanejamento() if remanejamento else None
+        if df_transferencias is not None and len(df_transferencias):
+            st.markdown("#### 🔁 Remanejamento sugerido")
+            total = df_transferencias['VALOR'].sum()
+            st.caption(
+                f"{len(df_transferencias)} transferência(s), {formatar_moeda(total)} no total: as famílias "
+                "de origem continuam abaixo de ATENÇÃO e as de destino voltam ao limite de ESTOURADO."
             )
-            if busca_os:
-                busca = busca_os.strip().lower()
-                os_list_filtrada = [os for os in os_list if busca in str(os).lower()]
-            else:
-                os_list_filtrada = os_list
-            os_list_filtrada = sorted(set(os_list_filtrada + st.session_state.get("os_selecionadas", [])))
-            os_selecionadas = st.multiselect("Ordem de Serviço", options=os_list_filtrada, key="os_selecionadas")
-
-            familias_list = sorted(df['FAMILIA'].unique().tolist())
-            familias_selecionadas = st.multiselect("Família", options=familias_list, key="familias_selecionadas")
-
-        # Aplicar filtros
-        df_filtrado = df.copy()
-        if os_selecionadas:
-            df_filtrado = df_filtrado[df_filtrado['OS'].isin(os_selecionadas)]
-        if familias_selecionadas:
-            df_filtrado = df_filtrado[df_filtrado['FAMILIA'].isin(familias_selecionadas)]
-
-        if len(df_filtrado) == 0:
-            st.warning(
-                "Nenhum dado encontrado com os filtros atuais. "
-                "Dica: limpe os filtros ou remova algum critério para voltar a ver resultados."
-            )
-            st.stop()
-
-        # Agregar por OS
-        df_os = agregar_por_os(df_filtrado)
-        df_os['EXECUCAO_%'] = (df_os['REALIZADO'] / df_os['PREVISTO'].replace(0, float('nan')) * 100).fillna(0)
-        df_os['RISCO'] = df_os.apply(lambda row: classificar_risco(row['PREVISTO'], row['REALIZADO']), axis=1)
+            for _, transferencia in df_transferencias.iterrows():
+                st.markdown(
+                    f"- {transferencia['ORIGEM']} → **{transferencia['DESTINO']}**: "
+                    f"{formatar_moeda(transferencia['VALOR'])}"
+                )
 
-        # Aplicar filtro de status
-        if filtro_status:
-            df_os = df_os[df_os['RISCO'].isin(filtro_status)]
+@st.cache_resource(show_spinner=False)
+def obter_cache():
+    """Cache compartilhado entre réplicas (CMV_CACHE), aberto uma vez por processo"""
+    return abrir_cache()
+
+@st.cache_resource(show_spinner=False)
+def obter_fila():
+    """Pool de leitura de uploads (um processo por núcleo), compartilhado por todas as sessões"""
+    return FilaLeitura()
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def carregar_particao_cache(hash_arquivo, empresa):
+    """Partição (empresa) de um snapshot mantida em memória (compartilhada entre sessões)"""
+    return carregar_particao(hash_arquivo, empresa)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def carregar_validacao_cache(hash_arquivo):
+    """Resultado da validação gravado no snapshot"""
+    return carregar_validacao(hash_arquivo)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def combinar_particoes_cache(hash_arquivo, empresas, _particoes):
+    """Visão das empresas selecionadas: uma por arquivo e seleção (compartilhada entre sessões)"""
+    return combinar_particoes(_particoes)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def indices_execucao_cache(hash_arquivo, empresas, _agregados):
+    """Execuções ordenadas da visão (uma vez por arquivo e seleção) para reclassificar por busca binária"""
+    return indexar_execucoes(_agregados)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def indices_filtro_cache(hash_arquivo, empresas, versao, _agregados):
+    """Bitmaps das colunas filtráveis (OS, família, cliente) da visão, um por arquivo e seleção"""
+    return indexar_filtros(_agregados)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def indice_status_cache(hash_arquivo, empresas, versao, anteriores, limites, _por_os):
+    """Bitset das OSs de cada status (e do estouro previsto), um por visão e limites"""
+    return indexar_status(_por_os, {ESTOURO_PREVISTO: 'PREVISAO'})
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def projetos_cache(versao):
+    """Cadastro de projetos (CMV_PROJETOS) em memória, recarregado a cada importação"""
+    return carregar_projetos()
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def enriquecer_cache(hash_arquivo, empresas, versao, _agregados):
+    """Linhas e OSs com CLIENTE/PROPOSTA do cadastro de projetos"""
+    projetos = projetos_cache(versao)
+    return {
+        **_agregados,
+        'dados': enriquecer(_agregados['dados'], projetos),
+        'por_os': enriquecer(_agregados['por_os'], projetos),
+    }
 
-        # Ordenar por execução
-        df_os = df_os.sort_values('EXECUCAO_%', ascending=False)
+@st.cache_resource(show_spinner=False, max_entries=8)
+def snapshots_anteriores_cache(hash_arquivo, versao):
+    """Exportações anteriores à atual para o ajuste de tendência (relido a cada snapshot gravado)"""
+    return snapshots_anteriores(hash_arquivo)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def anomalias_cache(hash_arquivo, empresas, _agregados):
+    """Linhas com o escore de gasto atípico dentro da família e a contagem por OS"""
+    return anomalias_agregados(_agregados)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def previsao_cache(hash_arquivo, empresas, versao, anteriores, _data_atual, _agregados):
+    """OSs e linhas com a tendência de consumo e as datas projetadas de 90%/100% do previsto"""
+    return prever_agregados(_agregados, _data_atual, anteriores, empresas)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def remanejamento_cache(hash_arquivo, empresas, limites, excecoes, _dados):
+    """Transferências sugeridas entre famílias de cada OS, com as posições por OS para os cards"""
+    remanejamento = propor_transferencias(_dados, limites, excecoes)
+    remanejamento['por_chave'] = remanejamento['transferencias'].groupby(CHAVE_OS, sort=False).indices
+    return remanejamento
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def visao_cache(hash_arquivo, empresas, versao, anteriores, assinatura, _visao, _agregados):
+    """Resultado de uma visão salva: o pré-calculado pelo monitor ou, sem ele, calculado uma vez por processo"""
+    contexto = {'projetos': versao, 'anteriores': list(anteriores)}
+    resultado = resultado_precalculado(hash_arquivo, _visao, contexto)
+    return resultado if resultado is not None else calcular_visao(_agregados, _visao)
+
+def particoes_do_upload(ingestao):
+    """
+    Agregados por empresa do upload (uma vez por arquivo), calculados em paralelo e de forma
+    incremental sobre as partições do último snapshot. Retorna (partições, origem da base).
+    Os agregados vão para o cache compartilhado, por arquivo e snapshot base: outra réplica
+    que receba o mesmo arquivo só refaz a separação das linhas por empresa.
+    """
+    if st.session_state.get("particoes_hash") != ingestao.hash:
+        base_origem = None
+        ultimo = ultimo_snapshot()
+        if ultimo is not None and ultimo['hash'] == ingestao.hash:
+            particoes = {e: carregar_particao_cache(ultimo['hash'], e) for e in empresas_snapshot(ultimo)}
+            base_origem = ultimo.get('base_origem')
+        else:
+            cache = obter_cache()
+            chave_particoes = chave('particoes', ingestao.hash, ultimo['hash'] if ultimo else '-')
+            salvo = cache.obter(chave_particoes)
+            if salvo is not None:
+                dados = particionar(ingestao.resultado())
+                particoes = {e: dict(agregados, dados=dados[e]) for e, agregados in salvo.items()}
+            elif ultimo is not None:
+                bases = {e: carregar_particao_cache(ultimo['hash'], e) for e in empresas_snapshot(ultimo)}
+                particoes = calcular_particoes(ingestao.resultado(), bases)
+            else:
+                particoes = calcular_particoes(ingestao.resultado())
+            if salvo is None:
+                cache.guardar(chave_particoes, {
+                    e: {nome: tabela for nome, tabela in p.items() if nome != 'dados'}
+                    for e, p in particoes.items()
+                })
+            if ultimo is not None:
+                base_origem = ultimo['origem']
+        st.session_state["particoes"] = (particoes, base_origem)
+        st.session_state["particoes_hash"] = ingestao.hash
+    return st.session_state["particoes"]
+
+def selecionar_empresas(empresas):
+    """Filtro de empresa na sidebar (só em exportações multiempresa); retorna as empresas selecionadas"""
+    if len(empresas) <= 1:
+        return empresas
+    opcoes = [TODAS_EMPRESAS] + empresas
+    if st.session_state.get("empresa") not in opcoes:
+        st.session_state["empresa"] = TODAS_EMPRESAS
+    empresa = st.selectbox(
+        "🏢 Empresa",
+        options=opcoes,
+        key="empresa",
+        help="Cada empresa é analisada separadamente (números de OS podem se repetir entre empresas)"
+    )
+    return empresas if empresa == TODAS_EMPRESAS else [empresa]
+
+def aplicar_visao(visao):
+    """Leva os filtros da visão para os widgets da sidebar"""
+    st.session_state["empresa"] = visao.get('empresa') or TODAS_EMPRESAS
+    st.session_state["filtro_status"] = list(visao['status'])
+    st.session_state["os_selecionadas"] = list(visao['os'])
+    st.session_state["familias_selecionadas"] = list(visao['familias'])
+    st.session_state["clientes_selecionados"] = list(visao['clientes'])
+    st.session_state["busca_os"] = ""
+
+def visao_da_sessao():
+    """Filtros atuais da sidebar como visão"""
+    empresa = st.session_state.get("empresa", TODAS_EMPRESAS)
+    return definir_visao(
+        None if empresa == TODAS_EMPRESAS else empresa,
+        st.session_state.get("filtro_status", []),
+        st.session_state.get("os_selecionadas", []),
+        st.session_state.get("familias_selecionadas", []),
+        st.session_state.get("clientes_selecionados", []),
+    )
 
-        # Contadores totais
-        df_os_total = agregar_por_os(df)
-        df_os_total['RISCO'] = df_os_total.apply(lambda row: classificar_risco(row['PREVISTO'], row['REALIZADO']), axis=1)
+def abrir_visao_da_url(visoes):
+    """`?visao=<nome>`: aplica os filtros da visão uma vez (depois os widgets mandam)"""
+    nome = st.query_params.get("visao")
+    if nome in visoes and st.session_state.get("visao_aberta") != nome:
+        aplicar_visao(visoes[nome])
+        st.session_state["visao_aberta"] = nome
+
+def fechar_visao():
+    st.session_state["visao_aberta"] = None
+    st.query_params.pop("visao", None)
+
+def selecionar_visao(visoes):
+    """Seletor de visões salvas na sidebar; retorna o nome da visão aberta (None se nenhuma)"""
+    aberta = st.session_state.get("visao_aberta")
+    # Filtros mudados à mão: a visão deixa de valer e sai da URL
+    if aberta is not None and (aberta not in visoes
+                               or assinatura_visao(visoes[aberta]) != assinatura_visao(visao_da_sessao())):
+        fechar_visao()
+        aberta = None
+    st.session_state["visao_escolhida"] = aberta or ""
+
+    def abrir():
+        nome = st.session_state["visao_escolhida"]
+        if not nome:
+            fechar_visao()
+            return
+        aplicar_visao(visoes[nome])
+        st.session_state["visao_aberta"] = nome
+        st.query_params["visao"] = nome
+
+    st.selectbox(
+        "⭐ Visão salva",
+        options=[""] + sorted(visoes),
+        key="visao_escolhida",
+        on_change=abrir,
+        format_func=lambda nome: nome or "—",
+        help="Combinações de filtros salvas, pré-calculadas a cada exportação (link: ?visao=<nome>)"
+    )
+    return aberta
+
+def gerenciar_visoes(aberta):
+    """Salvar os filtros atuais como visão e excluir a visão aberta"""
+    with st.expander("⭐ Salvar visão"):
+        nome = st.text_input("Nome", key="nome_visao", placeholder="Ex: Estouradas da manhã").strip()
+        if st.button("Salvar filtros atuais", disabled=not nome, width="stretch"):
+            salvar_visao(nome, visao_da_sessao())
+            st.session_state["visao_aberta"] = nome
+            st.query_params["visao"] = nome
+            st.rerun()
+        if aberta is not None and st.button(f"Excluir a visão “{aberta}”", width="stretch"):
+            remover_visao(aberta)
+            fechar_visao()
+            st.rerun()
+
+def configurar_limites(familias):
+    """
+    Limites de risco na sidebar: gerais (sliders) e exceções por família (tabela editável).
+    Retorna (limites, exceções por família).
+    """
+    with st.expander("🎚️ Limites de risco"):
+        atencao, critico = st.slider(
+            "Atenção / Crítico a partir de (%)",
+            min_value=0, max_value=200, step=5,
+            value=(int(LIMITES_PADRAO['ATENÇÃO']), int(LIMITES_PADRAO['CRÍTICO'])),
+            key="limites_atencao_critico"
+        )
+        estourado = st.slider(
+            "Estourado acima de (%)",
+            min_value=0, max_value=300, step=5,
+            value=int(LIMITES_PADRAO['ESTOURADO']),
+            key="limite_estourado"
+        )
+        limites = normalizar_limites({'ATENÇÃO': atencao, 'CRÍTICO': critico, 'ESTOURADO': estourado})
+
+        st.caption("Exceções por família (campos vazios usam os limites gerais)")
+        df_excecoes = st.data_editor(
+            pd.DataFrame({'FAMILIA': pd.Series(dtype=object),
+                          **{status: pd.Series(dtype=float) for status in LIMITES_PADRAO}}),
+            num_rows="dynamic",
+            hide_index=True,
+            column_config={
+                'FAMILIA': st.column_config.SelectboxColumn("Família", options=familias, required=True),
+                **{status: st.column_config.NumberColumn(status.title(), min_value=0, max_value=1000, step=5)
+                   for status in LIMITES_PADRAO},
+            },
+            key="limites_familias"
+        )
+
+    excecoes = {}
+    for registro in df_excecoes.dropna(subset=['FAMILIA']).to_dict('records'):
+        proprios = {status: registro[status] for status in LIMITES_PADRAO if pd.notna(registro[status])}
+        excecoes[registro['FAMILIA']] = normalizar_limites(proprios, base=limites)
+    return limites, excecoes
+
+def render_metricas(df_os):
+    """Renderiza as métricas de totais (previsto, realizado, saldo, execução)"""
+    total_previsto = df_os['PREVISTO'].sum()
+    total_realizado = df_os['REALIZADO'].sum()
+    total_saldo = df_os['SALDO'].sum()
+    exec_geral = (total_realizado / total_previsto * 100) if total_previsto > 0 else 0
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("💰 Previsto", formatar_moeda_compacto(total_previsto))
+    with col2:
+        st.metric("💸 Realizado", formatar_moeda_compacto(total_realizado))
+    with col3:
+        st.metric("📊 Saldo", formatar_moeda_compacto(total_saldo),
+                 delta="Negativo!" if total_saldo < 0 else None,
+                 delta_color="inverse" if total_saldo < 0 else "normal")
+    with col4:
+        st.metric("📈 Execução", f"{exec_geral:.1f}%")
+
+def render_status_cards(contagem):
+    """Renderiza os cards de contagem de OSs por status de risco (contagem: status -> nº de OSs)"""
+    n_estourado = contagem.get('ESTOURADO', 0)
+    n_critico = contagem.get('CRÍTICO', 0)
+    n_atencao = contagem.get('ATENÇÃO', 0)
+    n_ok = contagem.get('OK', 0)
+    n_sem_orcamento = contagem.get('SEM ORÇAMENTO', 0)
+
+    st.markdown("### 🚦 Resumo por Status")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown(f"""
+        <div class="summary-card" style="background: linear-gradient(135deg, #e74c3c, #c0392b);">
+            <h1 style="color: white; margin: 0; font-size: 36px;">{n_estourado}</h1>
+            <p style="color: white; margin: 5px 0 0 0; font-weight: bold;">ESTOURADAS</p>
+        </div>
+        """, unsafe_allow_html=True)
+    with col2:
+        st.markdown(f"""
+        <div class="summary-card" style="background: linear-gradient(135deg, #e67e22, #d35400);">
+            <h1 style="color: white; margin: 0; font-size: 36px;">{n_critico}</h1>
+            <p style="color: white; margin: 5px 0 0 0; font-weight: bold;">CRÍTICAS</p>
+        </div>
+        """, unsafe_allow_html=True)
+    with col3:
+        st.markdown(f"""
+        <div class="summary-card" style="background: linear-gradient(135deg, #f1c40f, #f39c12);">
+            <h1 style="color: #333; margin: 0; font-size: 36px;">{n_atencao}</h1>
+            <p style="color: #333; margin: 5px 0 0 0; font-weight: bold;">ATENÇÃO</p>
+        </div>
+        """, unsafe_allow_html=True)
+    with col4:
+        st.markdown(f"""
+        <div class="summary-card" style="background: linear-gradient(135deg, #27ae60, #1e8449);">
+            <h1 style="color: white; margin: 0; font-size: 36px;">{n_ok}</h1>
+            <p style="color: white; margin: 5px 0 0 0; font-weight: bold;">OK</p>
+        </div>
+        """, unsafe_allow_html=True)
 
-        n_estourado = len(df_os_total[df_os_total['RISCO'] == 'ESTOURADO'])
-        n_critico = len(df_os_total[df_os_total['RISCO'] == 'CRÍTICO'])
-        n_atencao = len(df_os_total[df_os_total['RISCO'] == 'ATENÇÃO'])
-        n_ok = len(df_os_total[df_os_total['RISCO'] == 'OK'])
-        n_sem_orcamento = len(df_os_total[df_os_total['RISCO'] == 'SEM ORÇAMENTO'])
+    if n_sem_orcamento > 0:
+        st.caption(f"⚪ Sem orçamento: {n_sem_orcamento}")
 
-        # ===== RESUMO =====
-        st.markdown("---")
+def ocultar_empresa_unica(df):
+    """Remove a coluna EMPRESA quando todas as linhas são da mesma empresa"""
+    return df.drop(columns='EMPRESA') if df['EMPRESA'].nunique() <= 1 else df
 
-        # Métricas
-        total_previsto = df_os['PREVISTO'].sum()
-        total_realizado = df_os['REALIZADO'].sum()
-        total_saldo = df_os['SALDO'].sum()
-        exec_geral = (total_realizado / total_previsto * 100) if total_previsto > 0 else 0
+def render_mudancas(agregados, base_origem=None):
+    """Renderiza o resumo do que mudou em relação à exportação anterior"""
+    resumo = agregados['resumo']
+    titulo = "🔄 O que mudou desde a última exportação"
+    if base_origem:
+        titulo += f" ({base_origem})"
 
+    with st.expander(titulo, expanded=False):
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("💰 Previsto", formatar_moeda_compacto(total_previsto))
+            st.metric("Novas (OS + Família)", resumo['novas'])
         with col2:
-            st.metric("💸 Realizado", formatar_moeda_compacto(total_realizado))
+            st.metric("Alteradas", resumo['alteradas'])
         with col3:
-            st.metric("📊 Saldo", formatar_moeda_compacto(total_saldo),
-                     delta="Negativo!" if total_saldo < 0 else None,
-                     delta_color="inverse" if total_saldo < 0 else "normal")
+            st.metric("Removidas", resumo['removidas'])
         with col4:
-            st.metric("📈 Execução", f"{exec_geral:.1f}%")
+            st.metric("OSs afetadas", resumo['oss_afetadas'])
+
+        transicoes = agregados['transicoes']
+        if len(transicoes) > 0:
+            st.markdown(f"##### 🚦 OSs que mudaram de status ({len(transicoes)})")
+            st.dataframe(ocultar_empresa_unica(transicoes), width="stretch", hide_index=True)
+
+        mudancas = agregados['mudancas']
+        if len(mudancas) > 0:
+            st.markdown(f"##### 📦 Maiores mudanças por OS + Família (Top {min(len(mudancas), TOP_MUDANCAS)})")
+            df_mudancas = mudancas.head(TOP_MUDANCAS)[[
+                'EMPRESA', 'OS', 'FAMILIA', 'MUDANCA', 'REALIZADO_ANTES', 'REALIZADO_DEPOIS', 'DELTA_REALIZADO', 'DELTA_SALDO'
+            ]].copy()
+            for col in ['REALIZADO_ANTES', 'REALIZADO_DEPOIS', 'DELTA_REALIZADO', 'DELTA_SALDO']:
+                df_mudancas[col] = df_mudancas[col].apply(formatar_moeda)
+            st.dataframe(ocultar_empresa_unica(df_mudancas), width="stretch", hide_index=True)
+
+def render_validacao(validacao):
+    """Renderiza as ocorrências das verificações de qualidade dos dados"""
+    resumo = validacao['resumo']
+    if len(resumo) == 0:
+        return
+
+    total = int(resumo['OCORRENCIAS'].sum())
+    with st.expander(f"⚠️ Qualidade dos dados: {total} ocorrência(s) em {len(resumo)} verificação(ões)"):
+        st.dataframe(resumo, width="stretch", hide_index=True)
+        for _, linha in resumo.iterrows():
+            st.markdown(f"**{linha['DESCRICAO']}** — exemplos:")
+            st.dataframe(validacao['amostras'][linha['VERIFICACAO']], width="stretch", hide_index=True)
+
+def render_ingestao_parcial(ingestao):
+    """Renderiza posição na fila, progresso da leitura e resumo com as linhas já processadas"""
+    if ingestao.posicao_fila:
+        st.progress(0, text=f"⏳ Na fila de leitura: posição {ingestao.posicao_fila} "
+                            f"(outros uploads sendo lidos, {obter_fila().workers} por vez)")
+        return
+    progresso = ingestao.progresso
+    texto = f"Processando... {ingestao.linhas_lidas:,} linhas lidas".replace(',', '.')
+    if progresso is not None:
+        st.progress(progresso, text=f"{texto} ({progresso:.0%})")
+    else:
+        st.progress(0, text=texto)
 
-        # Status cards
-        st.markdown("### 🚦 Resumo por Status")
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.markdown(f"""
-            <div class="summary-card" style="background: linear-gradient(135deg, #e74c3c, #c0392b);">
-                <h1 style="color: white; margin: 0; font-size: 36px;">{n_estourado}</h1>
-                <p style="color: white; margin: 5px 0 0 0; font-weight: bold;">ESTOURADAS</p>
-            </div>
-            """, unsafe_allow_html=True)
-        with col2:
-            st.markdown(f"""
-            <div class="summary-card" style="background: linear-gradient(135deg, #e67e22, #d35400);">
-                <h1 style="color: white; margin: 0; font-size: 36px;">{n_critico}</h1>
-                <p style="color: white; margin: 5px 0 0 0; font-weight: bold;">CRÍTICAS</p>
-            </div>
-            """, unsafe_allow_html=True)
-        with col3:
-            st.markdown(f"""
-            <div class="summary-card" style="background: linear-gradient(135deg, #f1c40f, #f39c12);">
-                <h1 style="color: #333; margin: 0; font-size: 36px;">{n_atencao}</h1>
-                <p style="color: #333; margin: 5px 0 0 0; font-weight: bold;">ATENÇÃO</p>
-            </div>
-            """, unsafe_allow_html=True)
-        with col4:
-            st.markdown(f"""
-            <div class="summary-card" style="background: linear-gradient(135deg, #27ae60, #1e8449);">
-                <h1 style="color: white; margin: 0; font-size: 36px;">{n_ok}</h1>
-                <p style="color: white; margin: 5px 0 0 0; font-weight: bold;">OK</p>
-            </div>
-            """, unsafe_allow_html=True)
+    df_parcial = ingestao.resultado()
+    if len(df_parcial) == 0:
+        return
 
-        if n_sem_orcamento > 0:
-            st.caption(f"⚪ Sem orçamento: {n_sem_orcamento}")
-
-        st.markdown("---")
-
-        # ===== ABAS =====
-        tab1, tab2, tab3 = st.tabs(["🎯 OSs por Execução", "📦 Visão por Família", "📋 Exportar"])
-
-        # ===== ABA 1: OSs =====
-        with tab1:
-            st.markdown(f"### 📋 Lista de OSs ({len(df_os)} projetos)")
-            st.caption("Clique em uma OS para ver o breakdown por família. Ordenado por % de execução.")
-
-            if len(df_os) == 0:
-                detalhes = []
-                if filtro_status:
-                    detalhes.append(f"Status: {', '.join(filtro_status)}")
-                if os_selecionadas:
-                    detalhes.append(f"OS: {', '.join(map(str, os_selecionadas[:10]))}{'…' if len(os_selecionadas) > 10 else ''}")
-                if familias_selecionadas:
-                    detalhes.append(f"Família: {', '.join(map(str, familias_selecionadas[:5]))}{'…' if len(familias_selecionadas) > 5 else ''}")
-
-                msg = "Nenhuma OS encontrada com os filtros selecionados."
-                if detalhes:
-                    msg += " (" + " | ".join(detalhes) + ")"
-                msg += " Dica: tente limpar filtros ou remover algum critério."
-                st.warning(msg)
-            else:
-                # Renderizar cards expansíveis
-                for _, os_row in df_os.iterrows():
-                    os_num = os_row['OS']
-                    # Pegar dados das famílias desta OS
-                    df_familias_os = df_filtrado[df_filtrado['OS'] == os_num].copy()
-                    render_os_card(os_num, os_row, df_familias_os)
-
-        # ===== ABA 2: FAMÍLIAS =====
-        with tab2:
-            st.markdown("### 📦 Visão Consolidada por Família")
-
-            # Agregar por família (total)
-            df_familia = df_filtrado.groupby('FAMILIA').agg({
-                'PREVISTO': 'sum',
-                'REALIZADO': 'sum',
-                'SALDO': 'sum'
-            }).reset_index()
-
-            df_familia['EXEC_%'] = (df_familia['REALIZADO'] / df_familia['PREVISTO'].replace(0, float('nan')) * 100).fillna(0)
-            df_familia['RISCO'] = df_familia.apply(lambda row: classificar_risco(row['PREVISTO'], row['REALIZADO']), axis=1)
-            df_familia = df_familia.sort_values('EXEC_%', ascending=False)
-
-            # Mostrar famílias como cards também
-            for _, fam in df_familia.iterrows():
-                fam_nome = fam['FAMILIA']
-                fam_prev = fam['PREVISTO']
-                fam_real = fam['REALIZADO']
-                fam_saldo = fam['SALDO']
-                fam_exec = fam['EXEC_%']
-                fam_risco = fam['RISCO']
-                fam_classe = get_classe_risco(fam_risco)
-                fam_cor = get_cor_risco(fam_risco)
-
-                emoji = {'ESTOURADO': '🔴', 'CRÍTICO': '🟠', 'ATENÇÃO': '🟡', 'OK': '🟢'}.get(fam_risco, '⚪')
-
-                # Quantas OSs usam essa família
-                oss_familia = df_filtrado[df_filtrado['FAMILIA'] == fam_nome]['OS'].nunique()
-
-                with st.expander(f"{emoji} **{fam_nome}** | {fam_risco} | Exec: {fam_exec:.0f}% | {oss_familia} OSs"):
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        st.metric("Previsto", formatar_moeda(fam_prev))
-                    with col2:
-                        st.metric("Realizado", formatar_moeda(fam_real))
-                    with col3:
-                        delta_color = "inverse" if fam_saldo < 0 else "normal"
-                        st.metric("Saldo", formatar_moeda(fam_saldo),
-                                 delta="Negativo" if fam_saldo < 0 else "Positivo",
-                                 delta_color=delta_color)
-                    with col4:
-                        st.metric("Execução", f"{fam_exec:.1f}%")
-
-                    # Mostrar quais OSs usam essa família
-                    st.markdown("##### OSs que usam esta família:")
-                    df_oss_fam = df_filtrado[df_filtrado['FAMILIA'] == fam_nome].copy()
-                    df_oss_fam['EXEC_%'] = (df_oss_fam['REALIZADO'] / df_oss_fam['PREVISTO'].replace(0, float('nan')) * 100).fillna(0)
-                    df_oss_fam = df_oss_fam.sort_values('EXEC_%', ascending=False)
-
-                    for _, row in df_oss_fam.iterrows():
-                        os_risco = classificar_risco(row['PREVISTO'], row['REALIZADO'])
-                        os_classe = get_classe_risco(os_risco)
-                        os_cor = get_cor_risco(os_risco)
-                        os_exec = row['EXEC_%']
-                        saldo_class = 'metric-value-red' if row['SALDO'] < 0 else 'metric-value-green'
-
-                        st.markdown(f"""
-                        <div class="familia-row familia-{os_classe}">
-                            <div class="familia-name">OS {row['OS']}</div>
-                            <div class="familia-values">
-                                <span>Prev: {formatar_moeda(row['PREVISTO'])}</span>
-                                <span>Real: {formatar_moeda(row['REALIZADO'])}</span>
-                                <span class="{saldo_class}">Saldo: {formatar_moeda(row['SALDO'])}</span>
-                            </div>
-                            <div class="familia-exec" style="color: {os_cor}">{os_exec:.0f}%</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-        # ===== ABA 3: EXPORTAR =====
-        with tab3:
-            st.markdown("### 📥 Exportar Dados")
-
-            col1, col2 = st.columns(2)
+    st.caption("⏳ Resultados parciais — a página será atualizada ao fim da leitura.")
+    df_os_parcial = classificar_os(df_parcial)
 
-            with col1:
-                st.markdown("#### Dados Detalhados (OS + Família)")
-                csv1 = df_filtrado.to_csv(index=False, encoding='utf-8-sig')
-                st.download_button(
-                    "📥 Baixar CSV Detalhado",
-                    data=csv1,
-                    file_name="cmv_detalhado.csv",
-                    mime="text/csv"
-                )
+    st.markdown("---")
+    render_metricas(df_os_parcial)
+    render_status_cards(df_os_parcial['RISCO'].value_counts())
+
+    st.markdown(f"### 🎯 Piores OSs até agora (Top {TOP_OSS_PARCIAL})")
+    df_piores = df_os_parcial.sort_values('EXECUCAO_%', ascending=False).head(TOP_OSS_PARCIAL)
+    df_piores = df_piores[['OS', 'RISCO', 'PREVISTO', 'REALIZADO', 'SALDO', 'EXECUCAO_%']].copy()
+    for col in ['PREVISTO', 'REALIZADO', 'SALDO']:
+        df_piores[col] = df_piores[col].apply(formatar_moeda)
+    df_piores['EXECUCAO_%'] = df_piores['EXECUCAO_%'].map(lambda v: f"{v:.1f}%")
+    st.dataframe(df_piores, width="stretch", hide_index=True)
+
+def linhas_filtradas(df):
+    """Linhas que passam nos filtros da sidebar, pela máscara (bitset) guardada na sessão"""
+    mascara = st.session_state.get("filtro_linhas")
+    if mascara is None:
+        return df
+    return df[desempacotar(mascara, len(df))]
+
+@st.fragment
+def render_resumo(df_os, contagem_status, agregados, base_origem):
+    """Métricas, cards de status e mudanças desde a última exportação"""
+    st.markdown("---")
+    render_metricas(df_os)
+    render_status_cards(contagem_status)
+    if 'previsao' in agregados:
+        previsao = agregados['previsao']
+        n_previstas = int((agregados['por_os']['PREVISAO'] == ESTOURO_PREVISTO).sum())
+        st.caption(
+            f"📈 {n_previstas} OS(s) com estouro previsto nos próximos {previsao['horizonte']} dias, "
+            f"pela tendência de consumo de {previsao['pontos']} exportações (referência {previsao['data']:%d/%m/%Y})."
+        )
+    if 'resumo' in agregados:
+        render_mudancas(agregados, base_origem)
+    st.markdown("---")
 
+@st.fragment
+def render_abas(df_os, df, agregados, filtros, limites, excecoes, hash_dataset, multiempresa, remanejamento,
+                df_familia=None):
+    """
+    Abas da análise: trocar de aba reexecuta só este fragmento e monta só a aba aberta.
+    Os fragmentos recebem as linhas do dataset (`df`, compartilhadas) e aplicam a máscara da sessão.
+    `df_familia` é a tabela de famílias já calculada (visão salva).
+    """
+    # Visão por cliente só com o cadastro de projetos carregado
+    rotulos = [ABA_OS, ABA_FAMILIAS] + ([ABA_CLIENTES] if 'CLIENTE' in df else []) + [ABA_EXPORTAR]
+    abas = dict(zip(rotulos, st.tabs(rotulos, key="aba", on_change="rerun")))
+    if abas[ABA_OS].open:
+        with abas[ABA_OS]:
+            render_lista_os(df_os, df, filtros, multiempresa, remanejamento)
+    if abas[ABA_FAMILIAS].open:
+        with abas[ABA_FAMILIAS]:
+            # Agregado pré-calculado (visão salva ou snapshot sem filtro de linhas)
+            tabela = df_familia
+            if tabela is None:
+                if not filtros['OS'] and not filtros['Família'] and not filtros['Cliente'] and 'por_familia' in agregados:
+                    tabela = agregados['por_familia']
+                else:
+                    tabela = classificar_familias(linhas_filtradas(df), limites, excecoes)
+            render_visao_familias(tabela, df, multiempresa)
+    if ABA_CLIENTES in abas and abas[ABA_CLIENTES].open:
+        with abas[ABA_CLIENTES]:
+            render_visao_clientes(df, limites)
+    if abas[ABA_EXPORTAR].open:
+        with abas[ABA_EXPORTAR]:
+            render_exportacao(df_os, df, agregados, limites, excecoes, hash_dataset, remanejamento)
+
+@st.fragment
+def render_lista_os(df_os, df, filtros, multiempresa, remanejamento):
+    """Lista paginada de cards de OS; abrir um card reexecuta só a lista"""
+    st.markdown(f"### 📋 Lista de OSs ({len(df_os)} projetos)")
+    st.caption("Clique em uma OS para ver o breakdown por família. Ordenado por % de execução.")
+
+    if len(df_os) == 0:
+        detalhes = []
+        if filtros['Status']:
+            detalhes.append(f"Status: {', '.join(filtros['Status'])}")
+        if filtros['OS']:
+            detalhes.append(f"OS: {', '.join(map(str, filtros['OS'][:10]))}{'…' if len(filtros['OS']) > 10 else ''}")
+        if filtros['Família']:
+            detalhes.append(f"Família: {', '.join(map(str, filtros['Família'][:5]))}{'…' if len(filtros['Família']) > 5 else ''}")
+        if filtros['Cliente']:
+            detalhes.append(f"Cliente: {', '.join(filtros['Cliente'][:5])}{'…' if len(filtros['Cliente']) > 5 else ''}")
+
+        msg = "Nenhuma OS encontrada com os filtros selecionados."
+        if detalhes:
+            msg += " (" + " | ".join(detalhes) + ")"
+        msg += " Dica: tente limpar filtros ou remover algum critério."
+        st.warning(msg)
+        return
+
+    paginas = -(-len(df_os) // OSS_POR_PAGINA)
+    if paginas > 1:
+        if st.session_state.get("pagina_os", 1) > paginas:
+            st.session_state["pagina_os"] = 1
+        pagina = st.number_input("Página", min_value=1, max_value=paginas, step=1, key="pagina_os")
+    else:
+        pagina = 1
+    inicio = (pagina - 1) * OSS_POR_PAGINA
+    df_pagina = df_os.iloc[inicio:inicio + OSS_POR_PAGINA]
+    if paginas > 1:
+        st.caption(f"OSs {inicio + 1}–{inicio + len(df_pagina)} de {len(df_os)} · página {pagina} de {paginas}")
+
+    # Linhas de cada OS (o número de OS só é único dentro da empresa), lidas só pelos cards abertos
+    df_filtrado = linhas_filtradas(df)
+    linhas_os = df_filtrado.groupby(CHAVE_OS, sort=False).indices
+    transferencias = remanejamento['transferencias']
+    for _, os_row in df_pagina.iterrows():
+        os_num = os_row['OS']
+        empresa = os_row['EMPRESA']
+        posicoes = remanejamento['por_chave'].get((empresa, os_num))
+        render_os_card(
+            os_num, os_row,
+            lambda chave_os=(empresa, os_num): df_filtrado.iloc[linhas_os[chave_os]],
+            empresa if multiempresa else None,
+            chave=f"card_os_{empresa}_{os_num}",
+            remanejamento=None if posicoes is None else lambda p=posicoes: transferencias.iloc[p],
+        )
+
+@st.fragment
+def render_visao_familias(df_familia, df, multiempresa):
+    """Cards por família; as OSs de cada família só são listadas com o card aberto"""
+    st.markdown("### 📦 Visão Consolidada por Família")
+    df_filtrado = linhas_filtradas(df)
+
+    # Quantas OSs usam cada família
+    oss_por_familia = df_filtrado.drop_duplicates(['FAMILIA', *CHAVE_OS])['FAMILIA'].value_counts()
+    # ... e em quantas delas a tendência de consumo projeta estouro no horizonte
+    previstas_por_familia = pd.Series(dtype=int)
+    if 'PREVISAO' in df_filtrado:
+        previstas = df_filtrado[df_filtrado['PREVISAO'] == ESTOURO_PREVISTO]
+        previstas_por_familia = previstas.drop_duplicates(['FAMILIA', *CHAVE_OS])['FAMILIA'].value_counts()
+    # ... e em quantas o gasto foge do normal da família
+    atipicas_por_familia = pd.Series(dtype=int)
+    if 'ANOMALIA' in df_filtrado:
+        atipicas = df_filtrado[df_filtrado['ANOMALIA'] != '']
+        atipicas_por_familia = atipicas.drop_duplicates(['FAMILIA', *CHAVE_OS])['FAMILIA'].value_counts()
+
+    for _, fam in df_familia.iterrows():
+        fam_nome = fam['FAMILIA']
+        fam_prev = fam['PREVISTO']
+        fam_real = fam['REALIZADO']
+        fam_saldo = fam['SALDO']
+        fam_exec = fam['EXEC_%']
+        fam_risco = fam['RISCO']
+
+        emoji = {'ESTOURADO': '🔴', 'CRÍTICO': '🟠', 'ATENÇÃO': '🟡', 'OK': '🟢'}.get(fam_risco, '⚪')
+        oss_familia = oss_por_familia.get(fam_nome, 0)
+        previstas_familia = previstas_por_familia.get(fam_nome, 0)
+        atipicas_familia = atipicas_por_familia.get(fam_nome, 0)
+
+        card = st.expander(
+            f"{emoji} **{fam_nome}** | {fam_risco} | Exec: {fam_exec:.0f}% | {oss_familia} OSs"
+            + (f" | 📈 {previstas_familia} com estouro previsto" if previstas_familia else "")
+            + (f" | 🔍 {atipicas_familia} atípica(s)" if atipicas_familia else ""),
+            key=f"card_familia_{fam_nome}", on_change="rerun",
+        )
+        if not card.open:
+            continue
+        with card:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Previsto", formatar_moeda(fam_prev))
             with col2:
-                st.markdown("#### Resumo por OS")
-                df_export_os = df_os[['OS', 'PREVISTO', 'REALIZADO', 'SALDO', 'EXECUCAO_%', 'RISCO']].copy()
-                csv2 = df_export_os.to_csv(index=False, encoding='utf-8-sig')
-                st.download_button(
-                    "📥 Baixar CSV por OS",
-                    data=csv2,
-                    file_name="cmv_por_os.csv",
-                    mime="text/csv"
-                )
+                st.metric("Realizado", formatar_moeda(fam_real))
+            with col3:
+                delta_color = "inverse" if fam_saldo < 0 else "normal"
+                st.metric("Saldo", formatar_moeda(fam_saldo),
+                         delta="Negativo" if fam_saldo < 0 else "Positivo",
+                         delta_color=delta_color)
+            with col4:
+                st.metric("Execução", f"{fam_exec:.1f}%")
+
+            # Mostrar quais OSs usam essa família
+            st.markdown("##### OSs que usam esta família:")
+            df_oss_fam = df_filtrado[df_filtrado['FAMILIA'] == fam_nome].copy()
+            df_oss_fam['EXEC_%'] = (df_oss_fam['REALIZADO'] / df_oss_fam['PREVISTO'].replace(0, float('nan')) * 100).fillna(0)
+            if 'ANOMALIA' in df_oss_fam:
+                # Atípicas primeiro
+                df_oss_fam = df_oss_fam.assign(_ATIPICA=df_oss_fam['ANOMALIA'] != '')
+                df_oss_fam = df_oss_fam.sort_values(['_ATIPICA', 'EXEC_%'], ascending=False)
+            else:
+                df_oss_fam = df_oss_fam.sort_values('EXEC_%', ascending=False)
+
+            for _, row in df_oss_fam.iterrows():
+                os_risco = row['RISCO']
+                os_classe = get_classe_risco(os_risco)
+                os_cor = get_cor_risco(os_risco)
+                os_exec = row['EXEC_%']
+                saldo_class = 'metric-value-red' if row['SALDO'] < 0 else 'metric-value-green'
+
+                st.markdown(f"""
+                <div class="familia-row familia-{os_classe}">
+                    <div class="familia-name">OS {row['OS']}{f" ({row['EMPRESA']})" if multiempresa else ""}</div>
+                    <div class="familia-values">
+                        <span>Prev: {formatar_moeda(row['PREVISTO'])}</span>
+                        <span>Real: {formatar_moeda(row['REALIZADO'])}</span>
+                        <span class="{saldo_class}">Saldo: {formatar_moeda(row['SALDO'])}</span>
+                        {marcar_estouro_previsto(row)}{marcar_anomalia(row)}
+                    </div>
+                    <div class="familia-exec" style="color: {os_cor}">{os_exec:.0f}%</div>
+                </div>
+                """, unsafe_allow_html=True)
+
+@st.fragment
+def render_visao_clientes(df, limites):
+    """Totais por cliente (cadastro de projetos), do maior para o menor % de execução"""
+    st.markdown("### 👥 Visão Consolidada por Cliente")
+    df_clientes = classificar_clientes(linhas_filtradas(df), limites)
+    st.caption(f"{len(df_clientes)} cliente(s). OSs sem cadastro de projeto aparecem como {SEM_CLIENTE}.")
+
+    df_clientes = df_clientes[['CLIENTE', 'OSS', 'RISCO', 'PREVISTO', 'REALIZADO', 'SALDO', 'EXEC_%']].copy()
+    for col in ['PREVISTO', 'REALIZADO', 'SALDO']:
+        df_clientes[col] = df_clientes[col].apply(formatar_moeda)
+    df_clientes['EXEC_%'] = df_clientes['EXEC_%'].map(lambda v: f"{v:.1f}%")
+    st.dataframe(df_clientes, width="stretch", hide_index=True)
+
+@st.fragment
+def render_exportacao(df_os, df, agregados, limites, excecoes, hash_dataset, remanejamento):
+    """Downloads (CSV gerado só no clique, sem rerun) e relatórios executivos"""
+    st.markdown("### 📥 Exportar Dados")
+    df_filtrado = linhas_filtradas(df)
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("#### Dados Detalhados (OS + Família)")
+        st.download_button(
+            "📥 Baixar CSV Detalhado",
+            data=lambda: df_filtrado.to_csv(index=False, encoding='utf-8-sig'),
+            file_name="cmv_detalhado.csv",
+            mime="text/csv",
+            on_click="ignore"
+        )
+
+    with col2:
+        st.markdown("#### Resumo por OS")
+        colunas_os = ['EMPRESA', 'OS'] + [c for c in COLUNAS_PROJETO if c in df_os] + [
+            'PREVISTO', 'REALIZADO', 'SALDO', 'EXECUCAO_%', 'RISCO'] + [
+            c for c in COLUNAS_PREVISAO + ['ANOMALIAS'] if c in df_os]
+        st.download_button(
+            "📥 Baixar CSV por OS",
+            data=lambda: df_os[colunas_os].to_csv(index=False, encoding='utf-8-sig'),
+            file_name="cmv_por_os.csv",
+            mime="text/csv",
+            on_click="ignore"
+        )
+
+    st.markdown("#### 🔁 Remanejamentos Sugeridos")
+    # Só as OSs da lista (filtros de status/OS/família/cliente)
+    oss_lista = pd.MultiIndex.from_frame(df_os[CHAVE_OS])
+    transferencias = remanejamento['transferencias']
+    transferencias = transferencias[pd.MultiIndex.from_frame(transferencias[CHAVE_OS]).isin(oss_lista)]
+    st.caption(
+        f"{len(transferencias)} transferência(s) de saldo entre famílias da mesma OS, "
+        f"em {transferencias[CHAVE_OS].drop_duplicates().shape[0]} OS(s)."
+    )
+    st.download_button(
+        "📥 Baixar remanejamentos (CSV)",
+        data=lambda: transferencias[COLUNAS_TRANSFERENCIA].to_csv(index=False, encoding='utf-8-sig'),
+        file_name="cmv_remanejamentos.csv",
+        mime="text/csv",
+        on_click="ignore"
+    )
+
+    st.markdown("---")
+    st.markdown("#### 📑 Relatórios Executivos")
+    st.caption(
+        "Um relatório por OS e um da carteira (empresas selecionadas, sem os filtros de OS/família), "
+        "em HTML pronto para imprimir em PDF. OSs sem mudança desde a última geração deste dataset, "
+        "com os mesmos limites, são reaproveitadas."
+    )
+    if st.button("Gerar relatórios", key="gerar_relatorios"):
+        # Import só no uso: pool de processos e templates não pesam na partida do app
+        from cmv.relatorios import empacotar, gerar_relatorios
+
+        with st.spinner("Gerando relatórios..."):
+            resultado = gerar_relatorios(agregados, limites=limites, excecoes=excecoes, hash_dataset=hash_dataset)
+        st.session_state["relatorios"] = (hash_dataset, resultado, empacotar(resultado))
+    if st.session_state.get("relatorios", (None,))[0] == hash_dataset:
+        _, resultado, zip_relatorios = st.session_state["relatorios"]
+        st.caption(f"✅ {resultado['gerados']} relatório(s) gerado(s), {resultado['ignorados']} sem mudança.")
+        st.download_button(
+            "📥 Baixar relatórios (.zip)",
+            data=zip_relatorios,
+            file_name="relatorios_cmv.zip",
+            mime="application/zip",
+            on_click="ignore"
+        )
+
+    st.markdown("---")
+    st.markdown("#### 📋 Preview dos Dados")
+    st.dataframe(df_filtrado.head(100), width="stretch", height=400, hide_index=True)
+
+# =====================================================
+# INTERFACE PRINCIPAL
+# =====================================================
+
+st.title("📊 Análise de CMV - ARV Industrial")
+
+# Sidebar
+with st.sidebar:
+    st.header("⚙️ Configurações")
+    uploaded_file = st.file_uploader(
+        "Carregar Planilha CMV",
+        type=TIPOS,
+        help="Aceita xlsx, xls, xlsb, ods, CSV e Parquet nos formatos Planilha Formatada (O_S | FAMILIA | PREVISTO | REALIZADO | SALDO) ou RAW-ERP (EMPRESA | NUMERO_SERVICO | FAMILIA | PREVISTO | VALORTOTALCOMPRADO | SALDO)"
+    )
+    st.markdown("---")
 
-            st.markdown("---")
-            st.markdown("#### 📋 Preview dos Dados")
-            st.dataframe(df_filtrado.head(100), use_container_width=True, height=400, hide_index=True)
+df = None
+agregados = {}
+hash_dataset = None
+particoes = {}
+base_origem = None
 
+if uploaded_file is not None:
+    # Leitura em segundo plano: uma ingestão por arquivo enviado, reaproveitada nos reruns
+    ingestao = st.session_state.get("ingestao")
+    if ingestao is None or st.session_state.get("ingestao_arquivo") != uploaded_file.file_id:
+        ingestao = IngestaoPlanilha(
+            uploaded_file.getvalue(), uploaded_file.name, cache=obter_cache(), fila=obter_fila()).iniciar()
+        st.session_state["ingestao"] = ingestao
+        st.session_state["ingestao_arquivo"] = uploaded_file.file_id
+
+    if not ingestao.aguardar(timeout=ESPERA_INICIAL):
+        render_ingestao_parcial(ingestao)
+        time.sleep(INTERVALO_ATUALIZACAO)
+        st.rerun()
+
+    if ingestao.erro:
+        st.error(f"❌ {ingestao.erro}")
+    else:
+        st.info(f"ℹ️ Formato detectado: {PARSERS[ingestao.formato]['rotulo']} · leitor: {ingestao.backend}")
+        df_upload = ingestao.resultado()
+        if ingestao.compactado:
+            st.caption(
+                f"🗜️ Arquivo grande: {df_upload['LINHAS'].sum():,} linhas somadas em {len(df_upload):,} pares OS × família durante a leitura."
+                .replace(',', '.')
+            )
+        if ingestao.leitura_compartilhada:
+            st.caption("♻️ O mesmo arquivo já estava sendo lido por outra sessão: a leitura foi compartilhada.")
+        if ingestao.do_cache:
+            st.caption("♻️ Leitura reaproveitada do cache compartilhado (arquivo já processado por outra sessão).")
+        render_validacao(ingestao.validacao)
+        hash_dataset = ingestao.hash
+        particoes, base_origem = particoes_do_upload(ingestao)
+        empresas = sorted(particoes)
 else:
+    # Último dataset pré-processado pelo monitor de pasta (dispensa upload)
+    ultimo = ultimo_snapshot()
+    if ultimo is not None:
+        hash_dataset = ultimo['hash']
+        base_origem = ultimo.get('base_origem')
+        empresas = empresas_snapshot(ultimo)
+        st.info(
+            f"📂 Último dataset processado: **{ultimo['origem']}** ({ultimo['processado_em']}). "
+            "Faça upload para analisar outro arquivo."
+        )
+        validacao = carregar_validacao_cache(hash_dataset)
+        if validacao is not None:
+            render_validacao(validacao)
+
+if hash_dataset is not None:
+    visoes = carregar_visoes()
+    abrir_visao_da_url(visoes)
+    with st.sidebar:
+        empresas_selecionadas = selecionar_empresas(empresas)
+
+    # Só as partições das empresas selecionadas são carregadas/combinadas
+    particoes_selecionadas = {
+        empresa: particoes[empresa] if empresa in particoes else carregar_particao_cache(hash_dataset, empresa)
+        for empresa in empresas_selecionadas
+    }
+    agregados = combinar_particoes_cache(hash_dataset, tuple(empresas_selecionadas), particoes_selecionadas)
+    # Famílias com gasto fora do normal delas nas demais OSs
+    agregados = anomalias_cache(hash_dataset, tuple(empresas_selecionadas), agregados)
+    # Cliente e proposta do cadastro de projetos, quando houver (python -m cmv.projetos projetos.json)
+    versao = versao_projetos()
+    if versao is not None:
+        agregados = enriquecer_cache(hash_dataset, tuple(empresas_selecionadas), versao, agregados)
+    # Estouro previsto pela tendência de consumo nas exportações anteriores (snapshots do monitor)
+    data_atual, anteriores = snapshots_anteriores_cache(hash_dataset, versao_snapshots())
+    if anteriores:
+        agregados = previsao_cache(hash_dataset, tuple(empresas_selecionadas), versao, tuple(anteriores),
+                                   data_atual, agregados)
+    df = agregados['dados']
+    multiempresa = len(empresas_selecionadas) > 1
+
+if df is not None:
+    # Filtros na sidebar
+    with st.sidebar:
+        st.header("🔍 Filtros")
+        visao_aberta = selecionar_visao(visoes)
+
+        def limpar_filtros():
+            st.session_state["filtro_status"] = []
+            st.session_state["os_selecionadas"] = []
+            st.session_state["familias_selecionadas"] = []
+            st.session_state["clientes_selecionados"] = []
+            st.session_state["busca_os"] = ""
+
+        st.button("Limpar filtros", on_click=limpar_filtros, width="stretch")
+
+        opcoes_status = ['ESTOURADO', 'CRÍTICO', 'ATENÇÃO', 'OK', 'SEM ORÇAMENTO']
+        if 'PREVISAO' in agregados['por_os']:
+            opcoes_status.append(ESTOURO_PREVISTO)
+        # Outro dataset pode não ter histórico para a previsão: descarta a seleção que sumiu
+        if ESTOURO_PREVISTO in st.session_state.get("filtro_status", []) and ESTOURO_PREVISTO not in opcoes_status:
+            st.session_state["filtro_status"] = [s for s in st.session_state["filtro_status"] if s != ESTOURO_PREVISTO]
+        filtro_status = st.multiselect(
+            "Status",
+            options=opcoes_status,
+            key="filtro_status",
+            help="Filtrar por classificação de risco (ESTOURO PREVISTO: tendência de consumo das exportações anteriores)"
+        )
+
+        os_list = sorted(df['OS'].unique().tolist())
+        busca_os = st.text_input(
+            "Buscar OS",
+            key="busca_os",
+            placeholder="Ex: 3185",
+            help="Filtra as opções de OS pelo texto digitado"
+        )
+        if busca_os:
+            busca = busca_os.strip().lower()
+            os_list_filtrada = [os for os in os_list if busca in str(os).lower()]
+        else:
+            os_list_filtrada = os_list
+        os_list_filtrada = sorted(set(os_list_filtrada + st.session_state.get("os_selecionadas", [])))
+        os_selecionadas = st.multiselect("Ordem de Serviço", options=os_list_filtrada, key="os_selecionadas")
+
+        familias_list = sorted(set(df['FAMILIA'].unique().tolist() + st.session_state.get("familias_selecionadas", [])))
+        familias_selecionadas = st.multiselect("Família", options=familias_list, key="familias_selecionadas")
+
+        clientes_selecionados = []
+        if 'CLIENTE' in df:
+            clientes_list = sorted(set(df['CLIENTE'].unique().tolist() + st.session_state.get("clientes_selecionados", [])))
+            clientes_selecionados = st.multiselect("Cliente", options=clientes_list, key="clientes_selecionados")
+
+        gerenciar_visoes(visao_aberta)
+        limites, excecoes = configurar_limites(familias_list)
+
+    # Reclassificação pelos limites configurados: busca binária nas execuções ordenadas (sem reagregar)
+    indices = indices_execucao_cache(hash_dataset, tuple(empresas_selecionadas), agregados)
+    indices_filtro = indices_filtro_cache(hash_dataset, tuple(empresas_selecionadas), versao, agregados)
+    agregados = aplicar_limites(agregados, indices, limites, excecoes)
+    df = agregados['dados']
+
+    # Remanejamento entre famílias de cada OS, com as linhas completas (sem os filtros)
+    remanejamento = remanejamento_cache(hash_dataset, tuple(empresas_selecionadas), limites, excecoes, df)
+
+    # Visão salva com os limites padrão: resultado pronto (pré-calculado pelo monitor ou
+    # uma vez por processo), sem filtrar nem agregar
+    resultado_visao = None
+    if visao_aberta is not None and limites == LIMITES_PADRAO and not excecoes:
+        resultado_visao = visao_cache(
+            hash_dataset, tuple(empresas_selecionadas), versao, tuple(meta['hash'] for meta in anteriores),
+            assinatura_visao(visoes[visao_aberta]), visoes[visao_aberta], agregados,
+        )
+
+    # Filtros de linha: OR dos valores escolhidos em cada coluna e AND entre colunas, nos
+    # bitsets do dataset; a sessão guarda só a máscara empacotada (1 bit por linha)
+    if resultado_visao is not None:
+        mascara = resultado_visao['mascara']
+    else:
+        mascara = filtrar_linhas(indices_filtro, {
+            'OS': os_selecionadas, 'FAMILIA': familias_selecionadas, 'CLIENTE': clientes_selecionados,
+        })
+    st.session_state["filtro_linhas"] = mascara
+
+    if mascara is not None and contar_bits(mascara) == 0:
+        st.warning(
+            "Nenhum dado encontrado com os filtros atuais. "
+            "Dica: limpe os filtros ou remova algum critério para voltar a ver resultados."
+        )
+        st.stop()
+
+    # Agregar por OS (usa o agregado pré-calculado do snapshot quando não há filtro de linhas);
+    # com filtro, as linhas da máscara são somadas direto nas posições das OSs
+    if resultado_visao is not None:
+        df_os = resultado_visao['por_os']
+    else:
+        if mascara is None:
+            df_os = agregados['por_os']
+        else:
+            df_os = agregar_mascara(agregados, indices_filtro, mascara, limites)
+
+        # Aplicar filtro de status: sem filtro de linhas, OR dos bitsets de status guardados
+        # para a visão e os limites; com filtro, o RISCO foi recalculado e o filtro é um isin
+        if filtro_status and mascara is None:
+            indice_status = indice_status_cache(
+                hash_dataset, tuple(empresas_selecionadas), versao, tuple(meta['hash'] for meta in anteriores),
+                limites, df_os,
+            )
+            df_os = df_os[selecionar_status(indice_status, filtro_status)]
+        elif filtro_status:
+            df_os = filtrar_status(df_os, filtro_status, {ESTOURO_PREVISTO: 'PREVISAO'})
+
+        # Ordenar por execução
+        df_os = df_os.sort_values('EXECUCAO_%', ascending=False)
+
+    # Contadores totais
+    contagem_status = indices['por_os'].contar(limites)
+
+    # ===== RESUMO E ABAS =====
+    # Cada bloco é um fragmento: interações dentro dele reexecutam só o próprio bloco,
+    # com os dados recebidos como argumentos no último rerun completo (sidebar/upload)
+    filtros = {'Status': filtro_status, 'OS': os_selecionadas, 'Família': familias_selecionadas,
+               'Cliente': clientes_selecionados}
+    if resultado_visao is not None:
+        contagem_visao = " · ".join(f"{n} {status}" for status, n in resultado_visao['contagem'].items())
+        st.caption(f"⭐ Visão **{visao_aberta}**: {len(df_os)} OS(s){f' ({contagem_visao})' if contagem_visao else ''}")
+    render_resumo(df_os, contagem_status, agregados, base_origem)
+    render_abas(df_os, df, agregados, filtros, limites, excecoes, hash_dataset, multiempresa, remanejamento,
+                resultado_visao['por_familia'] if resultado_visao is not None else None)
+
+elif uploaded_file is None:
     st.info("👆 Faça upload da planilha CMV para começar")
 
     st.markdown("""
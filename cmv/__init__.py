@@ -0,0 +1,4 @@
+"""
+Sistema de Análise de CMV - ARV Industrial
+Módulos de processamento (sem dependência de Streamlit)
+"""
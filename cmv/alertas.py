@@ -0,0 +1,208 @@
+"""
+Alertas de mudança de status entre exportações
+Compara a classificação de risco das duas últimas exportações processadas pelo monitor
+(snapshots em CMV_DADOS) com um único join por (EMPRESA, OS, FAMILIA), somado por OS para
+o nível da OS, e grava as que passaram de OK/ATENÇÃO para CRÍTICO/ESTOURADO numa pasta de
+saída (outbox) para notificação: um CSV com as transições e um JSON com o resumo, gravado
+por último.
+
+Uso (ex.: cron toda manhã, depois do monitor):
+    python -m cmv.alertas --dados data/snapshots --saida data/alertas
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from cmv.limites import normalizar_limites
+from cmv.processamento import (
+    CHAVE_DETALHE,
+    CHAVE_OS,
+    COLUNAS_VALOR,
+    LIMITES_PADRAO,
+    agregar,
+    classificar_riscos,
+    limites_por_familia,
+)
+from cmv.snapshots import DIRETORIO_PADRAO, carregar_particao, data_snapshot, empresas_snapshot, listar_snapshots
+
+PASTA_SAIDA = os.environ.get('CMV_ALERTAS', os.path.join('data', 'alertas'))
+
+# Transições que geram alerta: de um destes status ...
+STATUS_ANTES = ['OK', 'ATENÇÃO']
+# ... para um destes
+STATUS_ALERTA = ['CRÍTICO', 'ESTOURADO']
+
+LADOS = ['_ANTES', '_DEPOIS']
+
+COLUNAS_TRANSICAO = [
+    'NIVEL', 'EMPRESA', 'OS', 'FAMILIA', 'RISCO_ANTES', 'RISCO_DEPOIS',
+    'EXEC_ANTES_%', 'EXEC_DEPOIS_%', 'REALIZADO_ANTES', 'REALIZADO_DEPOIS', 'DELTA_REALIZADO',
+    'SALDO_ANTES', 'SALDO_DEPOIS', 'DELTA_SALDO',
+]
+
+
+def carregar_linhas(meta, diretorio=DIRETORIO_PADRAO):
+    """Linhas (dados) de todas as empresas de um snapshot"""
+    return pd.concat(
+        [carregar_particao(meta['hash'], empresa, diretorio, tabelas=['dados'])['dados']
+         for empresa in empresas_snapshot(meta)],
+        ignore_index=True,
+    )
+
+
+def juntar_exportacoes(dados_antes, dados_depois):
+    """
+    Um join externo por (EMPRESA, OS, FAMILIA) entre as exportações: valores _ANTES e _DEPOIS
+    (0 onde o par não existe) e EXISTE_ANTES/EXISTE_DEPOIS
+    """
+    lados = [
+        agregar(dados, CHAVE_DETALHE)[CHAVE_DETALHE + COLUNAS_VALOR]
+        .rename(columns={col: f'{col}{sufixo}' for col in COLUNAS_VALOR})
+        for dados, sufixo in [(dados_antes, '_ANTES'), (dados_depois, '_DEPOIS')]
+    ]
+    juntos = lados[0].merge(lados[1], on=CHAVE_DETALHE, how='outer')
+    # Somas nunca são NaN: NaN depois do join = par ausente naquela exportação
+    juntos['EXISTE_ANTES'] = juntos['PREVISTO_ANTES'].notna()
+    juntos['EXISTE_DEPOIS'] = juntos['PREVISTO_DEPOIS'].notna()
+    return juntos.fillna({f'{col}{sufixo}': 0.0 for col in COLUNAS_VALOR for sufixo in LADOS})
+
+
+def filtrar_transicoes(tabela, limites, todas=False):
+    """
+    Classifica os dois lados (RISCO e EXEC_% antes/depois) e mantém quem existe nas duas
+    exportações e passou de STATUS_ANTES para STATUS_ALERTA (qualquer mudança, com `todas`)
+    """
+    for sufixo in LADOS:
+        previsto = tabela[f'PREVISTO{sufixo}'].to_numpy(dtype=float)
+        realizado = tabela[f'REALIZADO{sufixo}'].to_numpy(dtype=float)
+        tabela[f'RISCO{sufixo}'] = classificar_riscos(previsto, realizado, limites)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tabela[f'EXEC{sufixo}_%'] = np.where(previsto != 0, realizado / previsto * 100, 0.0)
+
+    nas_duas = (tabela['EXISTE_ANTES'] & tabela['EXISTE_DEPOIS']).to_numpy()
+    if todas:
+        mudou = (tabela['RISCO_ANTES'] != tabela['RISCO_DEPOIS']).to_numpy()
+    else:
+        mudou = (tabela['RISCO_ANTES'].isin(STATUS_ANTES) & tabela['RISCO_DEPOIS'].isin(STATUS_ALERTA)).to_numpy()
+    transicoes = tabela[nas_duas & mudou]
+    return transicoes.assign(
+        DELTA_REALIZADO=transicoes['REALIZADO_DEPOIS'] - transicoes['REALIZADO_ANTES'],
+        DELTA_SALDO=transicoes['SALDO_DEPOIS'] - transicoes['SALDO_ANTES'],
+    )
+
+
+def transicoes_entre(dados_antes, dados_depois, limites=LIMITES_PADRAO, excecoes=None, todas=False):
+    """
+    Transições por OS e por OS × FAMILIA (coluna NIVEL), das maiores variações de realizado
+    para as menores. As OSs saem do mesmo join, somado por OS; as exceções de limite por
+    família valem só no nível OS × FAMILIA.
+    """
+    juntos = juntar_exportacoes(dados_antes, dados_depois)
+    familias = filtrar_transicoes(juntos, limites_por_familia(juntos['FAMILIA'], limites, excecoes), todas)
+
+    colunas = [f'{col}{sufixo}' for col in COLUNAS_VALOR for sufixo in LADOS] + ['EXISTE_ANTES', 'EXISTE_DEPOIS']
+    por_os = juntos.groupby(CHAVE_OS, sort=False)[colunas].sum().reset_index()
+    por_os[['EXISTE_ANTES', 'EXISTE_DEPOIS']] = por_os[['EXISTE_ANTES', 'EXISTE_DEPOIS']] > 0
+    oss = filtrar_transicoes(por_os, limites, todas)
+
+    transicoes = pd.concat([oss.assign(NIVEL='OS'), familias.assign(NIVEL='FAMILIA')], ignore_index=True)
+    transicoes = transicoes.reindex(columns=COLUNAS_TRANSICAO)
+    return transicoes.sort_values(['NIVEL', 'DELTA_REALIZADO'], ascending=[False, False], ignore_index=True)
+
+
+def _gravar(caminho, escrever):
+    """Grava de forma atômica (arquivo temporário + rename): o leitor da outbox nunca vê arquivo pela metade"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix='.tmp')
+    os.close(fd)
+    escrever(tmp)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, caminho)
+
+
+def assinatura_criterio(limites, excecoes=None, todas=False):
+    """Identificador curto dos limites, exceções e `todas`: entra no nome dos arquivos do alerta"""
+    criterio = json.dumps({'limites': limites, 'excecoes': excecoes or {}, 'todas': todas},
+                          ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(criterio.encode('utf-8')).hexdigest()[:8]
+
+
+def gerar_alertas(diretorio=DIRETORIO_PADRAO, saida=PASTA_SAIDA, limites=LIMITES_PADRAO, excecoes=None,
+                  todas=False, forcar=False):
+    """
+    Compara as duas exportações mais recentes e grava <saida>/transicoes_<antes>_<depois>_<critério>.csv
+    e .json (resumo). Retorna o resumo; None com menos de duas exportações. O mesmo par com o
+    mesmo critério (limites, exceções, `todas`) não é gravado de novo, salvo com `forcar`.
+    """
+    metas = listar_snapshots(diretorio)
+    if len(metas) < 2:
+        return None
+    anterior, atual = metas[-2:]
+
+    os.makedirs(saida, exist_ok=True)
+    criterio = assinatura_criterio(limites, excecoes, todas)
+    nome = f"transicoes_{anterior['hash'][:12]}_{atual['hash'][:12]}_{criterio}"
+    caminho_resumo = os.path.join(saida, f'{nome}.json')
+    if os.path.exists(caminho_resumo) and not forcar:
+        with open(caminho_resumo, encoding='utf-8') as f:
+            return json.load(f)
+
+    transicoes = transicoes_entre(carregar_linhas(anterior, diretorio), carregar_linhas(atual, diretorio),
+                                  limites, excecoes, todas)
+    caminho_csv = os.path.join(saida, f'{nome}.csv')
+    # Centavos bastam no alerta, e números curtos deixam o CSV mais rápido de gravar
+    _gravar(caminho_csv, lambda tmp: transicoes.round(2).to_csv(tmp, index=False, encoding='utf-8-sig'))
+
+    contagem = transicoes.groupby(['NIVEL', 'RISCO_DEPOIS']).size()
+    resumo = {
+        'anterior': {'hash': anterior['hash'], 'origem': anterior.get('origem'),
+                     'data': data_snapshot(anterior).isoformat(timespec='seconds')},
+        'atual': {'hash': atual['hash'], 'origem': atual.get('origem'),
+                  'data': data_snapshot(atual).isoformat(timespec='seconds')},
+        'limites': limites,
+        'excecoes': excecoes or {},
+        'todas': todas,
+        'oss': int((transicoes['NIVEL'] == 'OS').sum()),
+        'familias': int((transicoes['NIVEL'] == 'FAMILIA').sum()),
+        'por_status': {f'{nivel} {status}': int(n) for (nivel, status), n in contagem.items()},
+        'arquivo': os.path.basename(caminho_csv),
+    }
+
+    def escrever_resumo(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(resumo, f, ensure_ascii=False, indent=2)
+
+    # O resumo vai por último: a presença do JSON sinaliza o alerta pronto
+    _gravar(caminho_resumo, escrever_resumo)
+    return resumo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Transições de risco (OK/ATENÇÃO → CRÍTICO/ESTOURADO) entre as duas últimas exportações")
+    parser.add_argument('--dados', default=DIRETORIO_PADRAO, help="Diretório de snapshots (padrão: %(default)s)")
+    parser.add_argument('--saida', default=PASTA_SAIDA, help="Pasta de saída dos alertas (padrão: %(default)s)")
+    parser.add_argument('--atencao', type=float, default=LIMITES_PADRAO['ATENÇÃO'])
+    parser.add_argument('--critico', type=float, default=LIMITES_PADRAO['CRÍTICO'])
+    parser.add_argument('--estourado', type=float, default=LIMITES_PADRAO['ESTOURADO'])
+    parser.add_argument('--todas', action='store_true', help="Qualquer mudança de status, não só as que pioraram")
+    parser.add_argument('--forcar', action='store_true', help="Regrava o alerta de um par já comparado")
+    args = parser.parse_args(argv)
+
+    limites = normalizar_limites({'ATENÇÃO': args.atencao, 'CRÍTICO': args.critico, 'ESTOURADO': args.estourado})
+    resumo = gerar_alertas(args.dados, args.saida, limites, todas=args.todas, forcar=args.forcar)
+    if resumo is None:
+        parser.exit(1, "São necessárias ao menos duas exportações processadas.\n")
+    print(f"{resumo['anterior']['origem']} → {resumo['atual']['origem']}: "
+          f"{resumo['oss']} OS(s) e {resumo['familias']} OS × família "
+          f"{'mudaram de status' if args.todas else 'passaram a CRÍTICO/ESTOURADO'}")
+    print(os.path.join(args.saida, resumo['arquivo']))
+
+
+if __name__ == '__main__':
+    main()
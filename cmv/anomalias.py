@@ -0,0 +1,87 @@
+"""
+Gastos atípicos por família
+Compara cada OS × FAMILIA com a mesma família nas demais OSs: mediana e MAD (desvio
+absoluto mediano) da execução (REALIZADO / PREVISTO) e do gasto, por FAMILIA, com
+groupby-transform sobre todas as linhas de uma vez. Escore robusto acima do limiar
+marca a linha como atípica (ex.: família a 300% numa OS e perto de 80% nas outras).
+"""
+
+import numpy as np
+import pandas as pd
+
+from cmv.processamento import CHAVE_DETALHE, CHAVE_OS
+
+# Escore robusto (0,6745 · desvio / MAD) acima do qual a linha é atípica
+LIMIAR_ESCORE = 3.5
+# OSs com a família necessárias para estimar o "normal" dela
+MINIMO_OSS = 5
+
+EXECUCAO_ATIPICA = 'EXECUÇÃO'
+GASTO_ATIPICO = 'GASTO'
+COLUNAS_ANOMALIA = ['EXEC_MEDIANA_%', 'ESCORE_EXEC', 'ESCORE_GASTO', 'ANOMALIA']
+
+
+def escore_robusto(valores, grupos, validos):
+    """
+    Escore robusto de cada linha dentro do seu grupo, com mediana e MAD das linhas
+    válidas (uma por OS × FAMILIA). Sem dispersão (MAD 0) usa o desvio absoluto médio;
+    grupos com menos de MINIMO_OSS valores ficam NaN. Retorna (escore, mediana do grupo).
+    """
+    base = valores.where(validos)
+    por_grupo = base.groupby(grupos, sort=False)
+    mediana = por_grupo.transform('median')
+    desvio = (valores - mediana).abs()
+    desvios = desvio.where(validos).groupby(grupos, sort=False)
+    mad = desvios.transform('median')
+    # MAD 0 (mais da metade igual à mediana): desvio médio na escala equivalente
+    escala = mad.where(mad > 0, desvios.transform('mean') * 0.7979 / 0.6745)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        escore = 0.6745 * (valores - mediana) / escala.where(escala > 0)
+    escore = escore.where(por_grupo.transform('count') >= MINIMO_OSS)
+    return escore, mediana
+
+
+def detectar_anomalias(dados):
+    """
+    Linhas com EXEC_MEDIANA_% (execução mediana da família entre as OSs), ESCORE_EXEC e
+    ESCORE_GASTO (escores robustos da execução e do log do gasto dentro da família) e
+    ANOMALIA ('', 'EXECUÇÃO', 'GASTO' ou 'EXECUÇÃO + GASTO': acima do normal da família).
+    Várias linhas do mesmo OS × FAMILIA são somadas antes da comparação.
+    """
+    totais = dados.groupby(CHAVE_DETALHE, sort=False)[['PREVISTO', 'REALIZADO']].transform('sum')
+    unicas = pd.Series(~dados.duplicated(CHAVE_DETALHE).to_numpy(), index=dados.index)
+    familia = dados['FAMILIA']
+
+    execucao = (totais['REALIZADO'] / totais['PREVISTO'].where(totais['PREVISTO'] > 0)) * 100
+    escore_exec, mediana_exec = escore_robusto(execucao, familia, unicas & execucao.notna())
+    # Gasto em log: valores de projetos grandes e pequenos ficam na mesma escala
+    gasto = np.log1p(totais['REALIZADO'].clip(lower=0))
+    escore_gasto, _ = escore_robusto(gasto, familia, unicas & (totais['REALIZADO'] > 0))
+
+    exec_atipica = (escore_exec > LIMIAR_ESCORE).to_numpy()
+    gasto_atipico = (escore_gasto > LIMIAR_ESCORE).to_numpy()
+    anomalia = np.select(
+        [exec_atipica & gasto_atipico, exec_atipica, gasto_atipico],
+        [f'{EXECUCAO_ATIPICA} + {GASTO_ATIPICO}', EXECUCAO_ATIPICA, GASTO_ATIPICO],
+        default='',
+    )
+    return dados.assign(**{
+        'EXEC_MEDIANA_%': mediana_exec.to_numpy(),
+        'ESCORE_EXEC': escore_exec.to_numpy(),
+        'ESCORE_GASTO': escore_gasto.to_numpy(),
+        'ANOMALIA': anomalia,
+    })
+
+
+def contar_anomalias(dados, por_os):
+    """Famílias atípicas de cada OS de `por_os` (coluna ANOMALIAS)"""
+    atipicas = dados.loc[dados['ANOMALIA'] != '', CHAVE_DETALHE].drop_duplicates()
+    contagem = atipicas.groupby(CHAVE_OS, sort=False).size()
+    posicoes = contagem.index.get_indexer(pd.MultiIndex.from_frame(por_os[CHAVE_OS]))
+    return por_os.assign(ANOMALIAS=np.append(contagem.to_numpy(), 0)[posicoes])
+
+
+def anomalias_agregados(agregados):
+    """Agregados com as colunas de anomalia nas linhas e a contagem por OS"""
+    dados = detectar_anomalias(agregados['dados'])
+    return {**agregados, 'dados': dados, 'por_os': contar_anomalias(dados, agregados['por_os'])}
@@ -0,0 +1,218 @@
+"""
+Cache compartilhado entre réplicas do app
+Datasets já lidos e agregados ficam num backend comum, indexados pelo hash do
+conteúdo: qualquer réplica atrás do balanceador reaproveita o trabalho das outras.
+
+Backend escolhido pela variável CMV_CACHE:
+    arquivo:///dados/cache        pasta (volume compartilhado)           [padrão]
+    sqlite:///dados/cache.db      arquivo SQLite (volume compartilhado)
+    redis://host:6379/0           Redis ou compatível (requer o pacote redis)
+    nenhum                        desliga o cache
+"""
+
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+CACHE_PADRAO = 'arquivo://' + os.path.join('data', 'cache')
+
+# Validade das entradas em segundos (padrão: 7 dias)
+TTL_PADRAO = int(os.environ.get('CMV_CACHE_TTL', 7 * 24 * 3600))
+
+# Incrementar quando o formato dos objetos guardados mudar
+VERSAO = 1
+
+# Intervalo mínimo entre limpezas de entradas vencidas (backends sem expiração nativa)
+INTERVALO_LIMPEZA = 3600
+
+# Tentativas ao preparar o SQLite: a troca para WAL não espera o timeout da conexão
+# e falha com "database is locked" se outra réplica estiver criando o mesmo arquivo
+TENTATIVAS_SQLITE = 10
+
+BACKENDS = {}
+
+logger = logging.getLogger('cmv.cache')
+
+
+def registrar_cache(esquema):
+    """Decorador: registra a classe de backend para um esquema de URL"""
+    def decorador(classe):
+        BACKENDS[esquema] = classe
+        return classe
+    return decorador
+
+
+def chave(tipo, *partes):
+    """Chave versionada, ex.: chave('ingestao', hash) -> 'cmv:v1:ingestao:<hash>'"""
+    return ':'.join(['cmv', f'v{VERSAO}', tipo] + [str(p) for p in partes])
+
+
+class Cache:
+    """Base dos backends: objetos Python serializados com pickle sobre ler/gravar de bytes"""
+
+    def __init__(self, ttl=TTL_PADRAO):
+        self.ttl = ttl
+
+    def ler(self, chave):
+        raise NotImplementedError
+
+    def gravar(self, chave, valor):
+        raise NotImplementedError
+
+    def obter(self, chave):
+        """Objeto guardado na chave ou None (falhas do backend contam como ausência)"""
+        try:
+            valor = self.ler(chave)
+            return pickle.loads(valor) if valor is not None else None
+        except Exception:
+            logger.warning("Falha ao ler %s do cache", chave, exc_info=True)
+            return None
+
+    def guardar(self, chave, objeto):
+        """Guarda o objeto; falhas do backend só são registradas (o cache é opcional)"""
+        try:
+            self.gravar(chave, pickle.dumps(objeto, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            logger.warning("Falha ao gravar %s no cache", chave, exc_info=True)
+
+
+@registrar_cache('nenhum')
+class CacheNenhum(Cache):
+    """Cache desligado"""
+
+    def __init__(self, url=None, ttl=TTL_PADRAO):
+        super().__init__(ttl)
+
+    def ler(self, chave):
+        return None
+
+    def gravar(self, chave, valor):
+        pass
+
+
+@registrar_cache('arquivo')
+class CacheArquivo(Cache):
+    """Um arquivo por chave numa pasta; escrita atômica (temporário + rename)"""
+
+    def __init__(self, url, ttl=TTL_PADRAO):
+        super().__init__(ttl)
+        self.diretorio = _caminho(url)
+        self._ultima_limpeza = 0
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def _arquivo(self, chave):
+        return os.path.join(self.diretorio, chave.replace(':', '_') + '.pkl')
+
+    def ler(self, chave):
+        arquivo = self._arquivo(chave)
+        try:
+            if time.time() - os.path.getmtime(arquivo) > self.ttl:
+                return None
+            with open(arquivo, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def gravar(self, chave, valor):
+        fd, tmp = tempfile.mkstemp(dir=self.diretorio, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(valor)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, self._arquivo(chave))
+        self._limpar()
+
+    def _limpar(self):
+        agora = time.time()
+        if agora - self._ultima_limpeza < INTERVALO_LIMPEZA:
+            return
+        self._ultima_limpeza = agora
+        with os.scandir(self.diretorio) as entradas:
+            for entrada in entradas:
+                try:
+                    if agora - entrada.stat().st_mtime > self.ttl:
+                        os.remove(entrada.path)
+                except FileNotFoundError:
+                    pass
+
+
+@registrar_cache('sqlite')
+class CacheSQLite(Cache):
+    """Tabela chave/valor num arquivo SQLite (modo WAL, seguro entre processos)"""
+
+    def __init__(self, url, ttl=TTL_PADRAO):
+        import sqlite3
+
+        super().__init__(ttl)
+        self.caminho = _caminho(url)
+        self._lock = threading.Lock()
+        self._ultima_limpeza = 0
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._conexao = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+        for tentativa in range(TENTATIVAS_SQLITE):
+            try:
+                with self._lock, self._conexao:
+                    self._conexao.execute('PRAGMA journal_mode=WAL')
+                    self._conexao.execute(
+                        'CREATE TABLE IF NOT EXISTS cache (chave TEXT PRIMARY KEY, valor BLOB, expira_em REAL)'
+                    )
+                break
+            except sqlite3.OperationalError:
+                if tentativa == TENTATIVAS_SQLITE - 1:
+                    raise
+                time.sleep(0.05 * (tentativa + 1))
+
+    def ler(self, chave):
+        with self._lock:
+            linha = self._conexao.execute(
+                'SELECT valor FROM cache WHERE chave = ? AND expira_em > ?', (chave, time.time())
+            ).fetchone()
+        return linha[0] if linha else None
+
+    def gravar(self, chave, valor):
+        agora = time.time()
+        with self._lock, self._conexao:
+            self._conexao.execute(
+                'INSERT OR REPLACE INTO cache (chave, valor, expira_em) VALUES (?, ?, ?)',
+                (chave, valor, agora + self.ttl),
+            )
+            if agora - self._ultima_limpeza > INTERVALO_LIMPEZA:
+                self._ultima_limpeza = agora
+                self._conexao.execute('DELETE FROM cache WHERE expira_em <= ?', (agora,))
+
+
+@registrar_cache('redis')
+class CacheRedis(Cache):
+    """Redis ou servidor compatível (expiração nativa)"""
+
+    def __init__(self, url, ttl=TTL_PADRAO):
+        import redis
+
+        super().__init__(ttl)
+        self._cliente = redis.Redis.from_url(url)
+
+    def ler(self, chave):
+        return self._cliente.get(chave)
+
+    def gravar(self, chave, valor):
+        self._cliente.set(chave, valor, ex=self.ttl)
+
+
+def _caminho(url):
+    """Caminho de arquivo:///x ou sqlite:///x (três barras: absoluto; duas: relativo)"""
+    partes = urlparse(url)
+    return partes.netloc + partes.path if partes.netloc else partes.path
+
+
+def abrir_cache(url=None, ttl=TTL_PADRAO):
+    """Backend de cache para a URL (ou CMV_CACHE, ou o padrão em data/cache)"""
+    url = url or os.environ.get('CMV_CACHE', CACHE_PADRAO)
+    esquema = urlparse(url).scheme or url
+    if esquema not in BACKENDS:
+        raise ValueError(f"Backend de cache desconhecido: {esquema} (use {', '.join(BACKENDS)}).")
+    return BACKENDS[esquema](url, ttl)
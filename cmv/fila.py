@@ -0,0 +1,166 @@
+"""
+Fila compartilhada de leitura de uploads
+As planilhas enviadas são lidas e normalizadas num pool de processos (um por núcleo),
+compartilhado por todas as sessões do servidor: a leitura pesada (openpyxl, pandas) não
+disputa o GIL com os reruns das outras sessões. Uploads acima da fila esperam a vez, cada
+sessão vê sua posição, e o mesmo conteúdo enviado por duas sessões ao mesmo tempo é lido
+uma vez só (pelo hash). Cada lote lido volta para o servidor assim que sai do processo de
+leitura, e a sessão mostra os resultados parciais como na leitura em thread. Os lotes de
+uma leitura ficam numa lista só, usada por todas as sessões que a esperam; compactada, a
+lista é combinada periodicamente como na leitura em thread.
+"""
+
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cmv.ingestao import CAMPOS_CACHE, IngestaoPlanilha, combinar_parciais, precisa_combinar
+
+# Processos de leitura (padrão: nº de CPUs)
+WORKERS = int(os.environ.get('CMV_WORKERS_LEITURA', 0)) or os.cpu_count() or 1
+
+# Tamanho máximo de um upload (bytes)
+TAMANHO_MAXIMO = int(os.environ.get('CMV_TAMANHO_MAXIMO', 200 * 1024 * 1024))
+
+# Fila de avisos (hash, lote) do processo de leitura para o servidor; lote None = leitura
+# iniciada, hash None = fila encerrada
+_avisos = None
+
+
+def _iniciar_worker(avisos):
+    global _avisos
+    _avisos = avisos
+
+
+def ler_planilha(fonte, nome, tamanho_lote, compactado, hash_arquivo):
+    """
+    Leitura completa num processo do pool; cada lote (formato, df_lote, linhas_lidas, total_linhas)
+    vai para o servidor pela fila de avisos. Retorna os campos de CAMPOS_CACHE e as linhas em 'dados'.
+    """
+    def avisar(*lote):
+        _avisos.put((hash_arquivo, lote))
+
+    _avisos.put((hash_arquivo, None))
+    ingestao = IngestaoPlanilha(fonte, nome, tamanho_lote, compactado, hash_arquivo, ao_publicar=avisar).iniciar()
+    ingestao.aguardar()
+    if ingestao.erro:
+        raise ValueError(ingestao.erro)
+    salvo = {campo: getattr(ingestao, campo) for campo in CAMPOS_CACHE}
+    salvo['dados'] = ingestao.resultado()
+    return salvo
+
+
+class FilaLeitura:
+    """
+    Pool de leitura compartilhado pelas sessões. `enviar` devolve o futuro da leitura (o
+    mesmo para conteúdos iguais em andamento); `estado` informa a posição na fila e os
+    parciais já lidos enquanto a sessão espera.
+    """
+
+    def __init__(self, workers=None, tamanho_maximo=TAMANHO_MAXIMO):
+        self.workers = workers or WORKERS
+        self.tamanho_maximo = tamanho_maximo
+        # spawn: o pool é criado de dentro do servidor do app (threads ativas)
+        self._contexto = multiprocessing.get_context('spawn')
+        self._avisos = self._contexto.Queue()
+        self._executor = self._criar_executor()
+        self._lock = threading.Lock()
+        self._tarefas = {}
+        self._ordem = itertools.count()
+        threading.Thread(target=self._receber_avisos, daemon=True).start()
+
+    def _criar_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=self._contexto,
+            initializer=_iniciar_worker, initargs=(self._avisos,),
+        )
+
+    def verificar_tamanho(self, tamanho):
+        if tamanho > self.tamanho_maximo:
+            raise ValueError(
+                f"Arquivo de {tamanho / 2**20:.0f} MB acima do limite de "
+                f"{self.tamanho_maximo / 2**20:.0f} MB por upload."
+            )
+
+    def enviar(self, hash_arquivo, fonte, nome, tamanho_lote, compactado):
+        """
+        Enfileira a leitura do conteúdo; retorna (futuro, compartilhada), com compartilhada=True
+        quando outra sessão já estava lendo o mesmo conteúdo.
+        """
+        with self._lock:
+            tarefa = self._tarefas.get(hash_arquivo)
+            if tarefa is not None:
+                return tarefa['futuro'], True
+            argumentos = (ler_planilha, fonte, nome, tamanho_lote, compactado, hash_arquivo)
+            try:
+                futuro = self._executor.submit(*argumentos)
+            except BrokenProcessPool:
+                # Um processo de leitura morreu (ex.: falta de memória): o pool é recriado
+                self._executor = self._criar_executor()
+                futuro = self._executor.submit(*argumentos)
+            self._tarefas[hash_arquivo] = self._nova_tarefa(futuro, compactado)
+        futuro.add_done_callback(lambda concluido: self._remover(hash_arquivo, concluido))
+        return futuro, False
+
+    def _nova_tarefa(self, futuro, compactado):
+        return {
+            'futuro': futuro, 'ordem': next(self._ordem), 'iniciada': False, 'compactado': compactado,
+            'lotes': [], 'versao': 0, 'formato': None, 'linhas_lidas': 0, 'total_linhas': None,
+        }
+
+    def _remover(self, hash_arquivo, futuro):
+        with self._lock:
+            if self._tarefas.get(hash_arquivo, {}).get('futuro') is futuro:
+                del self._tarefas[hash_arquivo]
+
+    def estado(self, hash_arquivo):
+        """
+        {'posicao', 'versao', 'lotes', 'formato', 'linhas_lidas', 'total_linhas'} da leitura em
+        andamento (None se não houver): posicao 0 = sendo lida, N = N-ésima na espera; lotes =
+        parciais lidos até agora (não devem ser alterados), versao muda quando eles mudam
+        """
+        with self._lock:
+            tarefa = self._tarefas.get(hash_arquivo)
+            if tarefa is None:
+                return None
+            posicao = 0
+            if not tarefa['iniciada']:
+                posicao = 1 + sum(
+                    1 for outra in self._tarefas.values()
+                    if not outra['iniciada'] and outra['ordem'] < tarefa['ordem']
+                )
+            estado = {campo: tarefa[campo] for campo in ('versao', 'formato', 'linhas_lidas', 'total_linhas')}
+            return dict(estado, posicao=posicao, lotes=list(tarefa['lotes']))
+
+    def _receber_avisos(self):
+        while True:
+            hash_arquivo, lote = self._avisos.get()
+            if hash_arquivo is None:
+                return
+            parciais = None
+            with self._lock:
+                tarefa = self._tarefas.get(hash_arquivo)
+                if tarefa is None:
+                    continue
+                tarefa['iniciada'] = True
+                if lote is None:
+                    continue
+                tarefa['formato'], df_lote, tarefa['linhas_lidas'], tarefa['total_linhas'] = lote
+                tarefa['lotes'].append(df_lote)
+                tarefa['versao'] += 1
+                if tarefa['compactado'] and precisa_combinar(tarefa['lotes']):
+                    parciais = list(tarefa['lotes'])
+            if parciais:
+                # Combina fora do lock; só esta thread acrescenta lotes, então os primeiros
+                # len(parciais) continuam sendo os combinados
+                combinado = combinar_parciais(parciais)
+                with self._lock:
+                    tarefa['lotes'] = [combinado] + tarefa['lotes'][len(parciais):]
+                    tarefa['versao'] += 1
+
+    def encerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._avisos.put((None, None))
@@ -0,0 +1,152 @@
+"""
+Filtros da sidebar por índices bitmap
+Cada coluna filtrável das linhas (OS, FAMILIA, CLIENTE) tem um índice por valor; uma
+combinação de filtros é um OR dos valores escolhidos em cada coluna e um AND entre colunas,
+sobre bitsets empacotados (1 bit por linha). A máscara resultante alimenta a soma por OS
+diretamente (bincount), sem varrer o DataFrame com isin.
+
+Só colunas de poucos valores (FAMILIA) guardam um bitset por valor. OS e CLIENTE guardam
+as posições das linhas de cada valor, e o bitset é montado na seleção a partir delas: um
+bitset por OS custaria (nº de OSs × linhas / 8) bytes, ex. 12 GB com 100 mil OSs e 1 milhão
+de linhas. O status das OSs tem um bitset por status, montado uma vez por visão e limites
+(indexar_status).
+"""
+
+import numpy as np
+import pandas as pd
+
+from cmv.processamento import CHAVE_OS, COLUNAS_VALOR, classificar_agregado
+
+# Colunas com até este número de valores guardam um bitset pronto por valor (FAMILIA,
+# status); acima disso (OS, CLIENTE) o bitset é montado na hora pelas posições do valor
+LIMITE_DENSO = 256
+
+COLUNAS_FILTRO = ['OS', 'FAMILIA', 'CLIENTE']
+
+# Bits ligados em cada byte, para contar linhas sem desempacotar
+BITS_POR_BYTE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+def contar_bits(bitset):
+    return int(BITS_POR_BYTE[bitset].sum())
+
+
+def desempacotar(bitset, n):
+    """Máscara booleana de n linhas"""
+    return np.unpackbits(bitset, count=n).astype(bool)
+
+
+def combinar(bitsets):
+    """AND dos bitsets (None = coluna sem filtro); None se nenhuma coluna filtra"""
+    bitsets = [bitset for bitset in bitsets if bitset is not None]
+    if not bitsets:
+        return None
+    return np.bitwise_and.reduce(bitsets)
+
+
+class IndiceBitmap:
+    """
+    Linhas de cada valor de uma coluna: um bitset empacotado por valor em colunas de poucos
+    valores; nas demais, as posições das linhas ordenadas por valor (bitset montado na seleção).
+    """
+
+    def __init__(self, valores):
+        codigos, rotulos = pd.factorize(np.asarray(valores))
+        self.n = len(codigos)
+        self.rotulos = pd.Index(rotulos)
+        self.bitsets = None
+        if len(rotulos) <= LIMITE_DENSO:
+            self.bitsets = np.zeros((len(rotulos), (self.n + 7) // 8), dtype=np.uint8)
+            for codigo in range(len(rotulos)):
+                self.bitsets[codigo] = np.packbits(codigos == codigo)
+        else:
+            self.posicoes = np.argsort(codigos, kind='stable')
+            self.inicios = np.searchsorted(codigos[self.posicoes], np.arange(len(rotulos) + 1))
+
+    def selecionar(self, valores):
+        """Bitset das linhas com qualquer um dos valores (OR)"""
+        codigos = self.rotulos.get_indexer(pd.Index(valores, dtype=object))
+        codigos = codigos[codigos >= 0]
+        if self.bitsets is not None:
+            if len(codigos) == 0:
+                return np.zeros((self.n + 7) // 8, dtype=np.uint8)
+            return np.bitwise_or.reduce(self.bitsets[codigos], axis=0)
+
+        linhas = np.zeros(self.n, dtype=bool)
+        if len(codigos):
+            fatias = [self.posicoes[self.inicios[c]:self.inicios[c + 1]] for c in codigos]
+            linhas[np.concatenate(fatias)] = True
+        return np.packbits(linhas)
+
+
+def indexar_filtros(agregados):
+    """
+    Índices das colunas filtráveis das linhas e, para cada linha, a posição da sua OS em
+    por_os (para somar a máscara por OS). Um por dataset e seleção de empresas.
+    """
+    dados = agregados['dados']
+    por_os = pd.MultiIndex.from_frame(agregados['por_os'][CHAVE_OS])
+    return {
+        'colunas': {col: IndiceBitmap(dados[col]) for col in COLUNAS_FILTRO if col in dados},
+        'os_das_linhas': por_os.get_indexer(pd.MultiIndex.from_frame(dados[CHAVE_OS])),
+    }
+
+
+def filtrar_linhas(indices, selecoes):
+    """Bitset das linhas que atendem a todos os filtros ({coluna: valores}); None sem filtro"""
+    return combinar([
+        indices['colunas'][col].selecionar(valores)
+        for col, valores in selecoes.items() if valores
+    ])
+
+
+def agregar_mascara(agregados, indices, bitset, limites):
+    """
+    por_os com PREVISTO/REALIZADO/SALDO/LINHAS somados só nas linhas do bitset, EXECUCAO_%
+    e RISCO recalculados; as demais colunas da OS (cliente, previsão...) são mantidas.
+    OSs sem nenhuma linha selecionada saem.
+    """
+    dados = agregados['dados']
+    linhas = desempacotar(bitset, len(dados))
+    codigos = indices['os_das_linhas'][linhas]
+    n = len(agregados['por_os'])
+
+    somas = {col: np.bincount(codigos, weights=dados[col].to_numpy(dtype=float)[linhas], minlength=n)
+             for col in COLUNAS_VALOR}
+    contagem = np.bincount(codigos, minlength=n)
+    somas['LINHAS'] = (np.bincount(codigos, weights=dados['LINHAS'].to_numpy()[linhas], minlength=n)
+                       if 'LINHAS' in dados else contagem).astype(np.int64)
+    df_os = agregados['por_os'].assign(**somas)[contagem > 0].reset_index(drop=True)
+    return classificar_agregado(df_os, 'EXECUCAO_%', limites)
+
+
+def indexar_status(por_os, extras=None):
+    """
+    Bitset das OSs de cada status (RISCO e os status de `extras`, {status: coluna}, como
+    ESTOURO PREVISTO em PREVISAO). Um por visão e limites: o RISCO muda com os limites.
+    """
+    bitsets = {status: np.packbits((por_os['RISCO'] == status).to_numpy()) for status in por_os['RISCO'].unique()}
+    for nome, coluna in (extras or {}).items():
+        if coluna in por_os:
+            bitsets[nome] = np.packbits((por_os[coluna] == nome).to_numpy())
+    return {'n': len(por_os), 'bitsets': bitsets}
+
+
+def selecionar_status(indice, status):
+    """Máscara das OSs com qualquer um dos status (OR dos bitsets guardados)"""
+    bitsets = [indice['bitsets'][nome] for nome in status if nome in indice['bitsets']]
+    if not bitsets:
+        return np.zeros(indice['n'], dtype=bool)
+    return desempacotar(np.bitwise_or.reduce(bitsets), indice['n'])
+
+
+def filtrar_status(df_os, status, extras=None):
+    """
+    OSs com RISCO entre os status (OR), por isin: para o por_os somado numa máscara de linhas,
+    com o RISCO recalculado (sem índice pronto). `extras` como em indexar_status.
+    """
+    selecao = df_os['RISCO'].isin(status)
+    for nome, coluna in (extras or {}).items():
+        if nome in status and coluna in df_os:
+            selecao |= df_os[coluna] == nome
+    return df_os[selecao]
@@ -0,0 +1,146 @@
+"""
+Formatação compartilhada entre o app e os relatórios executivos
+Moeda no padrão brasileiro, cores/classes de risco e o CSS dos cards.
+"""
+
+import pandas as pd
+
+# Layout dos cards de OS e família (métricas, barra de execução, linhas por família)
+ESTILO_CARDS = """
+.os-header {
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+    padding: 10px 0;
+}
+.os-title {
+    font-size: 20px;
+    font-weight: bold;
+}
+.status-badge {
+    display: inline-block;
+    padding: 4px 12px;
+    border-radius: 15px;
+    font-size: 12px;
+    font-weight: bold;
+    margin-left: 10px;
+}
+.badge-estourado { background-color: #e74c3c; color: white; }
+.badge-critico { background-color: #e67e22; color: white; }
+.badge-atencao { background-color: #f1c40f; color: black; }
+.badge-ok { background-color: #27ae60; color: white; }
+.badge-cinza { background-color: #95a5a6; color: white; }
+
+.metric-row {
+    display: flex;
+    gap: 30px;
+    margin: 10px 0;
+    flex-wrap: wrap;
+}
+.metric-item {
+    text-align: center;
+}
+.metric-label {
+    font-size: 11px;
+    color: #888;
+    text-transform: uppercase;
+}
+.metric-value {
+    font-size: 18px;
+    font-weight: bold;
+}
+.metric-value-red { color: #e74c3c; }
+.metric-value-green { color: #27ae60; }
+
+.exec-bar-container {
+    background-color: rgba(255,255,255,0.1);
+    border-radius: 5px;
+    height: 12px;
+    margin: 10px 0;
+    overflow: hidden;
+}
+.exec-bar {
+    height: 100%;
+    border-radius: 5px;
+    transition: width 0.3s ease;
+}
+
+.familia-row {
+    display: flex;
+    align-items: center;
+    padding: 8px 12px;
+    margin: 4px 0;
+    border-radius: 8px;
+    border-left: 4px solid;
+}
+.familia-estourado { background-color: rgba(231, 76, 60, 0.15); border-left-color: #e74c3c; }
+.familia-critico { background-color: rgba(230, 126, 34, 0.15); border-left-color: #e67e22; }
+.familia-atencao { background-color: rgba(241, 196, 15, 0.15); border-left-color: #f1c40f; }
+.familia-ok { background-color: rgba(39, 174, 96, 0.15); border-left-color: #27ae60; }
+.familia-cinza { background-color: rgba(149, 165, 166, 0.15); border-left-color: #95a5a6; }
+
+.familia-name {
+    flex: 2;
+    font-weight: 500;
+}
+.familia-values {
+    flex: 3;
+    display: flex;
+    gap: 15px;
+    font-size: 13px;
+}
+.familia-exec {
+    flex: 1;
+    text-align: right;
+    font-weight: bold;
+}
+
+.summary-card {
+    padding: 20px;
+    border-radius: 10px;
+    text-align: center;
+}
+"""
+
+
+def get_cor_risco(risco):
+    """Retorna cor baseada no risco"""
+    cores = {
+        'OK': '#27ae60',
+        'ATENÇÃO': '#f1c40f',
+        'CRÍTICO': '#e67e22',
+        'ESTOURADO': '#e74c3c',
+        'SEM ORÇAMENTO': '#95a5a6'
+    }
+    return cores.get(risco, '#95a5a6')
+
+
+def get_classe_risco(risco):
+    """Retorna classe CSS baseada no risco"""
+    classes = {
+        'OK': 'ok',
+        'ATENÇÃO': 'atencao',
+        'CRÍTICO': 'critico',
+        'ESTOURADO': 'estourado',
+        'SEM ORÇAMENTO': 'cinza'
+    }
+    return classes.get(risco, 'cinza')
+
+
+def formatar_moeda(valor):
+    """Formata valor para padrão brasileiro"""
+    if pd.isna(valor):
+        return "R$ 0,00"
+    return f"R$ {valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def formatar_moeda_compacto(valor):
+    """Formata valor de forma compacta"""
+    if pd.isna(valor) or valor == 0:
+        return "R$ 0"
+    if abs(valor) >= 1_000_000:
+        milhoes = f"{valor/1_000_000:.1f}".replace(".", ",")
+        return f"R$ {milhoes}M"
+    if abs(valor) >= 1_000:
+        return f"R$ {valor/1_000:.0f}K"
+    return f"R$ {valor:.0f}"
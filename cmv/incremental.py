@@ -0,0 +1,153 @@
+"""
+Reingestão incremental entre exportações consecutivas
+Compara linhas normalizadas por hash e atualiza só os agregados
+das OSs e famílias afetadas.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cmv.processamento import CHAVE_DETALHE, CHAVE_OS, COLUNAS, COLUNAS_VALOR, classificar_agregado, somar_grupos
+
+CHAVE = CHAVE_DETALHE
+
+# Agregados mantidos incrementalmente: tabela -> (chave, coluna de execução)
+AGREGADOS = {
+    'por_os': (CHAVE_OS, 'EXECUCAO_%'),
+    'por_familia': ('FAMILIA', 'EXEC_%'),
+}
+
+
+def hash_linhas(df):
+    """
+    Hash de cada linha normalizada (OS, FAMILIA, PREVISTO, REALIZADO, SALDO).
+    Repetições de uma linha idêntica recebem hashes distintos pela ordem de
+    ocorrência (a primeira mantém o hash original), para que o diff trate o
+    dataset como multiconjunto.
+    """
+    h = pd.util.hash_pandas_object(df[COLUNAS], index=False).to_numpy()
+    envolvidas = pd.Series(h).duplicated(keep=False).to_numpy()
+    if not envolvidas.any():
+        return h
+
+    h_envolvidas = h[envolvidas]
+    ocorrencia = pd.Series(h_envolvidas).groupby(h_envolvidas).cumcount().to_numpy()
+    repetidas = ocorrencia > 0
+    h = h.copy()
+    h[np.flatnonzero(envolvidas)[repetidas]] = pd.util.hash_pandas_object(
+        pd.DataFrame({'h': h_envolvidas[repetidas], 'n': ocorrencia[repetidas]}), index=False
+    ).to_numpy()
+    return h
+
+
+def comparar(df_anterior, df_atual, hashes_anterior=None, hashes_atual=None):
+    """Retorna (removidas, adicionadas, hashes_atual): linhas que saíram e que entraram"""
+    if hashes_anterior is None:
+        hashes_anterior = hash_linhas(df_anterior)
+    if hashes_atual is None:
+        hashes_atual = hash_linhas(df_atual)
+
+    # Tabela hash do pandas: mais rápida que np.isin (ordenação) para milhões de linhas
+    indice_anterior = pd.Index(hashes_anterior)
+    indice_atual = pd.Index(hashes_atual)
+    removidas = df_anterior[~indice_anterior.isin(indice_atual)]
+    adicionadas = df_atual[~indice_atual.isin(indice_anterior)]
+    return removidas, adicionadas, hashes_atual
+
+
+def _delta(removidas, adicionadas, chave):
+    """Variação de valores e de contagem de linhas por chave (entradas - saídas)"""
+    delta = somar_grupos(adicionadas, chave).sub(somar_grupos(removidas, chave), fill_value=0)
+    delta['LINHAS'] = delta['LINHAS'].astype(int)
+    return delta
+
+
+def atualizar_agregado(agregado, removidas, adicionadas, chave, coluna_exec):
+    """
+    Aplica o diff a um agregado classificado (de classificar_os/classificar_familias).
+    Só as chaves afetadas têm execução e risco recalculados.
+    Retorna (novo agregado, chaves afetadas).
+    """
+    delta = _delta(removidas, adicionadas, chave)
+    novo = agregado.set_index(chave)
+    if delta.empty:
+        return novo.reset_index(), delta.index
+
+    # Soma posicional das variações nas chaves já existentes
+    posicoes = novo.index.get_indexer(delta.index)
+    existe = posicoes >= 0
+    for col in COLUNAS_VALOR + ['LINHAS']:
+        valores = novo[col].to_numpy().copy()
+        valores[posicoes[existe]] += delta[col].to_numpy()[existe]
+        novo[col] = valores
+    if not existe.all():
+        novo = pd.concat([novo, delta[~existe]])
+
+    # Reclassifica só as chaves afetadas; chaves sem linhas saem do agregado
+    afetadas = novo.loc[delta.index]
+    afetadas = afetadas[afetadas['LINHAS'] > 0].copy()
+    classificar_agregado(afetadas, coluna_exec)
+
+    novo = pd.concat([novo.drop(index=delta.index), afetadas])
+    novo['LINHAS'] = novo['LINHAS'].astype(int)
+    novo.index.names = chave if isinstance(chave, list) else [chave]
+    return novo.reset_index(), delta.index
+
+
+def resumir_mudancas(removidas, adicionadas):
+    """Tabela 'o que mudou' por (OS, FAMILIA): valores antes/depois e tipo da mudança"""
+    antes = removidas.groupby(CHAVE)[COLUNAS_VALOR].sum()
+    depois = adicionadas.groupby(CHAVE)[COLUNAS_VALOR].sum()
+    mudancas = antes.join(depois, how='outer', lsuffix='_ANTES', rsuffix='_DEPOIS')
+
+    so_antes = mudancas['PREVISTO_DEPOIS'].isna()
+    so_depois = mudancas['PREVISTO_ANTES'].isna()
+    mudancas['MUDANCA'] = np.select([so_depois, so_antes], ['NOVA', 'REMOVIDA'], default='ALTERADA')
+
+    mudancas = mudancas.fillna(0)
+    mudancas['DELTA_REALIZADO'] = mudancas['REALIZADO_DEPOIS'] - mudancas['REALIZADO_ANTES']
+    mudancas['DELTA_SALDO'] = mudancas['SALDO_DEPOIS'] - mudancas['SALDO_ANTES']
+    mudancas = mudancas.reset_index()
+    return mudancas.reindex(mudancas['DELTA_REALIZADO'].abs().sort_values(ascending=False).index)
+
+
+def transicoes_risco(por_os_antes, por_os_depois, oss):
+    """Mudanças de RISCO nas OSs afetadas (índice por EMPRESA, OS)"""
+    antes = por_os_antes.set_index(CHAVE_OS)['RISCO'].reindex(oss)
+    depois = por_os_depois.set_index(CHAVE_OS)['RISCO'].reindex(oss)
+    transicoes = pd.DataFrame({'RISCO_ANTES': antes, 'RISCO_DEPOIS': depois})
+    transicoes = transicoes[transicoes['RISCO_ANTES'] != transicoes['RISCO_DEPOIS']]
+    return transicoes.fillna('—').rename_axis(CHAVE_OS).reset_index()
+
+
+def reingerir(base, df_atual, hashes_atual=None):
+    """
+    Calcula os agregados de df_atual a partir de um snapshot base
+    (dict com 'dados', 'por_os', 'por_familia' e opcionalmente 'hashes').
+    Retorna dict com dados, agregados, hashes, mudancas, transicoes e resumo.
+    """
+    removidas, adicionadas, hashes_atual = comparar(
+        base['dados'], df_atual, base.get('hashes'), hashes_atual
+    )
+
+    resultado = {'dados': df_atual, 'hashes': hashes_atual}
+    afetadas = {}
+    for nome, (chave, coluna_exec) in AGREGADOS.items():
+        resultado[nome], afetadas[nome] = atualizar_agregado(
+            base[nome], removidas, adicionadas, chave, coluna_exec
+        )
+    resultado['por_familia'] = resultado['por_familia'].sort_values('EXEC_%', ascending=False)
+
+    mudancas = resumir_mudancas(removidas, adicionadas)
+    resultado['mudancas'] = mudancas
+    resultado['transicoes'] = transicoes_risco(base['por_os'], resultado['por_os'], afetadas['por_os'])
+    resultado['resumo'] = {
+        'linhas_removidas': len(removidas),
+        'linhas_adicionadas': len(adicionadas),
+        'novas': int((mudancas['MUDANCA'] == 'NOVA').sum()),
+        'removidas': int((mudancas['MUDANCA'] == 'REMOVIDA').sum()),
+        'alteradas': int((mudancas['MUDANCA'] == 'ALTERADA').sum()),
+        'oss_afetadas': len(afetadas['por_os']),
+        'familias_afetadas': len(afetadas['por_familia']),
+    }
+    return resultado
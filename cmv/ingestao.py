@@ -0,0 +1,310 @@
+"""
+Ingestão da planilha em segundo plano
+Leitura em lotes com progresso de linhas e resultados parciais.
+Arquivos grandes são compactados durante a leitura: cada lote vira somas por
+(EMPRESA, OS, FAMILIA) e os parciais são combinados periodicamente, então a memória
+depende do número de pares distintos e não do número de linhas.
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import TimeoutError
+from itertools import chain
+
+import pandas as pd
+
+from cmv.cache import chave
+from cmv.leitores import abrir, abrir_binario, tamanho_fonte
+from cmv.processamento import COLUNAS_DADOS, LINHAS_CABECALHO, PARSERS, compactar, detectar_formato
+from cmv.validacao import VERIFICACOES, combinar_validacoes, validar
+
+# Linhas por lote publicado (o primeiro lote já alimenta o resumo parcial)
+TAMANHO_LOTE = 5000
+
+# Arquivos acima deste tamanho (bytes) são compactados por (EMPRESA, OS, FAMILIA) durante a leitura
+TAMANHO_COMPACTAR = int(os.environ.get('CMV_TAMANHO_COMPACTAR', 50 * 1024 * 1024))
+
+# Linhas por lote na compactação: lotes maiores diluem o custo fixo de cada groupby
+TAMANHO_LOTE_COMPACTADO = 100_000
+
+# Linhas acumuladas em parciais antes de combiná-los num só (ou o dobro do último
+# combinado, se maior): a memória fica em poucas vezes o número de pares distintos
+LINHAS_PARCIAIS = 500_000
+
+# Na compactação, duplicidade é verificada no resultado final (LINHAS > 1), o resto por lote
+VERIFICACOES_LOTE = [codigo for codigo in VERIFICACOES if codigo != 'DUPLICADA']
+
+BLOCO_HASH = 1024 * 1024
+
+# Intervalo (s) entre consultas à fila de leitura (posição e progresso)
+INTERVALO_FILA = 0.25
+
+# Atributos da ingestão guardados no cache compartilhado (além das linhas)
+CAMPOS_CACHE = ['formato', 'backend', 'compactado', 'linhas_lidas', 'total_linhas', 'validacao']
+
+
+def hash_conteudo(fonte):
+    """Hash SHA-256 do conteúdo do arquivo (identifica o dataset); aceita bytes ou caminho"""
+    if isinstance(fonte, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(fonte).hexdigest()
+    h = hashlib.sha256()
+    with abrir_binario(fonte) as arquivo:
+        for bloco in iter(lambda: arquivo.read(BLOCO_HASH), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def combinar_parciais(parciais):
+    """Combina parciais compactados (somas por OS, FAMILIA) num único parcial"""
+    if not parciais:
+        return pd.DataFrame(columns=COLUNAS_DADOS + ['LINHAS'])
+    return compactar(pd.concat(parciais, ignore_index=True))
+
+
+def precisa_combinar(parciais):
+    """Parciais acumulados passam de LINHAS_PARCIAIS (ou do dobro do primeiro, já combinado)"""
+    acumuladas = sum(len(parcial) for parcial in parciais)
+    return acumuladas > max(LINHAS_PARCIAIS, 2 * len(parciais[0]))
+
+
+def processar_leitura(leitura, coercoes=None):
+    """
+    Detecta o formato no primeiro bloco e normaliza os blocos da leitura.
+    Gera tuplas (formato, df_lote, linhas_lidas, total_linhas); total_linhas pode ser None.
+    Se `coercoes` for uma lista, recebe as células não numéricas convertidas para 0.
+    """
+    try:
+        blocos = iter(leitura.blocos)
+        primeiro = next(blocos, None)
+        if primeiro is None or len(primeiro) == 0:
+            raise ValueError("Planilha vazia.")
+
+        n_colunas = primeiro.shape[1]
+        formato = detectar_formato(primeiro)
+        inicio, normalizar_bloco = PARSERS[formato]['iniciar'](primeiro.head(LINHAS_CABECALHO))
+
+        linhas_lidas = inicio
+        for bloco in chain([primeiro.iloc[inicio:]], blocos):
+            linhas_lidas += len(bloco)
+            df_lote = normalizar_bloco(bloco.reindex(columns=range(n_colunas)), coercoes)
+            yield formato, df_lote, linhas_lidas, leitura.total_linhas
+    finally:
+        leitura.fechar()
+
+
+def processar_em_lotes(fonte, tamanho_lote=TAMANHO_LOTE, coercoes=None, nome=None, backend=None):
+    """Abre o arquivo com o leitor configurado e normaliza em lotes (ver processar_leitura)"""
+    return processar_leitura(abrir(fonte, nome, tamanho_lote, backend), coercoes)
+
+
+def processar_conteudo(fonte, coercoes=None, nome=None):
+    """Processa a planilha inteira (mesma lógica da ingestão em lotes); retorna (df, formato)"""
+    formato = None
+    lotes = []
+    for formato, df_lote, _, _ in processar_em_lotes(fonte, coercoes=coercoes, nome=nome):
+        lotes.append(df_lote)
+
+    if not lotes:
+        return pd.DataFrame(columns=COLUNAS_DADOS), formato
+    return pd.concat(lotes, ignore_index=True), formato
+
+
+class IngestaoPlanilha:
+    """
+    Processa uma planilha em thread de fundo, publicando progresso e lotes já normalizados.
+    `fonte` pode ser o conteúdo em bytes ou o caminho do arquivo; com compactado=None
+    a compactação por (EMPRESA, OS, FAMILIA) é ligada para arquivos acima de TAMANHO_COMPACTAR.
+    Com um `cache` (cmv.cache), o resultado é reaproveitado/publicado pelo hash do conteúdo.
+    Com uma `fila` (cmv.fila), a leitura roda no pool de processos compartilhado, e a thread
+    acompanha a posição na fila e publica os lotes que o processo de leitura devolve.
+    `ao_publicar(formato, df_lote, linhas_lidas, total_linhas)` é chamado a cada lote lido.
+    """
+
+    def __init__(self, fonte, nome=None, tamanho_lote=TAMANHO_LOTE, compactado=None, hash_arquivo=None,
+                 cache=None, fila=None, ao_publicar=None):
+        self._fonte = fonte
+        self._compartilhado = cache
+        self._fila = fila
+        self._ao_publicar = ao_publicar
+        self._nome = nome
+        self._tamanho_lote = tamanho_lote
+        self._lock = threading.Lock()
+        self._lotes = []
+        self._versao = 0
+        self._coercoes = []
+        self._validacoes = []
+        self._cache = (0, None)
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+
+        self.tamanho = tamanho_fonte(fonte)
+        if compactado is None:
+            compactado = self.tamanho > TAMANHO_COMPACTAR
+        self.compactado = compactado
+        if compactado:
+            self._tamanho_lote = max(tamanho_lote, TAMANHO_LOTE_COMPACTADO)
+        self.hash = hash_arquivo
+        self.backend = None
+        self.formato = None
+        self.linhas_lidas = 0
+        self.total_linhas = None
+        self.validacao = None
+        self.erro = None
+        self.do_cache = False
+        self.posicao_fila = None
+        self.leitura_compartilhada = False
+        self.concluido = False
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def aguardar(self, timeout=None):
+        self._thread.join(timeout)
+        return self.concluido
+
+    def _executar(self):
+        try:
+            if self._fila is not None:
+                self._fila.verificar_tamanho(self.tamanho)
+            if self.hash is None:
+                self.hash = hash_conteudo(self._fonte)
+            if self._carregar_do_cache():
+                return
+            if self._fila is not None:
+                self._ler_na_fila()
+            else:
+                self._ler()
+            # Leitura compartilhada: quem enviou primeiro grava no cache
+            if not self.leitura_compartilhada:
+                self._guardar_no_cache()
+        except Exception as exc:
+            self.erro = str(exc)
+        finally:
+            self._fonte = None
+            self.posicao_fila = None
+            self.concluido = True
+
+    def _ler(self):
+        """Leitura em lotes nesta thread, publicando cada lote"""
+        leitura = abrir(self._fonte, self._nome, self._tamanho_lote)
+        self.backend = leitura.backend
+        for formato, df_lote, linhas_lidas, total_linhas in processar_leitura(leitura, self._coercoes):
+            if self.compactado:
+                df_lote = self._compactar_lote(df_lote)
+            self._publicar(formato, df_lote, linhas_lidas, total_linhas)
+            if self._ao_publicar is not None:
+                self._ao_publicar(formato, df_lote, linhas_lidas, total_linhas)
+
+        if self.compactado:
+            self._validacoes.append(validar(self.resultado(), verificacoes=['DUPLICADA']))
+            self.validacao = combinar_validacoes(self._validacoes)
+        else:
+            self.validacao = validar(self.resultado(), self._coercoes)
+
+    def _publicar(self, formato, df_lote, linhas_lidas, total_linhas):
+        """Acrescenta um lote já normalizado (e compactado, se for o caso) aos parciais"""
+        with self._lock:
+            self.formato = formato
+            self._lotes.append(df_lote)
+            self._versao += 1
+            self.linhas_lidas = linhas_lidas
+            self.total_linhas = total_linhas
+        if self.compactado and precisa_combinar(self._lotes):
+            combinado = combinar_parciais(self._lotes)
+            with self._lock:
+                self._lotes = [combinado]
+                self._versao += 1
+
+    def _ler_na_fila(self):
+        """
+        Leitura no pool de processos compartilhado: acompanha a posição na fila e usa como
+        parciais os lotes guardados pela fila (os mesmos objetos, sem cópia por sessão);
+        o resultado final substitui os parciais
+        """
+        futuro, self.leitura_compartilhada = self._fila.enviar(
+            self.hash, self._fonte, self._nome, self._tamanho_lote, self.compactado)
+        versao = 0
+        while True:
+            try:
+                salvo = futuro.result(timeout=INTERVALO_FILA)
+                break
+            except TimeoutError:
+                estado = self._fila.estado(self.hash)
+                if estado is None:
+                    continue
+                with self._lock:
+                    self.posicao_fila = estado['posicao']
+                    if estado['versao'] != versao:
+                        versao = estado['versao']
+                        self._lotes = estado['lotes']
+                        self.formato = estado['formato']
+                        self.linhas_lidas = estado['linhas_lidas']
+                        self.total_linhas = estado['total_linhas']
+                        self._versao += 1
+        self._aplicar(salvo)
+
+    def _carregar_do_cache(self):
+        """Reaproveita a leitura do mesmo conteúdo feita por outra sessão ou réplica"""
+        if self._compartilhado is None:
+            return False
+        salvo = self._compartilhado.obter(chave('ingestao', self.hash))
+        if salvo is None:
+            return False
+
+        self._aplicar(salvo)
+        self.do_cache = True
+        return True
+
+    def _aplicar(self, salvo):
+        """Assume uma leitura pronta (cache compartilhado ou fila): campos de CAMPOS_CACHE e 'dados'"""
+        with self._lock:
+            for campo in CAMPOS_CACHE:
+                setattr(self, campo, salvo[campo])
+            self._lotes = [salvo['dados']]
+            self._versao += 1
+            self._cache = (self._versao, salvo['dados'])
+
+    def _guardar_no_cache(self):
+        if self._compartilhado is None:
+            return
+        salvo = {campo: getattr(self, campo) for campo in CAMPOS_CACHE}
+        salvo['dados'] = self.resultado()
+        self._compartilhado.guardar(chave('ingestao', self.hash), salvo)
+
+    def _compactar_lote(self, df_lote):
+        """Valida as linhas do lote (exceto duplicidade) e reduz a somas por (EMPRESA, OS, FAMILIA)"""
+        self._validacoes.append(validar(df_lote, self._coercoes, verificacoes=VERIFICACOES_LOTE))
+        self._coercoes.clear()
+        return compactar(df_lote)
+
+    @property
+    def progresso(self):
+        """Fração lida (0-1) ou None quando o total de linhas é desconhecido"""
+        if self.concluido:
+            return 1.0
+        if not self.total_linhas:
+            return None
+        return min(self.linhas_lidas / self.total_linhas, 1.0)
+
+    def resultado(self):
+        """
+        DataFrame com as linhas processadas até agora (completo após a conclusão).
+        Compactado, tem uma linha por (EMPRESA, OS, FAMILIA) com a contagem de linhas em LINHAS.
+        """
+        with self._lock:
+            versao = self._versao
+            if self._cache[0] == versao and self._cache[1] is not None:
+                return self._cache[1]
+            lotes = list(self._lotes)
+
+        if self.compactado:
+            df = combinar_parciais(lotes)
+        elif lotes:
+            df = pd.concat(lotes, ignore_index=True)
+        else:
+            df = pd.DataFrame(columns=COLUNAS_DADOS)
+
+        with self._lock:
+            self._cache = (versao, df)
+        return df
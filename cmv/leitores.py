@@ -0,0 +1,276 @@
+"""
+Leitores de planilha com backends intercambiáveis
+Cada backend lê a primeira aba em blocos de DataFrame (colunas 0..n, células
+vazias como NaN, igual ao pd.read_excel(header=None)). A fonte pode ser o
+conteúdo em bytes ou o caminho do arquivo (CSV e Parquet grandes são lidos do
+disco sem carregar o arquivo inteiro). O backend usado para
+cada tipo de arquivo vem da variável CMV_LEITORES, do leitores.json gravado
+pelo benchmark (scripts/benchmark_leitores.py) ou da ordem de preferência.
+"""
+
+import csv
+import importlib.util
+import json
+import os
+import zipfile
+from io import BytesIO, TextIOWrapper
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+TIPOS = ['xlsx', 'xls', 'xlsb', 'ods', 'csv', 'parquet']
+
+# Backends por tipo, em ordem de preferência (o primeiro instalado é o padrão)
+PREFERENCIA = {
+    'xlsx': ['calamine', 'openpyxl'],
+    'xls': ['calamine', 'xlrd'],
+    'xlsb': ['calamine', 'pyxlsb'],
+    'ods': ['calamine', 'odf'],
+    'csv': ['pandas'],
+    'parquet': ['pyarrow'],
+}
+
+# Módulo que precisa estar instalado para cada backend
+MODULOS = {
+    'calamine': 'python_calamine',
+    'openpyxl': 'openpyxl',
+    'xlrd': 'xlrd',
+    'pyxlsb': 'pyxlsb',
+    'odf': 'odf',
+    'pandas': 'pandas',
+    'pyarrow': 'pyarrow',
+}
+
+ARQUIVO_CONFIG = os.environ.get('CMV_LEITORES_CONFIG', 'leitores.json')
+
+ASSINATURA_ZIP = b'PK\x03\x04'
+ASSINATURA_OLE = b'\xd0\xcf\x11\xe0'
+ASSINATURA_PARQUET = b'PAR1'
+
+BUFFER_PARQUET = 1024 * 1024
+
+BACKENDS = {}
+
+
+class Leitura:
+    """Resultado da abertura: blocos de DataFrame, total de linhas (ou None) e backend usado"""
+
+    def __init__(self, blocos, total_linhas=None, fechar=None, backend=None):
+        self.blocos = blocos
+        self.total_linhas = total_linhas
+        self.backend = backend
+        self._fechar = fechar
+
+    def fechar(self):
+        if self._fechar is not None:
+            self._fechar()
+
+
+def registrar_backend(nome):
+    """Decorador: registra uma função (fonte, tamanho_lote) -> Leitura"""
+    def decorador(funcao):
+        BACKENDS[nome] = funcao
+        return funcao
+    return decorador
+
+
+def backend_disponivel(nome):
+    return nome in BACKENDS and importlib.util.find_spec(MODULOS[nome]) is not None
+
+
+def backends_disponiveis(tipo):
+    return [nome for nome in PREFERENCIA[tipo] if backend_disponivel(nome)]
+
+
+def abrir_binario(fonte):
+    """Arquivo binário a partir do conteúdo em bytes ou de um caminho"""
+    if isinstance(fonte, (bytes, bytearray, memoryview)):
+        return BytesIO(fonte)
+    return open(fonte, 'rb')
+
+
+def tamanho_fonte(fonte):
+    """Tamanho em bytes do conteúdo ou do arquivo"""
+    if isinstance(fonte, (bytes, bytearray, memoryview)):
+        return len(fonte)
+    return os.path.getsize(fonte)
+
+
+def _fechar_todos(*objetos):
+    def fechar():
+        for objeto in objetos:
+            objeto.close()
+    return fechar
+
+
+def _blocos_de_linhas(linhas, tamanho_lote, vazio=None):
+    """Agrupa um iterador de linhas em DataFrames de até tamanho_lote linhas"""
+    linhas = iter(linhas)
+    while True:
+        lote = list(islice(linhas, tamanho_lote))
+        if not lote:
+            return
+        # object: um lote com linhas em branco não converte a coluna de OS inteira para float
+        df = pd.DataFrame(lote, dtype=object)
+        if vazio is not None:
+            df = df.replace(vazio, np.nan)
+        yield df.fillna(np.nan)
+
+
+def _blocos_de_frame(df, tamanho_lote):
+    """Fatia um DataFrame já lido em blocos (mantém o progresso por lote)"""
+    for inicio in range(0, len(df), tamanho_lote):
+        yield df.iloc[inicio:inicio + tamanho_lote].reset_index(drop=True)
+
+
+@registrar_backend('openpyxl')
+def ler_openpyxl(fonte, tamanho_lote):
+    from openpyxl import load_workbook
+
+    arquivo = abrir_binario(fonte)
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    ws = wb.worksheets[0]
+    blocos = _blocos_de_linhas(ws.iter_rows(values_only=True), tamanho_lote)
+    return Leitura(blocos, ws.max_row, _fechar_todos(wb, arquivo))
+
+
+@registrar_backend('calamine')
+def ler_calamine(fonte, tamanho_lote):
+    from python_calamine import CalamineWorkbook
+
+    arquivo = abrir_binario(fonte)
+    wb = CalamineWorkbook.from_filelike(arquivo)
+    sheet = wb.get_sheet_by_index(0)
+    # calamine devolve '' para células vazias
+    blocos = _blocos_de_linhas(sheet.iter_rows(), tamanho_lote, vazio='')
+    return Leitura(blocos, sheet.total_height, _fechar_todos(wb, arquivo))
+
+
+def _ler_pandas_excel(engine):
+    def ler(fonte, tamanho_lote):
+        with abrir_binario(fonte) as arquivo:
+            df = pd.read_excel(arquivo, header=None, engine=engine)
+        return Leitura(_blocos_de_frame(df, tamanho_lote), len(df))
+    return ler
+
+
+registrar_backend('xlrd')(_ler_pandas_excel('xlrd'))
+registrar_backend('pyxlsb')(_ler_pandas_excel('pyxlsb'))
+registrar_backend('odf')(_ler_pandas_excel('odf'))
+
+
+# Números no padrão brasileiro (1.234,56) em CSVs separados por ';'
+PADRAO_NUMERO_BR = r'-?\d{1,3}(?:\.\d{3})*(?:,\d+)?|-?\d+(?:,\d+)?'
+
+
+def _converter_numeros_br(df):
+    for col in df.columns:
+        texto = df[col]
+        br = texto.str.fullmatch(PADRAO_NUMERO_BR).fillna(False).astype(bool)
+        if br.any():
+            df.loc[br, col] = texto[br].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    return df
+
+
+@registrar_backend('pandas')
+def ler_csv(fonte, tamanho_lote):
+    arquivo = abrir_binario(fonte)
+    amostra = arquivo.read(64 * 1024).decode('utf-8-sig', errors='ignore')
+    arquivo.seek(0)
+    try:
+        separador = csv.Sniffer().sniff(amostra, delimiters=';,\t|').delimiter
+    except csv.Error:
+        separador = ','
+
+    texto = TextIOWrapper(arquivo, encoding='utf-8-sig', errors='replace', newline='')
+    leitor = pd.read_csv(texto, header=None, sep=separador, dtype=str, chunksize=tamanho_lote)
+
+    def blocos():
+        for bloco in leitor:
+            bloco.columns = range(bloco.shape[1])
+            yield _converter_numeros_br(bloco) if separador == ';' else bloco
+
+    return Leitura(blocos(), None, _fechar_todos(leitor, texto))
+
+
+@registrar_backend('pyarrow')
+def ler_parquet(fonte, tamanho_lote):
+    import pyarrow.parquet as pq
+
+    arquivo = abrir_binario(fonte)
+    # Leitura bufferizada, sem pré-carregar o row group inteiro: memória constante por lote
+    parquet = pq.ParquetFile(arquivo, buffer_size=BUFFER_PARQUET, pre_buffer=False)
+
+    def blocos():
+        # Os nomes das colunas viram a primeira linha, como o cabeçalho de uma planilha
+        cabecalho = pd.DataFrame([parquet.schema_arrow.names])
+        for i, lote in enumerate(parquet.iter_batches(batch_size=tamanho_lote)):
+            df = lote.to_pandas().set_axis(range(lote.num_columns), axis=1)
+            yield pd.concat([cabecalho, df], ignore_index=True) if i == 0 else df
+
+    return Leitura(blocos(), parquet.metadata.num_rows + 1, _fechar_todos(parquet, arquivo))
+
+
+def detectar_tipo(fonte, nome=None):
+    """Tipo do arquivo pela extensão do nome ou, na falta dela, pela assinatura"""
+    if nome is None and isinstance(fonte, (str, os.PathLike)):
+        nome = os.fspath(fonte)
+    if nome:
+        extensao = os.path.splitext(nome)[1].lower().lstrip('.')
+        if extensao in TIPOS:
+            return extensao
+
+    with abrir_binario(fonte) as arquivo:
+        assinatura = arquivo.read(4)
+        if assinatura == ASSINATURA_OLE:
+            return 'xls'
+        if assinatura == ASSINATURA_PARQUET:
+            return 'parquet'
+        if assinatura != ASSINATURA_ZIP:
+            return 'csv'
+        arquivo.seek(0)
+        with zipfile.ZipFile(arquivo) as z:
+            nomes = set(z.namelist())
+        if 'xl/workbook.bin' in nomes:
+            return 'xlsb'
+        if 'content.xml' in nomes:
+            return 'ods'
+        return 'xlsx'
+
+
+def _config():
+    """Backend escolhido por tipo: variável CMV_LEITORES ("xlsx=calamine,csv=pandas") ou leitores.json"""
+    config = {}
+    try:
+        with open(ARQUIVO_CONFIG, encoding='utf-8') as f:
+            config.update(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    for par in os.environ.get('CMV_LEITORES', '').split(','):
+        if '=' in par:
+            tipo, backend = par.split('=', 1)
+            config[tipo.strip().lower()] = backend.strip()
+    return config
+
+
+def escolher_backend(tipo):
+    """Backend configurado para o tipo (se instalado) ou o primeiro disponível na preferência"""
+    configurado = _config().get(tipo)
+    if configurado and configurado in PREFERENCIA[tipo] and backend_disponivel(configurado):
+        return configurado
+
+    disponiveis = backends_disponiveis(tipo)
+    if not disponiveis:
+        raise ValueError(f"Nenhum leitor instalado para arquivos .{tipo}.")
+    return disponiveis[0]
+
+
+def abrir(fonte, nome=None, tamanho_lote=5000, backend=None):
+    """Abre o arquivo (bytes ou caminho) com o backend escolhido e retorna uma Leitura"""
+    tipo = detectar_tipo(fonte, nome)
+    backend = backend or escolher_backend(tipo)
+    leitura = BACKENDS[backend](fonte, tamanho_lote)
+    leitura.backend = backend
+    return leitura
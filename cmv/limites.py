@@ -0,0 +1,108 @@
+"""
+Limites de risco configuráveis
+As execuções de cada agregado são ordenadas uma vez por dataset: com novos limites,
+contagens e status por linha saem de buscas binárias nas fatias ordenadas, sem
+reagregar os dados nem percorrer linhas.
+"""
+
+import numpy as np
+
+from cmv.processamento import LIMITES_PADRAO, STATUS_EXECUCAO, percentual_execucao
+
+STATUS = np.array(STATUS_EXECUCAO, dtype=object)
+
+
+def normalizar_limites(limites, base=LIMITES_PADRAO):
+    """Completa os limites com a base e os põe em ordem crescente (ATENÇÃO ≤ CRÍTICO ≤ ESTOURADO)"""
+    valores = sorted(float(limites.get(status, base[status])) for status in base)
+    return dict(zip(base, valores))
+
+
+class IndiceExecucao:
+    """
+    Execução (%) de um agregado ordenada dentro de cada grupo (ex.: FAMILIA, para as
+    exceções por família). Itens sem orçamento têm status fixo e ficam fora da ordenação.
+    """
+
+    def __init__(self, agregado, grupo=None):
+        previsto = agregado['PREVISTO'].to_numpy(dtype=float)
+        realizado = agregado['REALIZADO'].to_numpy(dtype=float)
+        execucao = percentual_execucao(agregado).to_numpy(dtype=float)
+        sem_orcamento = previsto == 0
+
+        self.fixos = np.full(len(agregado), None, dtype=object)
+        self.fixos[sem_orcamento] = 'SEM ORÇAMENTO'
+        self.fixos[sem_orcamento & (realizado > 0)] = 'CRÍTICO'
+        self.contagem_fixos = {'CRÍTICO': int((sem_orcamento & (realizado > 0)).sum()),
+                               'SEM ORÇAMENTO': int((sem_orcamento & (realizado <= 0)).sum())}
+
+        linhas = np.flatnonzero(~sem_orcamento)
+        if grupo is None:
+            self.grupos = [None]
+            codigos = np.zeros(len(linhas), dtype=np.int64)
+        else:
+            codigos_todos, self.grupos = agregado[grupo].factorize()
+            self.grupos = list(self.grupos)
+            codigos = codigos_todos[linhas]
+
+        ordem = np.lexsort((execucao[linhas], codigos))
+        self.linhas = linhas[ordem]
+        self.ordenado = execucao[self.linhas]
+        self.inicios = np.searchsorted(codigos[ordem], np.arange(len(self.grupos) + 1))
+
+    def _cortes(self, limites, excecoes=None):
+        """Por grupo: (início, fim do OK, fim da ATENÇÃO, fim do CRÍTICO, fim) nas posições ordenadas"""
+        excecoes = excecoes or {}
+        for g, nome in enumerate(self.grupos):
+            inicio, fim = self.inicios[g], self.inicios[g + 1]
+            proprios = excecoes.get(nome, limites)
+            fatia = self.ordenado[inicio:fim]
+            yield (
+                inicio,
+                inicio + np.searchsorted(fatia, proprios['ATENÇÃO'], side='left'),
+                inicio + np.searchsorted(fatia, proprios['CRÍTICO'], side='left'),
+                inicio + np.searchsorted(fatia, proprios['ESTOURADO'], side='right'),
+                fim,
+            )
+
+    def contar(self, limites=LIMITES_PADRAO, excecoes=None):
+        """Quantidade de itens por status com os limites informados"""
+        contagem = dict.fromkeys(STATUS_EXECUCAO, 0)
+        for cortes in self._cortes(limites, excecoes):
+            for status, inicio, fim in zip(STATUS_EXECUCAO, cortes, cortes[1:]):
+                contagem[status] += int(fim - inicio)
+        contagem['CRÍTICO'] += self.contagem_fixos['CRÍTICO']
+        contagem['SEM ORÇAMENTO'] = self.contagem_fixos['SEM ORÇAMENTO']
+        return contagem
+
+    def classificar(self, limites=LIMITES_PADRAO, excecoes=None):
+        """Array de status na ordem original do agregado"""
+        codigos = np.empty(len(self.linhas), dtype=np.int8)
+        for cortes in self._cortes(limites, excecoes):
+            for codigo, (inicio, fim) in enumerate(zip(cortes, cortes[1:])):
+                codigos[inicio:fim] = codigo
+        riscos = self.fixos.copy()
+        riscos[self.linhas] = STATUS[codigos]
+        return riscos
+
+
+def indexar_execucoes(agregados):
+    """Índices das tabelas reclassificáveis da visão: OSs, famílias e linhas (por família)"""
+    return {
+        'por_os': IndiceExecucao(agregados['por_os']),
+        'por_familia': IndiceExecucao(agregados['por_familia'], 'FAMILIA'),
+        'dados': IndiceExecucao(agregados['dados'], 'FAMILIA'),
+    }
+
+
+def aplicar_limites(agregados, indices, limites=LIMITES_PADRAO, excecoes=None):
+    """
+    Visão com o RISCO recalculado para os limites: OSs pelos limites gerais, famílias e
+    linhas com as exceções por família. Os agregados em si (e o cache) não são alterados.
+    """
+    visao = dict(agregados)
+    visao['por_os'] = agregados['por_os'].assign(RISCO=indices['por_os'].classificar(limites))
+    visao['por_familia'] = agregados['por_familia'].assign(
+        RISCO=indices['por_familia'].classificar(limites, excecoes))
+    visao['dados'] = agregados['dados'].assign(RISCO=indices['dados'].classificar(limites, excecoes))
+    return visao
@@ -0,0 +1,235 @@
+"""
+Monitor de pasta de exportações do ERP
+Detecta planilhas novas/alteradas, processa em paralelo e grava snapshots
+com os agregados pré-calculados para o app abrir sem upload. A leitura corre em paralelo,
+mas a gravação segue a ordem das exportações (mtime): o incremental de cada arquivo é
+calculado sobre a exportação imediatamente anterior a ele.
+
+Uso:
+    python -m cmv.monitor /caminho/exportacoes --dados data/snapshots
+"""
+
+import argparse
+import fnmatch
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from cmv.ingestao import IngestaoPlanilha, hash_conteudo
+from cmv.leitores import ASSINATURA_PARQUET, TIPOS
+from cmv.snapshots import (
+    DIRETORIO_PADRAO,
+    atualizar_origem,
+    carregar_snapshot,
+    existe_snapshot,
+    marcar_ultimo,
+    salvar_snapshot,
+    snapshot_anterior,
+)
+from cmv.visoes import precalcular_visoes
+
+logger = logging.getLogger('cmv.monitor')
+
+PADROES = tuple(f'*.{tipo}' for tipo in TIPOS)
+
+# Tipos gravados como zip: só são lidos depois que o diretório central existe
+TIPOS_ZIP = ('.xlsx', '.xlsb', '.ods')
+
+# Segundos sem modificação antes de considerar o arquivo completo
+ESTABILIDADE = 10.0
+INTERVALO = 5.0
+
+
+def ingerir_arquivo(caminho, diretorio=DIRETORIO_PADRAO, liberado=None):
+    """
+    Processa um arquivo e grava o snapshot (executa no processo worker); retorna os metadados.
+    Com `liberado` (Event), a leitura corre logo e a gravação espera o evento.
+    """
+    mtime = os.path.getmtime(caminho)
+    hash_arquivo = hash_conteudo(caminho)
+    if existe_snapshot(hash_arquivo, diretorio):
+        if liberado is not None:
+            liberado.wait()
+        # Mesmo conteúdo com outro nome: meta.json e 'ultimo' ficam com a mesma origem
+        return atualizar_origem(hash_arquivo, os.path.basename(caminho), mtime, diretorio)
+
+    # Lido direto do disco; arquivos grandes são compactados por (OS, FAMILIA) durante a leitura
+    ingestao = IngestaoPlanilha(caminho, hash_arquivo=hash_arquivo).iniciar()
+    ingestao.aguardar()
+    if ingestao.erro:
+        raise ValueError(ingestao.erro)
+
+    if liberado is not None:
+        liberado.wait()
+    # Exportações consecutivas mudam poucas linhas: agrega de forma incremental sobre a exportação
+    # anterior a esta (pelo mtime), e não sobre a última gravada: arquivos atrasados têm a base certa
+    anterior = snapshot_anterior(mtime, diretorio)
+    base = carregar_snapshot(anterior['hash'], diretorio) if anterior else None
+
+    meta = salvar_snapshot(
+        ingestao.resultado(), hash_arquivo, ingestao.formato,
+        origem=os.path.basename(caminho),
+        origem_mtime=mtime,
+        diretorio=diretorio,
+        base=base,
+        validacao=ingestao.validacao,
+    )
+
+    # Visões salvas já calculadas sobre o novo dataset; uma falha aqui não perde a exportação
+    try:
+        precalcular_visoes(hash_arquivo, diretorio)
+    except Exception:
+        logger.exception("Falha ao pré-calcular as visões de %s", caminho)
+    return meta
+
+
+def arquivo_completo(caminho, mtime, agora, estabilidade=ESTABILIDADE):
+    """Debounce: sem escrita recente e, para zip/Parquet, com o diretório central/rodapé já gravado"""
+    if agora - mtime < estabilidade:
+        return False
+    if caminho.lower().endswith(TIPOS_ZIP):
+        return zipfile.is_zipfile(caminho)
+    if caminho.lower().endswith('.parquet'):
+        with open(caminho, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < 8:
+                return False
+            f.seek(-4, os.SEEK_END)
+            return f.read(4) == ASSINATURA_PARQUET
+    return True
+
+
+class MonitorPasta:
+    """Varre a pasta periodicamente e envia arquivos prontos para um pool de processos"""
+
+    def __init__(self, pasta, diretorio=DIRETORIO_PADRAO, intervalo=INTERVALO,
+                 estabilidade=ESTABILIDADE, workers=None, padroes=PADROES):
+        self.pasta = pasta
+        self.diretorio = diretorio
+        self.intervalo = intervalo
+        self.estabilidade = estabilidade
+        self.workers = workers
+        self.padroes = padroes
+        self._processados = {}
+        # futuro -> (caminho, assinatura, evento que libera a gravação), na ordem de envio
+        self._em_andamento = {}
+        self._manager = None
+        self._parar = threading.Event()
+
+    def _candidatos(self):
+        """Arquivos da pasta que casam com os padrões, com (tamanho, mtime)"""
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                nome = entrada.name
+                # Ignora arquivos de lock do Excel e ocultos
+                if nome.startswith(('~$', '.')) or not entrada.is_file():
+                    continue
+                if not any(fnmatch.fnmatch(nome.lower(), p) for p in self.padroes):
+                    continue
+                st = entrada.stat()
+                yield entrada.path, (st.st_size, st.st_mtime)
+
+    def arquivos_prontos(self):
+        """Arquivos novos ou alterados desde o último processamento e já estáveis"""
+        agora = time.time()
+        em_andamento = {caminho for caminho, _, _ in self._em_andamento.values()}
+        prontos = []
+        for caminho, assinatura in self._candidatos():
+            if self._processados.get(caminho) == assinatura or caminho in em_andamento:
+                continue
+            if arquivo_completo(caminho, assinatura[1], agora, self.estabilidade):
+                prontos.append((caminho, assinatura))
+        return prontos
+
+    def _registrar(self, futuro, caminho, assinatura):
+        # Mesmo em erro a assinatura é registrada: só reprocessa se o arquivo mudar
+        self._processados[caminho] = assinatura
+        try:
+            meta = futuro.result()
+        except Exception:
+            logger.exception("Falha ao processar %s", caminho)
+            return
+        atualizado = marcar_ultimo(meta, self.diretorio)
+        logger.info(
+            "Processado %s: %s linhas, %s OSs%s",
+            caminho, meta['linhas'], meta['oss'], " (último dataset)" if atualizado else "",
+        )
+
+    def varrer(self, executor):
+        """Envia os arquivos prontos ao pool, do mais antigo ao mais novo, e registra os concluídos"""
+        for caminho, assinatura in sorted(self.arquivos_prontos(), key=lambda item: item[1][1]):
+            liberado = self._manager.Event() if self._manager is not None else None
+            futuro = executor.submit(ingerir_arquivo, caminho, self.diretorio, liberado)
+            self._em_andamento[futuro] = (caminho, assinatura, liberado)
+
+        for futuro in [f for f in self._em_andamento if f.done()]:
+            caminho, assinatura, _ = self._em_andamento.pop(futuro)
+            self._registrar(futuro, caminho, assinatura)
+        self._liberar()
+
+    def _liberar(self):
+        """
+        Libera a gravação de cada arquivo em andamento sem arquivo mais antigo enviado antes dele
+        ainda em andamento. Só os enviados antes contam: o pool os executa primeiro, sem espera
+        circular entre os workers.
+        """
+        anteriores = []
+        for _, (_, mtime), liberado in self._em_andamento.values():
+            if liberado is not None and not liberado.is_set() and all(m >= mtime for m in anteriores):
+                liberado.set()
+            anteriores.append(mtime)
+
+    def executar(self, uma_vez=False):
+        """Loop principal; com uma_vez=True processa o que estiver pronto e retorna"""
+        os.makedirs(self.diretorio, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor, multiprocessing.Manager() as manager:
+            self._manager = manager
+            try:
+                while True:
+                    self.varrer(executor)
+                    if uma_vez and not self._em_andamento:
+                        return
+                    if self._parar.wait(self.intervalo if not uma_vez else 0.1):
+                        return
+            finally:
+                # Workers esperando a vez não podem travar o encerramento do pool
+                for _, _, liberado in self._em_andamento.values():
+                    liberado.set()
+                self._manager = None
+
+    def parar(self):
+        self._parar.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monitora a pasta de exportações do ERP e pré-processa os datasets")
+    parser.add_argument('pasta', help="Pasta onde o ERP grava as exportações")
+    parser.add_argument('--dados', default=DIRETORIO_PADRAO, help="Diretório dos snapshots (padrão: %(default)s)")
+    parser.add_argument('--intervalo', type=float, default=INTERVALO, help="Segundos entre varreduras")
+    parser.add_argument('--estabilidade', type=float, default=ESTABILIDADE,
+                        help="Segundos sem modificação antes de processar um arquivo")
+    parser.add_argument('--workers', type=int, default=None, help="Processos em paralelo (padrão: nº de CPUs)")
+    parser.add_argument('--uma-vez', action='store_true', help="Processa os arquivos prontos e encerra")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    monitor = MonitorPasta(
+        args.pasta,
+        diretorio=args.dados,
+        intervalo=args.intervalo,
+        estabilidade=args.estabilidade,
+        workers=args.workers,
+    )
+    logger.info("Monitorando %s -> %s", args.pasta, args.dados)
+    try:
+        monitor.executar(uma_vez=args.uma_vez)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Partições por empresa
+Exportações multiempresa repetem números de OS entre empresas: cada EMPRESA é
+uma partição com linhas, agregados e snapshot próprios, calculados em paralelo.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cmv.incremental import hash_linhas, reingerir
+from cmv.processamento import (
+    COLUNAS_DADOS,
+    classificar_agregado,
+    classificar_familias,
+    classificar_os,
+    somar_grupos,
+)
+
+# Resumos de mudança somados entre partições
+CAMPOS_RESUMO = [
+    'linhas_removidas', 'linhas_adicionadas', 'novas', 'removidas', 'alteradas',
+    'oss_afetadas', 'familias_afetadas',
+]
+
+
+def particionar(df):
+    """Linhas de cada empresa: dict EMPRESA -> DataFrame"""
+    return {empresa: grupo.reset_index(drop=True) for empresa, grupo in df.groupby('EMPRESA', sort=True)}
+
+
+def base_vazia():
+    """Partição sem linhas: base para uma empresa que não existia na exportação anterior"""
+    dados = pd.DataFrame({col: pd.Series(dtype=object if col in ('EMPRESA', 'OS', 'FAMILIA') else float)
+                          for col in COLUNAS_DADOS})
+    return {
+        'dados': dados,
+        'por_os': classificar_os(dados),
+        'por_familia': classificar_familias(dados),
+        'hashes': np.array([], dtype=np.uint64),
+    }
+
+
+def calcular_agregados(df, base=None):
+    """
+    Agregados por OS e família de uma partição.
+    Com a partição base, reaproveita os agregados dela e aplica só o diff de linhas.
+    """
+    if base is not None and 'LINHAS' in base['por_os']:
+        return reingerir(base, df)
+
+    return {
+        'dados': df,
+        'por_os': classificar_os(df),
+        'por_familia': classificar_familias(df),
+        'hashes': hash_linhas(df),
+    }
+
+
+def em_paralelo(funcao, itens, workers=None):
+    """Aplica funcao(chave, valor) a cada item num pool de threads; retorna dict chave -> resultado"""
+    if len(itens) <= 1:
+        return {chave: funcao(chave, valor) for chave, valor in itens.items()}
+
+    workers = workers or min(len(itens), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futuros = {chave: executor.submit(funcao, chave, valor) for chave, valor in itens.items()}
+        return {chave: futuro.result() for chave, futuro in futuros.items()}
+
+
+def calcular_particoes(df, bases=None, workers=None):
+    """
+    Agregados de cada empresa, em paralelo.
+    `bases` (dict EMPRESA -> partição do snapshot anterior) liga o cálculo incremental;
+    empresas novas são comparadas com uma partição vazia. Empresas que saíram da
+    exportação não geram partição (nem entram no resumo de mudanças).
+    """
+    def calcular(empresa, dados):
+        if bases is None:
+            return calcular_agregados(dados)
+        return calcular_agregados(dados, bases.get(empresa) or base_vazia())
+
+    return em_paralelo(calcular, particionar(df), workers)
+
+
+def resumir_particoes(particoes):
+    """Soma os resumos de mudança das partições (None se nenhuma foi calculada sobre uma base)"""
+    resumos = [p['resumo'] for p in particoes.values() if 'resumo' in p]
+    if not resumos:
+        return None
+    return {campo: sum(resumo[campo] for resumo in resumos) for campo in CAMPOS_RESUMO}
+
+
+def combinar_particoes(particoes):
+    """
+    Visão única de uma ou mais partições: linhas, OSs, mudanças e transições concatenadas
+    (já trazem EMPRESA) e famílias somadas entre empresas.
+    """
+    if len(particoes) == 1:
+        visao = dict(next(iter(particoes.values())))
+    else:
+        def juntar(tabela):
+            tabelas = [p[tabela] for p in particoes.values() if tabela in p]
+            return pd.concat(tabelas, ignore_index=True) if tabelas else None
+
+        visao = {nome: juntar(nome) for nome in ['dados', 'por_os', 'mudancas', 'transicoes']}
+        visao = {nome: tabela for nome, tabela in visao.items() if tabela is not None}
+
+        familias = pd.concat([p['por_familia'] for p in particoes.values()], ignore_index=True)
+        por_familia = classificar_agregado(somar_grupos(familias, 'FAMILIA').reset_index(), 'EXEC_%')
+        visao['por_familia'] = por_familia.sort_values('EXEC_%', ascending=False)
+
+        if 'mudancas' in visao:
+            ordem = visao['mudancas']['DELTA_REALIZADO'].abs().sort_values(ascending=False).index
+            visao['mudancas'] = visao['mudancas'].reindex(ordem)
+
+    visao.pop('hashes', None)
+    resumo = resumir_particoes(particoes)
+    if resumo is not None:
+        visao['resumo'] = resumo
+    return visao
@@ -0,0 +1,202 @@
+"""
+Previsão de estouro pela tendência de consumo (burn rate)
+Com o histórico de exportações (snapshots), ajusta uma reta REALIZADO × tempo para
+cada OS e cada OS × FAMILIA e projeta quando cada uma cruza 90% e 100% do PREVISTO.
+Todas as séries são ajustadas de uma vez: uma matriz séries × datas e um único
+mínimos quadrados vetorizado, sem laço por OS.
+
+Uso:
+    python -m cmv.previsao                      # último snapshot + anteriores
+    python -m cmv.previsao --nivel familia --saida previsao.csv
+"""
+
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cmv.processamento import CHAVE_DETALHE, CHAVE_OS, agregar
+from cmv.snapshots import (
+    DIRETORIO_PADRAO,
+    carregar_particao,
+    data_snapshot,
+    empresas_snapshot,
+    listar_snapshots,
+)
+
+# Exportações usadas no ajuste (a atual + as anteriores mais recentes)
+JANELA_PADRAO = 8
+# Estouro projetado dentro deste prazo (dias) vira ESTOURO PREVISTO
+HORIZONTE_PADRAO = 90
+# Projeções além deste prazo (dias) são descartadas: consumo parado na prática
+ALCANCE_MAXIMO = 3650
+
+MARCOS = {'DATA_90': 0.9, 'DATA_100': 1.0}
+ESTOURO_PREVISTO = 'ESTOURO PREVISTO'
+COLUNAS_PREVISAO = ['TENDENCIA_DIA', 'PONTOS', *MARCOS, 'PREVISAO']
+
+NIVEIS = {'os': CHAVE_OS, 'familia': CHAVE_DETALHE}
+
+
+def ajustar_tendencias(dias, valores):
+    """
+    Inclinação (R$/dia) de cada linha de `valores` (séries × datas) contra `dias`:
+    mínimos quadrados de todas as séries de uma vez pelas somas das equações normais.
+    NaN é ponto ausente; séries com menos de duas datas ficam com NaN.
+    Retorna (inclinação, pontos por série).
+    """
+    valores = np.asarray(valores, dtype=float)
+    presente = ~np.isnan(valores)
+    t = np.where(presente, np.asarray(dias, dtype=float)[None, :], 0.0)
+    y = np.where(presente, valores, 0.0)
+
+    n = presente.sum(axis=1)
+    soma_t = t.sum(axis=1)
+    soma_y = y.sum(axis=1)
+    soma_tt = (t * t).sum(axis=1)
+    soma_ty = (t * y).sum(axis=1)
+    denominador = n * soma_tt - soma_t ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inclinacao = np.where(denominador > 0, (n * soma_ty - soma_t * soma_y) / denominador, np.nan)
+    return inclinacao, n
+
+
+def montar_historico(pontos, chave):
+    """
+    Matriz séries × datas do REALIZADO a partir de [(data, DataFrame)] em ordem
+    cronológica (uma linha por chave em cada ponto). As séries são as chaves do último
+    ponto; chaves ausentes num ponto anterior ficam NaN. Retorna (dias até o último ponto, matriz).
+    """
+    datas = pd.DatetimeIndex([data for data, _ in pontos])
+    dias = ((datas - datas[-1]) / pd.Timedelta(days=1)).to_numpy()
+    series = pd.MultiIndex.from_frame(pontos[-1][1][chave])
+
+    matriz = np.full((len(series), len(pontos)), np.nan)
+    for coluna, (_, df) in enumerate(pontos):
+        posicoes = series.get_indexer(pd.MultiIndex.from_frame(df[chave]))
+        encontradas = posicoes >= 0
+        matriz[posicoes[encontradas], coluna] = df['REALIZADO'].to_numpy(dtype=float)[encontradas]
+    return dias, matriz
+
+
+def prever(pontos, chave, horizonte=HORIZONTE_PADRAO):
+    """
+    Previsão para cada linha do último ponto: TENDENCIA_DIA (R$/dia ajustado no histórico),
+    PONTOS (exportações no ajuste), DATA_90/DATA_100 (quando o REALIZADO atual, seguindo a
+    tendência, cruza 90%/100% do PREVISTO; NaT se já cruzou ou o consumo não cresce) e
+    PREVISAO (ESTOURO PREVISTO se o 100% cai dentro do horizonte em dias).
+    """
+    data_atual, atual = pontos[-1]
+    dias, matriz = montar_historico(pontos, chave)
+    inclinacao, n = ajustar_tendencias(dias, matriz)
+
+    previsto = atual['PREVISTO'].to_numpy(dtype=float)
+    realizado = atual['REALIZADO'].to_numpy(dtype=float)
+    referencia = np.datetime64(pd.Timestamp(data_atual).normalize(), 'ns')
+    colunas = {'TENDENCIA_DIA': inclinacao, 'PONTOS': n}
+    for marco, fracao in MARCOS.items():
+        falta = fracao * previsto - realizado
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prazo = np.ceil(np.where((previsto > 0) & (falta > 0) & (inclinacao > 0), falta / inclinacao, np.nan))
+        prazo[prazo > ALCANCE_MAXIMO] = np.nan
+        colunas[marco] = referencia + pd.to_timedelta(prazo, unit='D').to_numpy()
+
+    limite = referencia + np.timedelta64(int(horizonte), 'D')
+    colunas['PREVISAO'] = np.where(colunas['DATA_100'] <= limite, ESTOURO_PREVISTO, '')
+    return pd.DataFrame({**{c: atual[c].to_numpy() for c in chave}, **colunas})
+
+
+def alinhar_previsao(previsao, df, chave):
+    """Colunas de previsão para as linhas de `df` (várias linhas por chave são aceitas)"""
+    posicoes = pd.MultiIndex.from_frame(previsao[chave]).get_indexer(pd.MultiIndex.from_frame(df[chave]))
+    vazia = pd.DataFrame({col: previsao[col].iloc[:0] for col in COLUNAS_PREVISAO}).reindex([0])
+    vazia['PREVISAO'] = ''
+    tabela = pd.concat([previsao[COLUNAS_PREVISAO], vazia], ignore_index=True)
+    return df.assign(**{col: tabela[col].to_numpy()[posicoes] for col in COLUNAS_PREVISAO})
+
+
+def snapshots_anteriores(hash_atual, data_atual=None, diretorio=DIRETORIO_PADRAO, janela=JANELA_PADRAO):
+    """
+    Metadados dos snapshots anteriores à exportação atual (os `janela - 1` mais recentes).
+    Retorna (data da exportação atual, metadados), do mais antigo ao mais recente.
+    """
+    metas = listar_snapshots(diretorio)
+    atual = next((meta for meta in metas if meta['hash'] == hash_atual), None)
+    if atual is not None:
+        data_atual = data_snapshot(atual)
+    elif data_atual is None:
+        data_atual = datetime.now()
+    anteriores = [meta for meta in metas if meta['hash'] != hash_atual and data_snapshot(meta) < data_atual]
+    return data_atual, anteriores[-(janela - 1):] if janela > 1 else []
+
+
+def ponto_do_snapshot(meta, empresas, diretorio=DIRETORIO_PADRAO):
+    """Totais por OS e por OS × FAMILIA de um snapshot, nas empresas pedidas"""
+    particoes = [
+        carregar_particao(meta['hash'], empresa, diretorio, tabelas=['dados', 'por_os'])
+        for empresa in empresas_snapshot(meta) if empresa in empresas
+    ]
+    if not particoes:
+        return None
+    return {
+        'os': pd.concat([p['por_os'] for p in particoes], ignore_index=True),
+        'familia': agregar(pd.concat([p['dados'] for p in particoes], ignore_index=True), CHAVE_DETALHE),
+    }
+
+
+def prever_agregados(agregados, data_atual, anteriores, empresas, diretorio=DIRETORIO_PADRAO,
+                     horizonte=HORIZONTE_PADRAO):
+    """
+    Agregados com as colunas de previsão em por_os (nível OS) e em dados (nível OS × FAMILIA),
+    mais 'previsao' com data de referência, exportações usadas e horizonte.
+    Sem exportação anterior não há tendência e os agregados voltam inalterados.
+    """
+    historico = [(data_snapshot(meta), ponto_do_snapshot(meta, empresas, diretorio)) for meta in anteriores]
+    historico = [(data, ponto) for data, ponto in historico if ponto is not None]
+    if not historico:
+        return agregados
+
+    atual = {'os': agregados['por_os'], 'familia': agregar(agregados['dados'], CHAVE_DETALHE)}
+    previsoes = {
+        nivel: prever([(data, ponto[nivel]) for data, ponto in historico] + [(data_atual, atual[nivel])],
+                      NIVEIS[nivel], horizonte)
+        for nivel in NIVEIS
+    }
+    por_os = agregados['por_os'].assign(**{col: previsoes['os'][col].to_numpy() for col in COLUNAS_PREVISAO})
+    return {
+        **agregados,
+        'por_os': por_os,
+        'dados': alinhar_previsao(previsoes['familia'], agregados['dados'], CHAVE_DETALHE),
+        'previsao': {'data': data_atual, 'pontos': len(historico) + 1, 'horizonte': horizonte},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Projeta o estouro de cada OS (ou OS × família) pela tendência de consumo")
+    parser.add_argument('--dados', default=DIRETORIO_PADRAO, help="Diretório de snapshots (padrão: %(default)s)")
+    parser.add_argument('--nivel', choices=sorted(NIVEIS), default='os')
+    parser.add_argument('--horizonte', type=int, default=HORIZONTE_PADRAO, help="Dias (padrão: %(default)s)")
+    parser.add_argument('--janela', type=int, default=JANELA_PADRAO, help="Exportações no ajuste (padrão: %(default)s)")
+    parser.add_argument('--saida', default=None, help="CSV com a previsão de todas as séries")
+    args = parser.parse_args(argv)
+
+    metas = listar_snapshots(args.dados)
+    if len(metas) < 2:
+        parser.exit(1, "São necessárias ao menos duas exportações processadas para projetar tendências.\n")
+    metas = metas[-args.janela:]
+    empresas = set().union(*(empresas_snapshot(meta) for meta in metas))
+    pontos = [(data_snapshot(meta), ponto_do_snapshot(meta, empresas, args.dados)) for meta in metas]
+    previsao = prever([(data, ponto[args.nivel]) for data, ponto in pontos], NIVEIS[args.nivel], args.horizonte)
+
+    estouros = previsao[previsao['PREVISAO'] == ESTOURO_PREVISTO].sort_values('DATA_100')
+    print(f"{len(estouros)} de {len(previsao)} série(s) com estouro previsto em até {args.horizonte} dias "
+          f"({len(pontos)} exportações, referência {pontos[-1][0]:%d/%m/%Y})")
+    if len(estouros):
+        print(estouros.head(20).to_string(index=False))
+    if args.saida:
+        previsao.to_csv(args.saida, index=False, encoding='utf-8-sig')
+
+
+if __name__ == '__main__':
+    main()
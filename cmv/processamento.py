@@ -0,0 +1,308 @@
+"""
+Processamento da planilha CMV
+Detecção de formato, parsing, normalização e agregação
+"""
+
+import numpy as np
+import pandas as pd
+
+COLUNAS = ['OS', 'FAMILIA', 'PREVISTO', 'REALIZADO', 'SALDO']
+COLUNAS_VALOR = ['PREVISTO', 'REALIZADO', 'SALDO']
+
+# EMPRESA é a chave de partição: o mesmo número de OS pode existir em empresas diferentes.
+# Layouts sem a coluna (planilha formatada) ficam numa partição única com EMPRESA_PADRAO.
+EMPRESA_PADRAO = ''
+COLUNAS_DADOS = ['EMPRESA'] + COLUNAS
+CHAVE_OS = ['EMPRESA', 'OS']
+CHAVE_DETALHE = ['EMPRESA', 'OS', 'FAMILIA']
+CABECALHOS_OS = ['O_S', 'OS', 'O.S.', 'O.S']
+
+# Limites de execução (%) por status: ATENÇÃO e CRÍTICO a partir do limite, ESTOURADO acima dele
+LIMITES_PADRAO = {'ATENÇÃO': 70.0, 'CRÍTICO': 90.0, 'ESTOURADO': 100.0}
+
+# Status de itens com orçamento, do menor para o maior risco
+STATUS_EXECUCAO = ['OK', 'ATENÇÃO', 'CRÍTICO', 'ESTOURADO']
+
+# Linhas inspecionadas para detectar o formato e localizar o cabeçalho
+LINHAS_CABECALHO = 10
+
+# Parsers de layout registrados (nome -> rotulo, detectar, iniciar), em ordem de detecção.
+# iniciar(df_inicio) retorna (linha onde começam os dados, normalizar_bloco(df, coercoes)).
+# O parser sem função de detecção é o padrão quando nenhum outro reconhece a planilha.
+PARSERS = {}
+FORMATO_PADRAO = 'comprador'
+
+
+def registrar_parser(nome, rotulo, detectar=None):
+    """Decorador: registra um parser de layout de planilha"""
+    def decorador(iniciar):
+        PARSERS[nome] = {'rotulo': rotulo, 'detectar': detectar, 'iniciar': iniciar}
+        return iniciar
+    return decorador
+
+
+def detectar_formato(df_raw):
+    """Detecta o formato da planilha pelo primeiro parser que a reconhece (ex.: 'raw_erp' ou 'comprador')"""
+    for nome, parser in PARSERS.items():
+        if parser['detectar'] is not None and parser['detectar'](df_raw):
+            return nome
+    return FORMATO_PADRAO
+
+
+def localizar_cabecalho(df_raw):
+    """Retorna o índice da linha de cabeçalho da planilha formatada (ou None)"""
+    for idx in range(min(LINHAS_CABECALHO, len(df_raw))):
+        first_cell = str(df_raw.iloc[idx, 0]).strip().upper()
+        if first_cell in CABECALHOS_OS:
+            return idx
+    return None
+
+
+def registrar_coercoes(df, col, valores, coercoes):
+    """Anota as células não vazias que o to_numeric converteu em NaN"""
+    invalidos = valores.isna() & df[col].notna()
+    if not invalidos.any():
+        return
+
+    originais = df.loc[invalidos, col].astype(str).str.strip()
+    preenchidos = originais != ''
+    originais = originais[preenchidos]
+    if len(originais) == 0:
+        return
+
+    coercoes.append(pd.DataFrame({
+        'OS': df.loc[originais.index, 'OS'].astype(str).str.strip(),
+        'FAMILIA': df.loc[originais.index, 'FAMILIA'].astype(str).str.strip(),
+        'COLUNA': col,
+        'VALOR_ORIGINAL': originais,
+    }))
+
+
+def texto_os(serie):
+    """
+    OS como texto. Células numéricas inteiras vindas como float (calamine lê todo número
+    como float; read_excel usa float64 em colunas com vazios) viram '1001', não '1001.0';
+    textos ficam como estão.
+    """
+    if pd.api.types.is_float_dtype(serie):
+        numeros = serie
+    else:
+        numeros = serie[serie.map(type).isin([float, np.float64])].astype(float)
+    inteiros = numeros[np.isfinite(numeros) & (numeros % 1 == 0)]
+
+    texto = serie.astype(str).str.strip()
+    if len(inteiros):
+        texto[inteiros.index] = inteiros.astype('int64').astype(str)
+    return texto
+
+
+def normalizar(df, coercoes=None):
+    """
+    Remove linhas sem OS e normaliza tipos das colunas padrão (EMPRESA primeiro).
+    Se `coercoes` for uma lista, recebe as células não numéricas convertidas para 0.
+    """
+    df = df[df['OS'].notna()].copy()
+
+    if 'EMPRESA' in df:
+        df['EMPRESA'] = df['EMPRESA'].fillna(EMPRESA_PADRAO).astype(str).str.strip()
+    else:
+        df.insert(0, 'EMPRESA', EMPRESA_PADRAO)
+
+    for col in COLUNAS_VALOR:
+        valores = pd.to_numeric(df[col], errors='coerce')
+        if coercoes is not None:
+            registrar_coercoes(df, col, valores, coercoes)
+        df[col] = valores.fillna(0)
+
+    df['OS'] = texto_os(df['OS'])
+    # Família em branco vira '' (astype(str) mantém NaN no pandas 3)
+    df['FAMILIA'] = df['FAMILIA'].fillna('').astype(str).str.strip()
+
+    return df
+
+
+def nomes_colunas_raw_erp(linha_cabecalho):
+    """Normaliza os nomes da linha de cabeçalho do RAW-ERP"""
+    return [str(c).strip().upper() for c in linha_cabecalho]
+
+
+def normalizar_raw_erp(df, coercoes=None):
+    """Normaliza linhas do RAW-ERP já com os nomes de coluna do cabeçalho"""
+    df = df.rename(columns={
+        'NUMERO_SERVICO': 'OS',
+        'VALORTOTALCOMPRADO': 'REALIZADO'
+    })
+
+    df = df[[col for col in COLUNAS_DADOS if col in df]].copy()
+
+    return normalizar(df, coercoes)
+
+
+def normalizar_comprador(df, coercoes=None):
+    """Normaliza linhas da planilha formatada (abaixo do cabeçalho)"""
+    df = df.copy()
+    df.columns = COLUNAS
+    df = df.reset_index(drop=True)
+
+    df = df[df['OS'].notna()].copy()
+    df = df[~df['OS'].astype(str).str.upper().isin(CABECALHOS_OS)].copy()
+
+    return normalizar(df, coercoes)
+
+
+def _detectar_raw_erp(df_raw):
+    first_row = [str(c).strip().upper() for c in df_raw.iloc[0].tolist()]
+    return 'EMPRESA' in first_row or 'NUMERO_SERVICO' in first_row
+
+
+@registrar_parser('raw_erp', "**RAW-ERP** (exportação direta do sistema)", detectar=_detectar_raw_erp)
+def iniciar_raw_erp(df_inicio):
+    """RAW-ERP: cabeçalho na primeira linha, colunas localizadas pelo nome"""
+    colunas = nomes_colunas_raw_erp(df_inicio.iloc[0])
+
+    def normalizar_bloco(df, coercoes=None):
+        return normalizar_raw_erp(df.set_axis(colunas, axis=1), coercoes)
+
+    return 1, normalizar_bloco
+
+
+@registrar_parser('comprador', "**Planilha Formatada** (layout padrão comprador)")
+def iniciar_comprador(df_inicio):
+    """Planilha formatada: cabeçalho O_S nas primeiras linhas, colunas por posição"""
+    header_row = localizar_cabecalho(df_inicio)
+
+    if header_row is None:
+        raise ValueError("Não foi possível identificar o cabeçalho.")
+
+    return header_row + 1, normalizar_comprador
+
+
+def processar_df_raw(df_raw, coercoes=None, formato=None):
+    """Aplica o parser do formato (detectado se não informado); retorna (df, formato)"""
+    formato = formato or detectar_formato(df_raw)
+    inicio, normalizar_bloco = PARSERS[formato]['iniciar'](df_raw.head(LINHAS_CABECALHO))
+    return normalizar_bloco(df_raw.iloc[inicio:].reset_index(drop=True), coercoes), formato
+
+
+def processar_raw_erp(df_raw):
+    """Parser para o formato RAW-ERP (6 colunas com EMPRESA e NUMERO_SERVICO)"""
+    return processar_df_raw(df_raw, formato='raw_erp')[0]
+
+
+def processar_comprador(df_raw):
+    """Parser para a planilha formatada (layout padrão comprador)"""
+    return processar_df_raw(df_raw, formato='comprador')[0]
+
+
+def processar_planilha(arquivo):
+    """Pipeline de processamento da planilha"""
+    df_raw = pd.read_excel(arquivo, header=None)
+    return processar_df_raw(df_raw)[0]
+
+
+def somar_grupos(df, chave):
+    """
+    Soma PREVISTO/REALIZADO/SALDO por chave, com a contagem de linhas (LINHAS).
+    Em dados já compactados (com coluna LINHAS) as contagens são somadas.
+    """
+    grupos = df.groupby(chave)
+    soma = grupos[COLUNAS_VALOR].sum()
+    soma['LINHAS'] = grupos['LINHAS'].sum() if 'LINHAS' in df else grupos.size()
+    return soma
+
+
+def agregar(df, chave):
+    """Soma PREVISTO/REALIZADO/SALDO por chave, com a contagem de linhas (LINHAS)"""
+    return somar_grupos(df, chave).reset_index()
+
+
+def compactar(df):
+    """
+    Soma as linhas por (EMPRESA, OS, FAMILIA) mantendo a contagem em LINHAS.
+    Aplicar de novo sobre parciais concatenados dá o mesmo resultado que sobre as linhas originais.
+    """
+    return agregar(df, CHAVE_DETALHE)
+
+
+def agregar_por_os(df):
+    """Agrega dados por OS (dentro de cada EMPRESA)"""
+    return agregar(df, CHAVE_OS)
+
+
+def agregar_por_familia(df):
+    """Agrega dados por FAMILIA"""
+    return agregar(df, 'FAMILIA')
+
+
+def classificar_risco(previsto, realizado, limites=LIMITES_PADRAO):
+    """Classifica o risco baseado na execução"""
+    if previsto == 0:
+        if realizado > 0:
+            return 'CRÍTICO'
+        return 'SEM ORÇAMENTO'
+
+    exec_pct = (realizado / previsto) * 100
+
+    if exec_pct > limites['ESTOURADO']:
+        return 'ESTOURADO'
+    elif exec_pct >= limites['CRÍTICO']:
+        return 'CRÍTICO'
+    elif exec_pct >= limites['ATENÇÃO']:
+        return 'ATENÇÃO'
+    else:
+        return 'OK'
+
+
+def classificar_riscos(previsto, realizado, limites=LIMITES_PADRAO):
+    """
+    classificar_risco vetorizado: arrays de PREVISTO e REALIZADO -> array de status.
+    Os limites podem ser números ou arrays (um limite por linha, ex.: exceções por família).
+    """
+    previsto = np.asarray(previsto, dtype=float)
+    realizado = np.asarray(realizado, dtype=float)
+    sem_orcamento = previsto == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exec_pct = realizado / previsto * 100
+
+    return np.select(
+        [sem_orcamento & (realizado > 0), sem_orcamento, exec_pct > limites['ESTOURADO'],
+         exec_pct >= limites['CRÍTICO'], exec_pct >= limites['ATENÇÃO']],
+        ['CRÍTICO', 'SEM ORÇAMENTO', 'ESTOURADO', 'CRÍTICO', 'ATENÇÃO'],
+        default='OK',
+    ).astype(object)
+
+
+def limites_por_familia(familias, limites=LIMITES_PADRAO, excecoes=None):
+    """Limites linha a linha: os da família quando há exceção configurada, senão os gerais"""
+    if not excecoes:
+        return limites
+    return {
+        status: familias.map({familia: proprios[status] for familia, proprios in excecoes.items()})
+        .fillna(limite).to_numpy(dtype=float)
+        for status, limite in limites.items()
+    }
+
+
+def percentual_execucao(df):
+    """Percentual de execução (REALIZADO / PREVISTO), 0 quando não há orçamento"""
+    return (df['REALIZADO'] / df['PREVISTO'].replace(0, float('nan')) * 100).fillna(0)
+
+
+def classificar_agregado(agregado, coluna_exec, limites=LIMITES_PADRAO):
+    """Adiciona a coluna de execução e o RISCO a um agregado (altera o DataFrame)"""
+    agregado[coluna_exec] = percentual_execucao(agregado)
+    agregado['RISCO'] = classificar_riscos(agregado['PREVISTO'], agregado['REALIZADO'], limites)
+    return agregado
+
+
+def classificar_os(df, limites=LIMITES_PADRAO):
+    """Agrega por (EMPRESA, OS) e adiciona EXECUCAO_% e RISCO"""
+    return classificar_agregado(agregar_por_os(df), 'EXECUCAO_%', limites)
+
+
+def classificar_familias(df, limites=LIMITES_PADRAO, excecoes=None):
+    """Agrega por FAMILIA e adiciona EXEC_% e RISCO (com as exceções por família), ordenado por execução"""
+    df_familia = agregar_por_familia(df)
+    limites = limites_por_familia(df_familia['FAMILIA'], limites, excecoes)
+    df_familia = classificar_agregado(df_familia, 'EXEC_%', limites)
+    return df_familia.sort_values('EXEC_%', ascending=False)
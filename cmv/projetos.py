@@ -0,0 +1,225 @@
+"""
+Cadastro de projetos (cliente e proposta por OS)
+Base SQLite local indexada por OS, alimentada pelo projetos.json e por tabelas de
+projetos do ERP. O enriquecimento das linhas processadas é um merge pela chave
+(EMPRESA, OS) nas chaves distintas, sem percorrer linhas.
+
+Uso:
+    python -m cmv.projetos projetos.json
+    python -m cmv.projetos projetos_erp.csv --origem erp
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from cmv.processamento import (
+    CHAVE_OS,
+    EMPRESA_PADRAO,
+    agregar,
+    classificar_agregado,
+    texto_os,
+)
+
+CAMINHO_PADRAO = os.environ.get('CMV_PROJETOS', os.path.join('data', 'projetos.db'))
+
+COLUNAS_PROJETO = ['CLIENTE', 'PROPOSTA']
+SEM_CLIENTE = 'SEM CLIENTE'
+
+# Nomes aceitos para cada campo (projetos.json, planilha da carteira, tabelas do ERP)
+ALIASES = {
+    'EMPRESA': ['EMPRESA'],
+    'OS': ['OS', 'O_S', 'O.S.', 'O.S', 'NUMERO_SERVICO'],
+    'CLIENTE': ['CLIENTE', 'NOME_CLIENTE', 'RAZAO_SOCIAL'],
+    'PROPOSTA': ['PROPOSTA', 'NUMERO_PROPOSTA', 'COD_PROPOSTA'],
+}
+
+# Cadastro sem EMPRESA ('') vale para a OS em qualquer empresa; a chave primária indexa
+# (EMPRESA, OS) e o índice por OS atende as buscas sem empresa
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS projetos (
+    EMPRESA TEXT NOT NULL DEFAULT '',
+    OS TEXT NOT NULL,
+    CLIENTE TEXT,
+    PROPOSTA TEXT,
+    ORIGEM TEXT,
+    ATUALIZADO_EM TEXT,
+    PRIMARY KEY (EMPRESA, OS)
+);
+CREATE INDEX IF NOT EXISTS idx_projetos_os ON projetos (OS);
+"""
+
+logger = logging.getLogger('cmv.projetos')
+
+
+def normalizar_projetos(df):
+    """
+    Colunas padrão (EMPRESA, OS, CLIENTE, PROPOSTA) a partir dos aliases. OSs compostas
+    ("1159/1160/1161") viram uma linha por OS; a última ocorrência de cada chave vence.
+    """
+    colunas = {}
+    for campo, aliases in ALIASES.items():
+        # Mesma coluna com grafias diferentes (ex.: "os" e "OS" no JSON) é combinada
+        for original in [col for col in df.columns if str(col).strip().upper() in aliases]:
+            colunas[campo] = df[original] if campo not in colunas else colunas[campo].fillna(df[original])
+    if 'OS' not in colunas:
+        raise ValueError(f"Cadastro de projetos sem coluna de OS (aceitas: {', '.join(ALIASES['OS'])})")
+
+    projetos = pd.DataFrame(colunas).dropna(subset=['OS'])
+    projetos['OS'] = texto_os(projetos['OS']).str.split('/')
+    projetos = projetos.explode('OS', ignore_index=True)
+    projetos['OS'] = projetos['OS'].str.strip()
+    projetos = projetos[projetos['OS'] != '']
+
+    if 'EMPRESA' in projetos:
+        projetos['EMPRESA'] = projetos['EMPRESA'].fillna(EMPRESA_PADRAO).astype(str).str.strip()
+    else:
+        projetos['EMPRESA'] = EMPRESA_PADRAO
+    for campo in COLUNAS_PROJETO:
+        if campo in projetos:
+            valores = projetos[campo].astype(str).str.strip()
+            projetos[campo] = valores.where(projetos[campo].notna() & (valores != ''))
+        else:
+            projetos[campo] = None
+    return projetos.drop_duplicates(CHAVE_OS, keep='last')[CHAVE_OS + COLUNAS_PROJETO]
+
+
+def ler_projetos_json(arquivo):
+    """projetos.json: lista de projetos, {"projetos": [...]} ou {OS: {campos}}"""
+    with open(arquivo, encoding='utf-8') as f:
+        conteudo = json.load(f)
+    if isinstance(conteudo, dict):
+        listas = [valor for valor in conteudo.values() if isinstance(valor, list)]
+        if listas:
+            conteudo = listas[0]
+        else:
+            conteudo = [{'OS': os_, **campos} for os_, campos in conteudo.items() if isinstance(campos, dict)]
+    return pd.DataFrame(conteudo)
+
+
+def ler_tabela_projetos(arquivo):
+    """Tabela de projetos pela extensão: JSON, CSV (separador detectado), Parquet ou planilha"""
+    extensao = os.path.splitext(arquivo)[1].lower()
+    if extensao == '.json':
+        return ler_projetos_json(arquivo)
+    if extensao == '.csv':
+        return pd.read_csv(arquivo, sep=None, engine='python', dtype=str, encoding='utf-8-sig')
+    if extensao == '.parquet':
+        return pd.read_parquet(arquivo)
+    return pd.read_excel(arquivo, dtype=str)
+
+
+def conectar(caminho=CAMINHO_PADRAO):
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=30)
+    conexao.executescript(ESQUEMA)
+    return conexao
+
+
+def importar_projetos(df, origem, caminho=CAMINHO_PADRAO):
+    """
+    Grava (ou atualiza) o cadastro de uma fonte. Campos ausentes na fonte não apagam
+    os já cadastrados por outra. Retorna o número de OSs gravadas.
+    """
+    projetos = normalizar_projetos(df)
+    agora = datetime.now().isoformat(timespec='seconds')
+    registros = [
+        (empresa, os_, cliente, proposta, origem, agora)
+        for empresa, os_, cliente, proposta in projetos.astype(object).where(projetos.notna(), None).itertuples(index=False)
+    ]
+    conexao = conectar(caminho)
+    try:
+        with conexao:
+            conexao.executemany(
+                """
+                INSERT INTO projetos (EMPRESA, OS, CLIENTE, PROPOSTA, ORIGEM, ATUALIZADO_EM)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (EMPRESA, OS) DO UPDATE SET
+                    CLIENTE = COALESCE(excluded.CLIENTE, CLIENTE),
+                    PROPOSTA = COALESCE(excluded.PROPOSTA, PROPOSTA),
+                    ORIGEM = excluded.ORIGEM,
+                    ATUALIZADO_EM = excluded.ATUALIZADO_EM
+                """,
+                registros,
+            )
+    finally:
+        conexao.close()
+    logger.info("%d OS(s) de projetos importada(s) de %s", len(registros), origem)
+    return len(registros)
+
+
+def importar_arquivo(arquivo, origem=None, caminho=CAMINHO_PADRAO):
+    """Importa projetos.json ou uma tabela de projetos do ERP"""
+    return importar_projetos(ler_tabela_projetos(arquivo), origem or os.path.basename(arquivo), caminho)
+
+
+def versao_projetos(caminho=CAMINHO_PADRAO):
+    """Muda a cada importação (chave de cache); None sem base de projetos"""
+    try:
+        return os.stat(caminho).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def carregar_projetos(caminho=CAMINHO_PADRAO):
+    """Cadastro completo como DataFrame (EMPRESA, OS, CLIENTE, PROPOSTA)"""
+    if versao_projetos(caminho) is None:
+        return pd.DataFrame(columns=CHAVE_OS + COLUNAS_PROJETO)
+    conexao = conectar(caminho)
+    try:
+        return pd.read_sql_query('SELECT EMPRESA, OS, CLIENTE, PROPOSTA FROM projetos', conexao)
+    finally:
+        conexao.close()
+
+
+def enriquecer(df, projetos):
+    """
+    Adiciona CLIENTE e PROPOSTA por (EMPRESA, OS): merge com o cadastro da empresa e, onde
+    o campo ficou vazio, map por OS no cadastro sem empresa (vale para a OS em qualquer
+    empresa). OSs sem cadastro ficam como SEM CLIENTE. O merge é feito nas chaves
+    distintas, e as linhas recebem os campos pelo número do grupo.
+    """
+    grupos = df.groupby(CHAVE_OS, sort=False, dropna=False).ngroup().to_numpy()
+    chaves = df[CHAVE_OS].drop_duplicates(ignore_index=True)
+    projetos = projetos.astype({'EMPRESA': str, 'OS': str})
+    geral = projetos['EMPRESA'] == EMPRESA_PADRAO
+    por_empresa = chaves.merge(projetos[~geral], on=CHAVE_OS, how='left', validate='many_to_one')
+    por_os = projetos[geral].set_index('OS')
+
+    colunas = {}
+    for campo, padrao in zip(COLUNAS_PROJETO, [SEM_CLIENTE, '']):
+        valores = por_empresa[campo].fillna(chaves['OS'].map(por_os[campo])).fillna(padrao).astype(str)
+        colunas[campo] = valores.take(grupos).set_axis(df.index)
+    return df.assign(**colunas)
+
+
+def classificar_clientes(df, limites):
+    """Agrega linhas enriquecidas por CLIENTE, com OSS (quantidade de OSs), EXEC_% e RISCO"""
+    df_cliente = agregar(df, 'CLIENTE')
+    oss = df.drop_duplicates(['CLIENTE'] + CHAVE_OS)['CLIENTE'].value_counts()
+    df_cliente['OSS'] = oss.reindex(df_cliente['CLIENTE']).to_numpy()
+    df_cliente = classificar_agregado(df_cliente, 'EXEC_%', limites)
+    return df_cliente.sort_values('EXEC_%', ascending=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa projetos.json ou tabelas de projetos do ERP")
+    parser.add_argument('arquivos', nargs='+', help="projetos.json, CSV, Parquet ou planilha de projetos")
+    parser.add_argument('--origem', default=None, help="Nome da fonte (padrão: nome do arquivo)")
+    parser.add_argument('--base', default=CAMINHO_PADRAO, help="Base SQLite (padrão: %(default)s)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    for arquivo in args.arquivos:
+        importar_arquivo(arquivo, args.origem, args.base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Remanejamento de orçamento entre famílias da mesma OS
+Famílias estouradas recebem o saldo de famílias OK da mesma OS. O doador só cede a folga
+que o mantém abaixo do limite de ATENÇÃO, e o receptor recebe o suficiente para voltar
+ao limite de ESTOURADO. As transferências de todas as OSs saem de uma vez: doadores e
+receptores ordenados do maior para o menor em cada OS, e os acumulados dos dois lados
+cruzados por busca binária, sem laço por OS.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cmv.processamento import CHAVE_DETALHE, CHAVE_OS, LIMITES_PADRAO, agregar, limites_por_familia
+
+# Transferências menores que isto (R$) são arredondamento e saem da proposta
+VALOR_MINIMO = 0.01
+
+COLUNAS_TRANSFERENCIA = ['EMPRESA', 'OS', 'ORIGEM', 'DESTINO', 'VALOR']
+
+
+def folgas_e_deficits(detalhe, limites=LIMITES_PADRAO, excecoes=None):
+    """
+    Por OS × FAMILIA: folga (quanto do PREVISTO pode sair mantendo a execução abaixo de
+    ATENÇÃO) e déficit (quanto falta para a execução voltar ao limite de ESTOURADO).
+    """
+    limites = limites_por_familia(detalhe['FAMILIA'], limites, excecoes)
+    previsto = detalhe['PREVISTO'].to_numpy(dtype=float)
+    realizado = detalhe['REALIZADO'].to_numpy(dtype=float)
+    atencao = np.broadcast_to(np.asarray(limites['ATENÇÃO'], dtype=float), previsto.shape) / 100
+    estourado = np.broadcast_to(np.asarray(limites['ESTOURADO'], dtype=float), previsto.shape) / 100
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        folga = np.where((previsto > 0) & (atencao > 0), previsto - realizado / atencao, 0)
+        deficit = np.where((previsto > 0) & (estourado > 0), realizado / estourado - previsto, 0)
+    return np.clip(folga, 0, None), np.clip(deficit, 0, None)
+
+
+def _ordenar_por_os(codigos_os, valores):
+    """Posições com valor > 0 ordenadas por OS e, dentro da OS, do maior para o menor valor"""
+    posicoes = np.flatnonzero(valores > 0)
+    return posicoes[np.lexsort((-valores[posicoes], codigos_os[posicoes]))]
+
+
+def _acumulado_na_os(codigos_os, valores):
+    """Soma acumulada reiniciada a cada OS (entradas já agrupadas por OS)"""
+    acumulado = np.cumsum(valores)
+    inicio = np.r_[True, codigos_os[1:] != codigos_os[:-1]] if len(valores) else np.array([], dtype=bool)
+    primeira = np.maximum.accumulate(np.where(inicio, np.arange(len(valores)), 0))
+    return acumulado - (acumulado - valores)[primeira]
+
+
+def _fins(codigos_os, valores, cobertura, base):
+    """Fim de cada doador/receptor na linha única de valores: base da OS + acumulado até a cobertura"""
+    return base[codigos_os] + np.minimum(_acumulado_na_os(codigos_os, valores), cobertura[codigos_os])
+
+
+def propor_transferencias(dados, limites=LIMITES_PADRAO, excecoes=None):
+    """
+    Transferências sugeridas (EMPRESA, OS, ORIGEM, DESTINO, VALOR) e resumo por OS (DEFICIT,
+    COBERTO, DESCOBERTO, TRANSFERENCIAS) para todas as OSs das linhas.
+
+    As OSs ficam enfileiradas numa linha única de valores, cada uma com o trecho que dá
+    para cobrir (menor entre folga e déficit totais). Doadores e receptores ocupam
+    intervalos consecutivos do trecho da sua OS, do maior para o menor, e cada pedaço entre
+    dois fins de intervalo vira uma transferência. Começar pelos maiores reduz a quantidade
+    de transferências, limitada a doadores + receptores − 1 por OS. O mínimo exato seria um
+    problema de partição, e não é buscado.
+    """
+    detalhe = agregar(dados, CHAVE_DETALHE)
+    folga, deficit = folgas_e_deficits(detalhe, limites, excecoes)
+    codigos = detalhe.groupby(CHAVE_OS, sort=False).ngroup().to_numpy()
+    n_oss = int(codigos.max()) + 1 if len(codigos) else 0
+
+    doadores = _ordenar_por_os(codigos, folga)
+    receptores = _ordenar_por_os(codigos, deficit)
+    oferta = np.bincount(codigos[doadores], weights=folga[doadores], minlength=n_oss)
+    demanda = np.bincount(codigos[receptores], weights=deficit[receptores], minlength=n_oss)
+    cobertura = np.minimum(oferta, demanda)
+    base = np.r_[0, np.cumsum(cobertura)[:-1]] if n_oss else np.array([])
+
+    fim_doador = _fins(codigos[doadores], folga[doadores], cobertura, base)
+    fim_receptor = _fins(codigos[receptores], deficit[receptores], cobertura, base)
+    cortes = np.unique(np.concatenate([fim_doador, fim_receptor]))
+    inicios = np.r_[0, cortes[:-1]] if len(cortes) else cortes
+    valores = cortes - inicios
+    pedacos = valores >= VALOR_MINIMO
+    inicios, valores = inicios[pedacos], valores[pedacos]
+
+    origem = doadores[np.searchsorted(fim_doador, inicios, side='right')]
+    destino = receptores[np.searchsorted(fim_receptor, inicios, side='right')]
+    transferencias = pd.DataFrame({
+        'EMPRESA': detalhe['EMPRESA'].to_numpy()[destino],
+        'OS': detalhe['OS'].to_numpy()[destino],
+        'ORIGEM': detalhe['FAMILIA'].to_numpy()[origem],
+        'DESTINO': detalhe['FAMILIA'].to_numpy()[destino],
+        'VALOR': np.round(valores, 2),
+    })
+
+    primeira = ~detalhe.duplicated(CHAVE_OS).to_numpy()
+    por_os = detalhe.loc[primeira, CHAVE_OS].reset_index(drop=True).assign(
+        DEFICIT=np.round(demanda, 2),
+        COBERTO=np.round(cobertura, 2),
+        DESCOBERTO=np.round(demanda - cobertura, 2),
+        TRANSFERENCIAS=np.bincount(codigos[destino], minlength=n_oss),
+    )
+    return {'transferencias': transferencias, 'por_os': por_os[por_os['DEFICIT'] > 0].reset_index(drop=True)}
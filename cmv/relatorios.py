@@ -0,0 +1,408 @@
+"""
+Relatórios executivos em lote
+Um HTML por OS e um da carteira (resumo de risco, piores famílias, saldos negativos),
+com o layout dos cards do app e prontos para imprimir em PDF pelo navegador.
+As OSs são renderizadas num pool de processos; as que têm o mesmo hash de dados
+da última geração (e os mesmos limites de risco) não são renderizadas de novo. Cada
+dataset e conjunto de limites tem a sua subpasta: sessões e réplicas com outros dados ou
+limites nunca gravam nos mesmos arquivos.
+
+Uso:
+    python -m cmv.relatorios --saida data/relatorios
+"""
+
+import argparse
+import hashlib
+import html
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from string import Template
+
+import pandas as pd
+
+from cmv.formatacao import ESTILO_CARDS, formatar_moeda, get_classe_risco, get_cor_risco
+from cmv.processamento import (
+    CHAVE_DETALHE,
+    CHAVE_OS,
+    COLUNAS_DADOS,
+    COLUNAS_VALOR,
+    LIMITES_PADRAO,
+    classificar_risco,
+    classificar_riscos,
+    compactar,
+    limites_por_familia,
+    percentual_execucao,
+)
+
+logger = logging.getLogger('cmv.relatorios')
+
+DIRETORIO_PADRAO = os.environ.get('CMV_RELATORIOS', os.path.join('data', 'relatorios'))
+ARQUIVO_MANIFESTO = 'manifesto.json'
+# Nome da carteira dentro do zip; na pasta, leva o hash das OSs da geração (carteira_<hash>.html)
+ARQUIVO_CARTEIRA = 'carteira.html'
+
+# Incrementar quando o modelo dos relatórios mudar (invalida os já gerados)
+VERSAO_MODELO = 1
+
+# OSs por tarefa do pool: lotes maiores diluem o custo de enviar os dados ao processo
+OSS_POR_LOTE = 50
+
+# Itens nas listas de piores famílias/OSs e de saldos negativos
+TOP_FAMILIAS = 10
+TOP_OSS = 25
+
+STATUS_RELATORIO = ['ESTOURADO', 'CRÍTICO', 'ATENÇÃO', 'OK', 'SEM ORÇAMENTO']
+EMOJI_RISCO = {'ESTOURADO': '🔴', 'CRÍTICO': '🟠', 'ATENÇÃO': '🟡', 'OK': '🟢'}
+
+# Ajustes do layout dos cards para página clara e impressão (A4)
+ESTILO_RELATORIO = """
+body { font-family: -apple-system, "Segoe UI", Roboto, Arial, sans-serif; color: #222;
+       max-width: 960px; margin: 24px auto; padding: 0 16px; }
+h1 { font-size: 24px; margin-bottom: 4px; }
+h2 { font-size: 17px; margin-top: 28px; border-bottom: 1px solid #ddd; padding-bottom: 4px; }
+.subtitulo, footer { color: #666; font-size: 13px; }
+footer { margin-top: 32px; border-top: 1px solid #ddd; padding-top: 8px; }
+.exec-bar-container { background-color: #eee; }
+.familia-name a { color: inherit; }
+.vazio { color: #666; font-style: italic; }
+@page { size: A4; margin: 15mm; }
+@media print {
+    * { -webkit-print-color-adjust: exact; print-color-adjust: exact; }
+    body { margin: 0; max-width: none; }
+    h2 { break-after: avoid; }
+    .familia-row, .metric-row { break-inside: avoid; }
+}
+"""
+
+PAGINA = Template("""<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<title>$titulo</title>
+<style>$estilo</style>
+</head>
+<body>
+<header>
+<h1>$titulo</h1>
+<p class="subtitulo">$subtitulo</p>
+</header>
+$conteudo
+<footer>Gerado em $gerado_em · ARV Industrial</footer>
+</body>
+</html>
+""")
+
+METRICAS = Template("""
+<div class="metric-row">
+    <div class="metric-item"><div class="metric-label">Previsto</div><div class="metric-value">$previsto</div></div>
+    <div class="metric-item"><div class="metric-label">Realizado</div><div class="metric-value">$realizado</div></div>
+    <div class="metric-item"><div class="metric-label">Saldo</div><div class="metric-value $classe_saldo">$saldo</div></div>
+    <div class="metric-item"><div class="metric-label">Execução</div><div class="metric-value">$execucao</div></div>
+</div>
+<div class="exec-bar-container"><div class="exec-bar" style="width: $barra%; background-color: $cor;"></div></div>
+""")
+
+LINHA = Template("""
+<div class="familia-row familia-$classe">
+    <div class="familia-name">$nome</div>
+    <div class="familia-values">
+        <span>Prev: $previsto</span>
+        <span>Real: $realizado</span>
+        <span class="$classe_saldo">Saldo: $saldo</span>
+    </div>
+    <div class="familia-exec" style="color: $cor">$execucao</div>
+</div>
+""")
+
+
+def nome_arquivo(empresa, os_num):
+    """
+    Arquivo do relatório de uma OS (OSs compostas como 1159/1160 viram 1159_1160), com um hash
+    curto da empresa e da OS originais: 1159/1160 e 1159_1160 não caem no mesmo arquivo
+    """
+    partes = [empresa, os_num] if empresa else [os_num]
+    legivel = '_'.join(re.sub(r'[^\w.-]+', '_', str(p)).strip('_') for p in partes)
+    sufixo = hashlib.sha1(json.dumps([empresa, os_num], ensure_ascii=False).encode('utf-8')).hexdigest()[:8]
+    return f'os_{legivel}_{sufixo}.html'
+
+
+def _classe_saldo(saldo):
+    return 'metric-value-red' if saldo < 0 else 'metric-value-green'
+
+
+def _metricas(previsto, realizado, saldo, execucao, risco):
+    return METRICAS.substitute(
+        previsto=formatar_moeda(previsto),
+        realizado=formatar_moeda(realizado),
+        saldo=formatar_moeda(saldo),
+        classe_saldo=_classe_saldo(saldo),
+        execucao=f"{execucao:.1f}%",
+        barra=f"{min(max(execucao, 0), 100):.1f}",
+        cor=get_cor_risco(risco),
+    )
+
+
+def _linhas(df, coluna_nome, coluna_exec, link=None):
+    """Linhas no layout familia-row; `link(registro)` opcional gera o href do nome"""
+    partes = []
+    for registro in df.to_dict('records'):
+        nome = html.escape(str(registro[coluna_nome]))
+        if link is not None:
+            nome = f'<a href="{html.escape(link(registro))}">{nome}</a>'
+        partes.append(LINHA.substitute(
+            classe=get_classe_risco(registro['RISCO']),
+            nome=nome,
+            previsto=formatar_moeda(registro['PREVISTO']),
+            realizado=formatar_moeda(registro['REALIZADO']),
+            saldo=formatar_moeda(registro['SALDO']),
+            classe_saldo=_classe_saldo(registro['SALDO']),
+            execucao=f"{registro[coluna_exec]:.0f}%",
+            cor=get_cor_risco(registro['RISCO']),
+        ))
+    return ''.join(partes) or '<p class="vazio">Nenhum item.</p>'
+
+
+def _resumo_status(riscos, rotulo):
+    """Badges com a contagem por status"""
+    contagem = riscos.value_counts()
+    badges = [
+        f'<span class="status-badge badge-{get_classe_risco(status)}">{contagem[status]} {status}</span>'
+        for status in STATUS_RELATORIO if contagem.get(status, 0) > 0
+    ]
+    return f'<p>{len(riscos)} {rotulo}: {"".join(badges)}</p>'
+
+
+def _pagina(titulo, subtitulo, conteudo, gerado_em):
+    return PAGINA.substitute(
+        titulo=html.escape(titulo),
+        subtitulo=subtitulo,
+        conteudo=conteudo,
+        estilo=ESTILO_CARDS + ESTILO_RELATORIO,
+        gerado_em=gerado_em,
+    )
+
+
+def html_os(os_info, familias, gerado_em):
+    """Relatório de uma OS: métricas, status das famílias, piores famílias e saldos negativos"""
+    risco = os_info['RISCO']
+    titulo = f"OS {os_info['OS']}" + (f" ({os_info['EMPRESA']})" if os_info['EMPRESA'] else '')
+    negativas = familias[familias['SALDO'] < 0].sort_values('SALDO')
+    conteudo = ''.join([
+        _metricas(os_info['PREVISTO'], os_info['REALIZADO'], os_info['SALDO'], os_info['EXECUCAO_%'], risco),
+        '<h2>Resumo de risco</h2>',
+        _resumo_status(familias['RISCO'], 'famílias'),
+        f'<h2>Piores famílias (top {TOP_FAMILIAS})</h2>',
+        _linhas(familias.head(TOP_FAMILIAS), 'FAMILIA', 'EXEC_%'),
+        f'<h2>Famílias com saldo negativo ({len(negativas)})</h2>',
+        _linhas(negativas, 'FAMILIA', 'EXEC_%'),
+        '<h2>Todas as famílias</h2>',
+        _linhas(familias, 'FAMILIA', 'EXEC_%'),
+    ])
+    subtitulo = f"{EMOJI_RISCO.get(risco, '⚪')} {html.escape(risco)} · Relatório executivo de CMV"
+    return _pagina(titulo, subtitulo, conteudo, gerado_em)
+
+
+def html_carteira(por_os, por_familia, gerado_em, limites=LIMITES_PADRAO):
+    """Relatório da carteira: totais, status das OSs, piores OSs e famílias, OSs com saldo negativo"""
+    previsto, realizado, saldo = (por_os[col].sum() for col in COLUNAS_VALOR)
+    execucao = realizado / previsto * 100 if previsto else 0
+    piores = por_os.sort_values('EXECUCAO_%', ascending=False).head(TOP_OSS)
+    negativas = por_os[por_os['SALDO'] < 0].sort_values('SALDO')
+
+    def link(registro):
+        return nome_arquivo(registro['EMPRESA'], registro['OS'])
+
+    def nomes(df):
+        rotulo = 'OS ' + df['OS'].astype(str)
+        if df['EMPRESA'].nunique() > 1:
+            rotulo += ' (' + df['EMPRESA'] + ')'
+        return df.assign(NOME=rotulo)
+
+    conteudo = ''.join([
+        _metricas(previsto, realizado, saldo, execucao, classificar_risco(previsto, realizado, limites)),
+        '<h2>Resumo de risco</h2>',
+        _resumo_status(por_os['RISCO'], 'OSs'),
+        f'<h2>OSs com maior execução (top {TOP_OSS})</h2>',
+        _linhas(nomes(piores), 'NOME', 'EXECUCAO_%', link),
+        f'<h2>OSs com saldo negativo ({len(negativas)}; top {TOP_OSS})</h2>',
+        _linhas(nomes(negativas.head(TOP_OSS)), 'NOME', 'EXECUCAO_%', link),
+        f'<h2>Piores famílias (top {TOP_FAMILIAS})</h2>',
+        _linhas(por_familia.head(TOP_FAMILIAS), 'FAMILIA', 'EXEC_%'),
+    ])
+    return _pagina("Carteira de projetos", "Relatório executivo de CMV", conteudo, gerado_em)
+
+
+def _gravar(caminho, conteudo):
+    """Escrita atômica (temporário + rename): leitores nunca veem arquivo pela metade"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(caminho), prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(conteudo)
+    os.replace(tmp, caminho)
+
+
+def renderizar_lote(lote, diretorio, gerado_em):
+    """Renderiza e grava os relatórios de um lote de OSs (executa no processo worker)"""
+    for arquivo, os_info, familias in lote:
+        _gravar(os.path.join(diretorio, arquivo), html_os(os_info, familias, gerado_em))
+    return len(lote)
+
+
+def classificar_detalhe(dados, limites=LIMITES_PADRAO, excecoes=None):
+    """Linhas somadas por (EMPRESA, OS, FAMILIA) com EXEC_% e RISCO (exceções por família)"""
+    detalhe = compactar(dados[COLUNAS_DADOS])
+    detalhe['EXEC_%'] = percentual_execucao(detalhe)
+    detalhe['RISCO'] = classificar_riscos(
+        detalhe['PREVISTO'], detalhe['REALIZADO'], limites_por_familia(detalhe['FAMILIA'], limites, excecoes)
+    )
+    return detalhe
+
+
+def hashes_os(detalhe):
+    """Hash dos dados de cada OS (soma dos hashes das linhas por família; independe da ordem)"""
+    h = pd.util.hash_pandas_object(detalhe[CHAVE_DETALHE + COLUNAS_VALOR], index=False)
+    soma = h.groupby([detalhe['EMPRESA'], detalhe['OS']], sort=False).sum()
+    return {chave: f'{valor:016x}' for chave, valor in soma.items()}
+
+
+def assinatura_modelo(limites, excecoes):
+    """Identifica modelo e limites usados: mudando qualquer um, todas as OSs são regeradas"""
+    conteudo = json.dumps([VERSAO_MODELO, limites, excecoes or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+
+def ler_manifesto(diretorio):
+    try:
+        with open(os.path.join(diretorio, ARQUIVO_MANIFESTO), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'assinatura': None, 'oss': {}}
+
+
+def hash_dados(dados):
+    """Hash do conteúdo das linhas (independe da ordem), quando o dataset não tem hash de arquivo"""
+    return f'{pd.util.hash_pandas_object(dados[COLUNAS_DADOS], index=False).sum():016x}'
+
+
+def pasta_geracao(diretorio, hash_dataset, limites=LIMITES_PADRAO, excecoes=None):
+    """Subpasta dos relatórios de um dataset com um conjunto de limites/exceções"""
+    return os.path.join(diretorio, f'{hash_dataset[:16]}_{assinatura_modelo(limites, excecoes)[:12]}')
+
+
+def nome_carteira(arquivos):
+    """Arquivo da carteira para as OSs (e hashes) da geração: seleções diferentes, arquivos diferentes"""
+    conteudo = json.dumps(sorted(arquivos.items()), ensure_ascii=False)
+    return f"carteira_{hashlib.sha1(conteudo.encode('utf-8')).hexdigest()[:12]}.html"
+
+
+def gerar_relatorios(agregados, diretorio=DIRETORIO_PADRAO, limites=LIMITES_PADRAO, excecoes=None,
+                     workers=None, forcar=False, hash_dataset=None):
+    """
+    Gera os relatórios das OSs e da carteira a partir dos agregados de uma visão
+    ('dados', 'por_os', 'por_familia'), na subpasta do dataset e dos limites (pasta_geracao).
+    OSs com o mesmo hash da geração anterior são puladas.
+    Retorna {'diretorio', 'carteira', 'arquivos', 'gerados', 'ignorados'}.
+    """
+    diretorio = pasta_geracao(diretorio, hash_dataset or hash_dados(agregados['dados']), limites, excecoes)
+    os.makedirs(diretorio, exist_ok=True)
+    gerado_em = datetime.now().strftime('%d/%m/%Y %H:%M')
+
+    por_os = agregados['por_os']
+    por_os = por_os.assign(RISCO=classificar_riscos(por_os['PREVISTO'], por_os['REALIZADO'], limites))
+    por_familia = agregados['por_familia']
+    por_familia = por_familia.assign(RISCO=classificar_riscos(
+        por_familia['PREVISTO'], por_familia['REALIZADO'],
+        limites_por_familia(por_familia['FAMILIA'], limites, excecoes),
+    ))
+    detalhe = classificar_detalhe(agregados['dados'], limites, excecoes)
+
+    manifesto = ler_manifesto(diretorio)
+    assinatura = assinatura_modelo(limites, excecoes)
+    anteriores = manifesto['oss'] if manifesto['assinatura'] == assinatura and not forcar else {}
+
+    arquivos = {}
+    pendentes = {}
+    for (empresa, os_num), hash_os in hashes_os(detalhe).items():
+        arquivo = nome_arquivo(empresa, os_num)
+        arquivos[arquivo] = hash_os
+        if anteriores.get(arquivo) != hash_os or not os.path.exists(os.path.join(diretorio, arquivo)):
+            pendentes[(empresa, os_num)] = arquivo
+
+    # Só as OSs pendentes são separadas e enviadas ao pool, em lotes
+    info_os = por_os.set_index(CHAVE_OS).reindex(list(pendentes)).to_dict('index')
+    chaves = pd.MultiIndex.from_frame(detalhe[CHAVE_OS])
+    detalhe = detalhe[chaves.isin(list(pendentes))].sort_values('EXEC_%', ascending=False)
+    tarefas = [
+        (pendentes[chave_os], dict(info_os[chave_os], EMPRESA=chave_os[0], OS=chave_os[1]),
+         familias.drop(columns=CHAVE_OS))
+        for chave_os, familias in detalhe.groupby(CHAVE_OS, sort=False)
+    ]
+    lotes = [tarefas[i:i + OSS_POR_LOTE] for i in range(0, len(tarefas), OSS_POR_LOTE)]
+
+    workers = min(workers or os.cpu_count() or 1, len(lotes))
+    if workers <= 1:
+        gerados = sum(renderizar_lote(lote, diretorio, gerado_em) for lote in lotes)
+    else:
+        # spawn: o pool pode ser criado de dentro do servidor do app (threads ativas)
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as executor:
+            futuros = [executor.submit(renderizar_lote, lote, diretorio, gerado_em) for lote in lotes]
+            gerados = sum(futuro.result() for futuro in futuros)
+
+    carteira = nome_carteira(arquivos)
+    _gravar(os.path.join(diretorio, carteira), html_carteira(por_os, por_familia, gerado_em, limites))
+    manifesto = {'assinatura': assinatura, 'oss': {**anteriores, **arquivos}}
+    _gravar(os.path.join(diretorio, ARQUIVO_MANIFESTO), json.dumps(manifesto, ensure_ascii=False, indent=1))
+
+    logger.info("Relatórios: %d gerados, %d sem mudança", gerados, len(arquivos) - gerados)
+    return {
+        'diretorio': diretorio,
+        'carteira': carteira,
+        'arquivos': sorted(arquivos),
+        'gerados': gerados,
+        'ignorados': len(arquivos) - gerados,
+    }
+
+
+def empacotar(resultado):
+    """Zip (bytes) com o relatório da carteira e os das OSs de uma geração"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.write(os.path.join(resultado['diretorio'], resultado['carteira']), ARQUIVO_CARTEIRA)
+        for arquivo in resultado['arquivos']:
+            zf.write(os.path.join(resultado['diretorio'], arquivo), arquivo)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    from cmv.particoes import combinar_particoes
+    from cmv.snapshots import DIRETORIO_PADRAO as DIRETORIO_SNAPSHOTS
+    from cmv.snapshots import carregar_snapshot, ultimo_snapshot
+
+    parser = argparse.ArgumentParser(description="Gera os relatórios executivos do último dataset processado")
+    parser.add_argument('--dados', default=DIRETORIO_SNAPSHOTS, help="Diretório dos snapshots (padrão: %(default)s)")
+    parser.add_argument('--saida', default=DIRETORIO_PADRAO, help="Diretório dos relatórios (padrão: %(default)s)")
+    parser.add_argument('--workers', type=int, default=None, help="Processos em paralelo (padrão: nº de CPUs)")
+    parser.add_argument('--forcar', action='store_true', help="Regera também as OSs sem mudança")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    ultimo = ultimo_snapshot(args.dados)
+    if ultimo is None:
+        raise SystemExit(f"Nenhum snapshot em {args.dados} (rode o monitor antes).")
+
+    agregados = combinar_particoes(carregar_snapshot(ultimo['hash'], args.dados)['particoes'])
+    resultado = gerar_relatorios(agregados, args.saida, workers=args.workers, forcar=args.forcar,
+                                 hash_dataset=ultimo['hash'])
+    logger.info("Carteira: %s", os.path.join(resultado['diretorio'], resultado['carteira']))
+
+
+if __name__ == '__main__':
+    main()
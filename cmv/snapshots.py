@@ -0,0 +1,254 @@
+"""
+Armazenamento local de datasets processados (snapshots)
+Cada snapshot guarda as linhas normalizadas e os agregados pré-calculados,
+identificado pelo hash do arquivo de origem e particionado por EMPRESA
+(uma pasta por empresa, carregável isoladamente).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+from cmv.particoes import calcular_particoes, resumir_particoes
+from cmv.processamento import EMPRESA_PADRAO
+
+DIRETORIO_PADRAO = os.environ.get('CMV_DADOS', os.path.join('data', 'snapshots'))
+ARQUIVO_ULTIMO = 'ultimo.json'
+ARQUIVO_META = 'meta.json'
+ARQUIVO_VALIDACAO = 'validacao.pkl'
+PASTA_EMPRESAS = 'empresas'
+
+# Tabelas gravadas em cada partição (nome -> arquivo pickle);
+# mudancas/transicoes só existem quando a partição foi calculada sobre uma base
+TABELAS = {
+    'dados': 'dados.pkl',
+    'por_os': 'por_os.pkl',
+    'por_familia': 'por_familia.pkl',
+    'hashes': 'hashes.pkl',
+    'mudancas': 'mudancas.pkl',
+    'transicoes': 'transicoes.pkl',
+}
+
+
+def _escrever_json(caminho, conteudo):
+    """Grava JSON de forma atômica (arquivo temporário + rename)"""
+    pasta = os.path.dirname(caminho)
+    fd, tmp = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(conteudo, f, ensure_ascii=False, indent=2)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, caminho)
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def existe_snapshot(hash_arquivo, diretorio=DIRETORIO_PADRAO):
+    return os.path.exists(os.path.join(diretorio, hash_arquivo, ARQUIVO_META))
+
+
+def pasta_empresa(empresa):
+    """Nome da pasta da partição (o nome da empresa pode ter caracteres inválidos em caminhos)"""
+    return hashlib.sha1(empresa.encode('utf-8')).hexdigest()[:16]
+
+
+def _gravar_particao(pasta, tabelas):
+    os.makedirs(pasta)
+    for nome, arquivo in TABELAS.items():
+        if nome not in tabelas:
+            continue
+        tabela = tabelas[nome]
+        if nome == 'hashes':
+            tabela = pd.Series(tabela)
+        pd.to_pickle(tabela, os.path.join(pasta, arquivo))
+
+
+def salvar_snapshot(df, hash_arquivo, formato, origem=None, origem_mtime=None,
+                    diretorio=DIRETORIO_PADRAO, base=None, validacao=None):
+    """
+    Pré-calcula os agregados de cada empresa (em paralelo) e grava o snapshot; retorna os metadados.
+    `base` é um snapshot carregado com todas as partições (cálculo incremental).
+    """
+    os.makedirs(diretorio, exist_ok=True)
+
+    particoes = calcular_particoes(df, base['particoes'] if base is not None else None)
+    resumo = resumir_particoes(particoes)
+    empresas = {
+        empresa: {
+            'pasta': pasta_empresa(empresa),
+            'linhas': int(tabelas['por_os']['LINHAS'].sum()),
+            'oss': len(tabelas['por_os']),
+            'resumo': tabelas.get('resumo'),
+        }
+        for empresa, tabelas in particoes.items()
+    }
+    meta = {
+        'hash': hash_arquivo,
+        'formato': formato,
+        'origem': origem,
+        'origem_mtime': origem_mtime,
+        'linhas': int(df['LINHAS'].sum()) if 'LINHAS' in df else len(df),
+        'oss': sum(e['oss'] for e in empresas.values()),
+        'empresas': empresas,
+        'processado_em': datetime.now().isoformat(timespec='seconds'),
+        'base': base['meta']['hash'] if resumo is not None else None,
+        'base_origem': base['meta'].get('origem') if resumo is not None else None,
+        'resumo': resumo,
+        'problemas': int(validacao['resumo']['OCORRENCIAS'].sum()) if validacao is not None else None,
+    }
+
+    # Grava numa pasta temporária e renomeia: leitores nunca veem snapshot incompleto
+    tmp = tempfile.mkdtemp(dir=diretorio, prefix='.tmp-')
+    os.chmod(tmp, 0o755)
+    try:
+        for empresa, tabelas in particoes.items():
+            _gravar_particao(os.path.join(tmp, PASTA_EMPRESAS, empresas[empresa]['pasta']), tabelas)
+        if validacao is not None:
+            pd.to_pickle(validacao, os.path.join(tmp, ARQUIVO_VALIDACAO))
+        with open(os.path.join(tmp, ARQUIVO_META), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(diretorio, hash_arquivo))
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        # Outro processo gravou o mesmo conteúdo primeiro
+        if not existe_snapshot(hash_arquivo, diretorio):
+            raise
+
+    return meta
+
+
+def ler_meta(hash_arquivo, diretorio=DIRETORIO_PADRAO):
+    return _ler_json(os.path.join(diretorio, hash_arquivo, ARQUIVO_META))
+
+
+def empresas_snapshot(meta):
+    """Empresas (partições) de um snapshot, em ordem"""
+    # Snapshots anteriores ao particionamento têm uma única partição sem EMPRESA
+    return sorted(meta.get('empresas', {EMPRESA_PADRAO: None}))
+
+
+def carregar_particao(hash_arquivo, empresa, diretorio=DIRETORIO_PADRAO, tabelas=None):
+    """
+    Tabelas de uma empresa do snapshot (só os arquivos dessa partição são lidos);
+    `tabelas` restringe a leitura a alguns nomes de TABELAS (ex.: ['por_os'])
+    """
+    meta = ler_meta(hash_arquivo, diretorio)
+    if 'empresas' in meta:
+        pasta = os.path.join(diretorio, hash_arquivo, PASTA_EMPRESAS, meta['empresas'][empresa]['pasta'])
+    else:
+        pasta = os.path.join(diretorio, hash_arquivo)
+
+    particao = {}
+    for nome, arquivo in TABELAS.items():
+        if tabelas is not None and nome not in tabelas:
+            continue
+        caminho = os.path.join(pasta, arquivo)
+        if os.path.exists(caminho):
+            particao[nome] = pd.read_pickle(caminho)
+    if 'hashes' in particao:
+        particao['hashes'] = particao['hashes'].to_numpy()
+
+    if 'empresas' in meta:
+        if (meta['empresas'][empresa] or {}).get('resumo'):
+            particao['resumo'] = meta['empresas'][empresa]['resumo']
+    else:
+        for nome in ['dados', 'por_os', 'mudancas', 'transicoes']:
+            if nome in particao and 'EMPRESA' not in particao[nome]:
+                particao[nome].insert(0, 'EMPRESA', EMPRESA_PADRAO)
+        if meta.get('resumo'):
+            particao['resumo'] = meta['resumo']
+    return particao
+
+
+def carregar_validacao(hash_arquivo, diretorio=DIRETORIO_PADRAO):
+    caminho = os.path.join(diretorio, hash_arquivo, ARQUIVO_VALIDACAO)
+    return pd.read_pickle(caminho) if os.path.exists(caminho) else None
+
+
+def carregar_snapshot(hash_arquivo, diretorio=DIRETORIO_PADRAO, empresas=None):
+    """Carrega metadados, validação e as partições pedidas (todas por padrão)"""
+    meta = ler_meta(hash_arquivo, diretorio)
+    snapshot = {'meta': meta}
+    validacao = carregar_validacao(hash_arquivo, diretorio)
+    if validacao is not None:
+        snapshot['validacao'] = validacao
+    snapshot['particoes'] = {
+        empresa: carregar_particao(hash_arquivo, empresa, diretorio)
+        for empresa in (empresas if empresas is not None else empresas_snapshot(meta))
+    }
+    return snapshot
+
+
+def data_snapshot(meta):
+    """Data da exportação de origem (mtime do arquivo), ou do processamento se não houver"""
+    if meta.get('origem_mtime'):
+        return datetime.fromtimestamp(meta['origem_mtime'])
+    return datetime.fromisoformat(meta['processado_em'])
+
+
+def listar_snapshots(diretorio=DIRETORIO_PADRAO):
+    """Metadados de todos os snapshots gravados, do mais antigo ao mais recente"""
+    if not os.path.isdir(diretorio):
+        return []
+    metas = []
+    with os.scandir(diretorio) as entradas:
+        for entrada in entradas:
+            if entrada.is_dir() and not entrada.name.startswith('.'):
+                meta = _ler_json(os.path.join(entrada.path, ARQUIVO_META))
+                if meta is not None:
+                    metas.append(meta)
+    return sorted(metas, key=data_snapshot)
+
+
+def versao_snapshots(diretorio=DIRETORIO_PADRAO):
+    """Muda quando um snapshot é gravado (chave de cache); None sem diretório"""
+    try:
+        return os.stat(diretorio).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_anterior(origem_mtime, diretorio=DIRETORIO_PADRAO):
+    """Metadados do snapshot mais recente com origem anterior a `origem_mtime` (ou None)"""
+    anteriores = [meta for meta in listar_snapshots(diretorio)
+                  if meta.get('origem_mtime') and meta['origem_mtime'] < origem_mtime]
+    return anteriores[-1] if anteriores else None
+
+
+def atualizar_origem(hash_arquivo, origem, origem_mtime, diretorio=DIRETORIO_PADRAO):
+    """
+    O mesmo conteúdo chegou com outro nome: grava a nova origem no meta.json se ela for mais
+    recente (a ordem de listar_snapshots acompanha 'ultimo'); retorna os metadados
+    """
+    meta = ler_meta(hash_arquivo, diretorio)
+    if (meta.get('origem_mtime') or 0) < origem_mtime:
+        meta.update(origem=origem, origem_mtime=origem_mtime)
+        _escrever_json(os.path.join(diretorio, hash_arquivo, ARQUIVO_META), meta)
+    return meta
+
+
+def ultimo_snapshot(diretorio=DIRETORIO_PADRAO):
+    """Metadados do snapshot mais recente (ou None)"""
+    ultimo = _ler_json(os.path.join(diretorio, ARQUIVO_ULTIMO))
+    if not ultimo or not existe_snapshot(ultimo['hash'], diretorio):
+        return None
+    return ultimo
+
+
+def marcar_ultimo(meta, diretorio=DIRETORIO_PADRAO):
+    """Aponta 'ultimo' para o snapshot se a origem for mais nova que a atual"""
+    atual = ultimo_snapshot(diretorio)
+    if atual and (atual.get('origem_mtime') or 0) > (meta.get('origem_mtime') or 0):
+        return False
+    _escrever_json(os.path.join(diretorio, ARQUIVO_ULTIMO), meta)
+    return True
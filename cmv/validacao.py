@@ -0,0 +1,113 @@
+"""
+Validação de qualidade dos dados normalizados
+Cada verificação é uma passada vetorizada sobre o DataFrame; o resultado é
+uma tabela compacta com contagens e amostras das linhas problemáticas.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cmv.processamento import CHAVE_DETALHE, COLUNAS_DADOS
+
+# Diferença aceita entre SALDO e PREVISTO - REALIZADO (arredondamento do ERP)
+TOLERANCIA_SALDO = 0.01
+
+# OS simples ("3185") ou composta ("1159/1160/1161/1162")
+PADRAO_OS = r'\d+(?:/\d+)*'
+
+# Textos que representam família em branco após a normalização (além de NaN)
+FAMILIAS_VAZIAS = ['', 'NAN', 'NONE', 'NULL']
+
+AMOSTRAS = 5
+
+VERIFICACOES = {
+    'VALOR_INVALIDO': "Valor não numérico convertido para 0",
+    'SALDO_INCONSISTENTE': "SALDO diferente de PREVISTO − REALIZADO",
+    'DUPLICADA': "Par (OS, FAMÍLIA) repetido na mesma empresa",
+    'VALOR_NEGATIVO': "PREVISTO ou REALIZADO negativo",
+    'FAMILIA_VAZIA': "Família em branco",
+    'OS_SUSPEITA': "Formato de OS fora do padrão",
+}
+
+
+def _mascara_por_valor(serie, condicao):
+    """Avalia a condição só nos valores distintos da série e expande para as linhas"""
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    return condicao(pd.Series(unicos)).to_numpy()[codigos]
+
+
+def _duplicadas(df):
+    """Linhas com par (OS, FAMILIA) repetido; em dados compactados, pares somados de mais de uma linha"""
+    if 'LINHAS' in df:
+        return df['LINHAS'].to_numpy() > 1
+    return df.duplicated(CHAVE_DETALHE, keep=False).to_numpy()
+
+
+def _mascaras(df, verificacoes):
+    """Máscara booleana de linhas problemáticas para cada verificação pedida"""
+    previsto = df['PREVISTO'].to_numpy()
+    realizado = df['REALIZADO'].to_numpy()
+    saldo = df['SALDO'].to_numpy()
+
+    calculos = {
+        'SALDO_INCONSISTENTE': lambda: np.abs(saldo - (previsto - realizado)) > TOLERANCIA_SALDO,
+        'DUPLICADA': lambda: _duplicadas(df),
+        'VALOR_NEGATIVO': lambda: (previsto < 0) | (realizado < 0),
+        # Strings avaliadas só nos valores distintos (poucas OSs/famílias para muitas linhas)
+        'FAMILIA_VAZIA': lambda: _mascara_por_valor(
+            df['FAMILIA'], lambda unicos: unicos.isna() | unicos.str.strip().str.upper().isin(FAMILIAS_VAZIAS)
+        ),
+        'OS_SUSPEITA': lambda: _mascara_por_valor(
+            df['OS'], lambda unicos: ~unicos.str.fullmatch(PADRAO_OS).fillna(False).astype(bool)
+        ),
+    }
+    return {codigo: calcular() for codigo, calcular in calculos.items() if codigo in verificacoes}
+
+
+def _resultado(linhas, exemplos):
+    resumo = pd.DataFrame(linhas, columns=['VERIFICACAO', 'OCORRENCIAS'])
+    resumo.insert(1, 'DESCRICAO', resumo['VERIFICACAO'].map(VERIFICACOES))
+    return {'resumo': resumo, 'amostras': exemplos}
+
+
+def validar(df, coercoes=None, amostras=AMOSTRAS, verificacoes=VERIFICACOES):
+    """
+    Executa as verificações de qualidade.
+    Retorna dict com 'resumo' (VERIFICACAO, DESCRICAO, OCORRENCIAS) só com as
+    verificações que encontraram problemas, e 'amostras' (código -> DataFrame).
+    Em dados compactados (coluna LINHAS) as ocorrências contam as linhas originais.
+    """
+    linhas = []
+    exemplos = {}
+
+    df_coercoes = pd.concat(coercoes, ignore_index=True) if coercoes else None
+    if df_coercoes is not None and len(df_coercoes) > 0:
+        linhas.append(('VALOR_INVALIDO', len(df_coercoes)))
+        exemplos['VALOR_INVALIDO'] = df_coercoes.head(amostras)
+
+    pesos = df['LINHAS'].to_numpy() if 'LINHAS' in df else None
+    for codigo, mascara in _mascaras(df, verificacoes).items():
+        ocorrencias = int(mascara.sum() if pesos is None else pesos[mascara].sum())
+        if ocorrencias == 0:
+            continue
+        linhas.append((codigo, ocorrencias))
+        posicoes = np.flatnonzero(mascara)[:amostras]
+        exemplos[codigo] = df.iloc[posicoes][COLUNAS_DADOS]
+
+    return _resultado(linhas, exemplos)
+
+
+def combinar_validacoes(parciais, amostras=AMOSTRAS):
+    """Soma as ocorrências de validações feitas por partes (ex.: por lote) e junta as amostras"""
+    ocorrencias = {}
+    exemplos = {}
+    for parcial in parciais:
+        for codigo, n in zip(parcial['resumo']['VERIFICACAO'], parcial['resumo']['OCORRENCIAS']):
+            ocorrencias[codigo] = ocorrencias.get(codigo, 0) + int(n)
+        for codigo, amostra in parcial['amostras'].items():
+            if codigo in exemplos:
+                amostra = pd.concat([exemplos[codigo], amostra], ignore_index=True)
+            exemplos[codigo] = amostra.head(amostras)
+
+    linhas = [(codigo, ocorrencias[codigo]) for codigo in VERIFICACOES if codigo in ocorrencias]
+    return _resultado(linhas, exemplos)
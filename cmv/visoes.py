@@ -0,0 +1,192 @@
+"""
+Visões salvas
+Uma visão é uma combinação nomeada de filtros (empresa, status, OSs, famílias, clientes),
+guardada num JSON local (CMV_VISOES) e aberta no app por `?visao=<nome>`. Quando o monitor
+grava uma exportação nova, o resultado de cada visão (lista de OSs, tabela de famílias,
+contagem por status e a máscara das linhas) é calculado e guardado no snapshot: abrir a
+visão dispensa filtrar e agregar.
+
+Uso:
+    python -m cmv.visoes                 # lista as visões
+    python -m cmv.visoes --precalcular   # recalcula as visões do último snapshot
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+import pandas as pd
+
+from cmv.anomalias import anomalias_agregados
+from cmv.filtros import agregar_mascara, desempacotar, filtrar_linhas, filtrar_status, indexar_filtros
+from cmv.particoes import combinar_particoes
+from cmv.previsao import ESTOURO_PREVISTO, prever_agregados, snapshots_anteriores
+from cmv.processamento import LIMITES_PADRAO, classificar_familias
+from cmv.projetos import carregar_projetos, enriquecer, versao_projetos
+from cmv.snapshots import DIRETORIO_PADRAO, carregar_particao, empresas_snapshot, ler_meta, ultimo_snapshot
+
+CAMINHO_PADRAO = os.environ.get('CMV_VISOES', os.path.join('data', 'visoes.json'))
+
+# Resultados pré-calculados dentro da pasta do snapshot
+ARQUIVO_RESULTADOS = 'visoes.pkl'
+
+# Filtros de uma visão (empresa: None = todas)
+CAMPOS = ['empresa', 'status', 'os', 'familias', 'clientes']
+
+
+def definir_visao(empresa=None, status=(), oss=(), familias=(), clientes=()):
+    return {'empresa': empresa, 'status': list(status), 'os': list(oss),
+            'familias': list(familias), 'clientes': list(clientes)}
+
+
+def assinatura_visao(visao):
+    """Texto que identifica os filtros da visão (a ordem dos valores não importa)"""
+    filtros = {campo: visao.get(campo) for campo in CAMPOS}
+    for campo in CAMPOS[1:]:
+        filtros[campo] = sorted(map(str, filtros[campo] or []))
+    return json.dumps(filtros, ensure_ascii=False, sort_keys=True)
+
+
+def carregar_visoes(caminho=CAMINHO_PADRAO):
+    """{nome: visão}; vazio sem arquivo"""
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _gravar_visoes(visoes, caminho):
+    """Grava o JSON de forma atômica (arquivo temporário + rename)"""
+    pasta = os.path.dirname(caminho) or '.'
+    os.makedirs(pasta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(visoes, f, ensure_ascii=False, indent=2)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, caminho)
+
+
+def salvar_visao(nome, visao, caminho=CAMINHO_PADRAO):
+    visoes = carregar_visoes(caminho)
+    visoes[nome] = {campo: visao.get(campo) for campo in CAMPOS}
+    _gravar_visoes(visoes, caminho)
+
+
+def remover_visao(nome, caminho=CAMINHO_PADRAO):
+    visoes = carregar_visoes(caminho)
+    if visoes.pop(nome, None) is not None:
+        _gravar_visoes(visoes, caminho)
+
+
+def calcular_visao(agregados, visao, limites=LIMITES_PADRAO, excecoes=None):
+    """
+    Resultado da visão sobre os agregados: 'mascara' (bitset das linhas, None sem filtro de
+    linhas), 'por_os' (filtrado por status e ordenado por execução), 'por_familia' e
+    'contagem' (OSs por status)
+    """
+    indices = indexar_filtros(agregados)
+    selecoes = {'OS': visao['os'], 'FAMILIA': visao['familias'], 'CLIENTE': visao['clientes']}
+    mascara = filtrar_linhas(indices, {col: valores for col, valores in selecoes.items() if col in indices['colunas']})
+
+    dados = agregados['dados']
+    if mascara is None:
+        por_os = agregados['por_os']
+        por_familia = agregados.get('por_familia')
+        if por_familia is None:
+            por_familia = classificar_familias(dados, limites, excecoes)
+    else:
+        por_os = agregar_mascara(agregados, indices, mascara, limites)
+        por_familia = classificar_familias(dados[desempacotar(mascara, len(dados))], limites, excecoes)
+    if visao['status']:
+        por_os = filtrar_status(por_os, visao['status'], {ESTOURO_PREVISTO: 'PREVISAO'})
+    por_os = por_os.sort_values('EXECUCAO_%', ascending=False)
+    return {
+        'mascara': mascara,
+        'por_os': por_os,
+        'por_familia': por_familia,
+        'contagem': por_os['RISCO'].value_counts().to_dict(),
+    }
+
+
+def contexto_visoes(hash_arquivo, diretorio=DIRETORIO_PADRAO):
+    """O que, além do snapshot, muda o resultado: cadastro de projetos e exportações da previsão"""
+    _, anteriores = snapshots_anteriores(hash_arquivo, diretorio=diretorio)
+    return {'projetos': versao_projetos(), 'anteriores': [meta['hash'] for meta in anteriores]}
+
+
+def agregados_do_snapshot(hash_arquivo, empresas, diretorio=DIRETORIO_PADRAO):
+    """Agregados das empresas como o app os monta (anomalias, cadastro de projetos e previsão)"""
+    agregados = combinar_particoes({e: carregar_particao(hash_arquivo, e, diretorio) for e in empresas})
+    agregados = anomalias_agregados(agregados)
+    if versao_projetos() is not None:
+        projetos = carregar_projetos()
+        agregados = {**agregados, 'dados': enriquecer(agregados['dados'], projetos),
+                     'por_os': enriquecer(agregados['por_os'], projetos)}
+    data_atual, anteriores = snapshots_anteriores(hash_arquivo, diretorio=diretorio)
+    if anteriores:
+        agregados = prever_agregados(agregados, data_atual, anteriores, tuple(empresas), diretorio)
+    return agregados
+
+
+def precalcular_visoes(hash_arquivo, diretorio=DIRETORIO_PADRAO, caminho=CAMINHO_PADRAO):
+    """
+    Calcula as visões salvas sobre o snapshot (limites padrão) e grava em ARQUIVO_RESULTADOS;
+    retorna quantas foram calculadas. Visões de empresa ausente no snapshot ficam de fora.
+    """
+    visoes = carregar_visoes(caminho)
+    todas = empresas_snapshot(ler_meta(hash_arquivo, diretorio))
+    por_empresas = {}
+    for visao in visoes.values():
+        if visao.get('empresa') is None or visao['empresa'] in todas:
+            empresas = tuple(todas) if visao.get('empresa') is None else (visao['empresa'],)
+            por_empresas.setdefault(empresas, {})[assinatura_visao(visao)] = visao
+
+    resultados = {}
+    for empresas, grupo in por_empresas.items():
+        agregados = agregados_do_snapshot(hash_arquivo, empresas, diretorio)
+        for assinatura, visao in grupo.items():
+            resultados[assinatura] = calcular_visao(agregados, visao)
+
+    pasta = os.path.join(diretorio, hash_arquivo)
+    fd, tmp = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    os.close(fd)
+    pd.to_pickle({'contexto': contexto_visoes(hash_arquivo, diretorio), 'resultados': resultados}, tmp)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, os.path.join(pasta, ARQUIVO_RESULTADOS))
+    return len(resultados)
+
+
+def resultado_precalculado(hash_arquivo, visao, contexto, diretorio=DIRETORIO_PADRAO):
+    """Resultado gravado pelo monitor para a visão, se o contexto ainda for o mesmo; senão None"""
+    try:
+        salvo = pd.read_pickle(os.path.join(diretorio, hash_arquivo, ARQUIVO_RESULTADOS))
+    except FileNotFoundError:
+        return None
+    if salvo['contexto'] != contexto:
+        return None
+    return salvo['resultados'].get(assinatura_visao(visao))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Visões salvas: lista e pré-calcula sobre o último snapshot")
+    parser.add_argument('--dados', default=DIRETORIO_PADRAO, help="Diretório de snapshots (padrão: %(default)s)")
+    parser.add_argument('--visoes', default=CAMINHO_PADRAO, help="Arquivo das visões (padrão: %(default)s)")
+    parser.add_argument('--precalcular', action='store_true', help="Recalcula as visões do último snapshot")
+    args = parser.parse_args(argv)
+
+    visoes = carregar_visoes(args.visoes)
+    for nome, visao in sorted(visoes.items()):
+        filtros = ', '.join(f"{campo}={visao[campo]}" for campo in CAMPOS if visao.get(campo))
+        print(f"{nome}: {filtros or 'sem filtros'}  (?visao={nome})")
+    if args.precalcular:
+        ultimo = ultimo_snapshot(args.dados)
+        if ultimo is None:
+            parser.exit(1, "Nenhum snapshot processado.\n")
+        n = precalcular_visoes(ultimo['hash'], args.dados, args.visoes)
+        print(f"{n} visão(ões) pré-calculada(s) em {ultimo['origem']}")
+
+
+if __name__ == '__main__':
+    main()
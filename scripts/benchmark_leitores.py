@@ -0,0 +1,87 @@
+"""
+Benchmark dos backends de leitura por tipo de arquivo e tamanho
+Mede o tempo de leitura + normalização (mesmo caminho do upload) de planilhas
+sintéticas RAW-ERP para cada backend instalado.
+
+Uso:
+    python scripts/benchmark_leitores.py --linhas 10000 50000 200000
+    python scripts/benchmark_leitores.py --salvar   # grava o mais rápido por tipo em leitores.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados_sinteticos import gerar_raw_erp, salvar  # noqa: E402
+
+from cmv.ingestao import processar_em_lotes  # noqa: E402
+from cmv.leitores import ARQUIVO_CONFIG, backends_disponiveis  # noqa: E402
+
+# Tipos que conseguimos gerar localmente (xls/xlsb não têm writer no pandas)
+TIPOS_GERADOS = ['xlsx', 'ods', 'csv', 'parquet']
+
+
+def medir(caminho, backend, repeticoes):
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for _ in processar_em_lotes(conteudo, nome=caminho, backend=backend):
+            pass
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara os backends de leitura de planilha")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10_000, 50_000, 200_000])
+    parser.add_argument('--tipos', nargs='+', default=TIPOS_GERADOS, choices=TIPOS_GERADOS)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--salvar', action='store_true',
+                        help=f"Grava o backend mais rápido por tipo em {ARQUIVO_CONFIG}")
+    args = parser.parse_args()
+
+    resultados = []
+    total_por_backend = defaultdict(lambda: defaultdict(float))
+
+    with tempfile.TemporaryDirectory() as pasta:
+        for linhas in args.linhas:
+            df = gerar_raw_erp(linhas)
+            for tipo in args.tipos:
+                backends = backends_disponiveis(tipo)
+                if not backends:
+                    continue
+                caminho = os.path.join(pasta, f'cmv_{linhas}.{tipo}')
+                salvar(df, caminho)
+                tamanho_mb = os.path.getsize(caminho) / 1e6
+                for backend in backends:
+                    segundos = medir(caminho, backend, args.repeticoes)
+                    total_por_backend[tipo][backend] += segundos
+                    resultados.append((tipo, linhas, tamanho_mb, backend, segundos))
+                    print(f"{tipo:5} {linhas:>9,} linhas {tamanho_mb:7.1f} MB  {backend:9} {segundos:8.2f}s", flush=True)
+
+    print()
+    print("| Tipo | Linhas | Tamanho | Backend | Tempo (s) | Linhas/s |")
+    print("|------|-------:|--------:|---------|----------:|---------:|")
+    for tipo, linhas, tamanho_mb, backend, segundos in resultados:
+        print(f"| {tipo} | {linhas:,} | {tamanho_mb:.1f} MB | {backend} | {segundos:.2f} | {linhas / segundos:,.0f} |")
+
+    mais_rapidos = {tipo: min(tempos, key=tempos.get) for tipo, tempos in total_por_backend.items()}
+    print()
+    print("Mais rápido por tipo:", mais_rapidos)
+
+    if args.salvar:
+        with open(ARQUIVO_CONFIG, 'w', encoding='utf-8') as f:
+            json.dump(mais_rapidos, f, indent=2)
+        print(f"Gravado em {ARQUIVO_CONFIG}")
+
+
+if __name__ == '__main__':
+    main()
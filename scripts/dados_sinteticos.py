@@ -0,0 +1,91 @@
+"""
+Gerador de planilhas sintéticas no formato RAW-ERP
+Usado pelos benchmarks e testes de carga.
+
+Uso:
+    python scripts/dados_sinteticos.py 50000 cmv_sintetico.xlsx
+    python scripts/dados_sinteticos.py 5000000 dump_anual.parquet --linhas-por-os 2000
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+FAMILIAS = [f"FAMILIA {i:02d}" for i in range(60)]
+LINHAS_POR_OS = 20
+
+
+def gerar_raw_erp(linhas, seed=0, linhas_por_os=LINHAS_POR_OS):
+    """DataFrame no layout RAW-ERP com ~linhas_por_os linhas por OS e execução entre 0% e 130%"""
+    rng = np.random.default_rng(seed)
+    n_os = max(linhas // linhas_por_os, 1)
+
+    previsto = rng.uniform(0, 100_000, linhas).round(2)
+    previsto[rng.random(linhas) < 0.05] = 0
+    realizado = (previsto * rng.uniform(0, 1.3, linhas)).round(2)
+
+    return pd.DataFrame({
+        'EMPRESA': rng.choice(['ARV', 'ARV SERVICOS'], linhas),
+        'NUMERO_SERVICO': rng.integers(1000, 1000 + n_os, linhas),
+        'FAMILIA': np.array(FAMILIAS)[rng.integers(0, len(FAMILIAS), linhas)],
+        'PREVISTO': previsto,
+        'VALORTOTALCOMPRADO': realizado,
+        'SALDO': (previsto - realizado).round(2),
+    })
+
+
+def gerar_projetos(linhas, seed=0, linhas_por_os=LINHAS_POR_OS, clientes=40):
+    """Cadastro de projetos (OS, CLIENTE, PROPOSTA) para as OSs de gerar_raw_erp, sem empresa"""
+    rng = np.random.default_rng(seed)
+    oss = np.arange(1000, 1000 + max(linhas // linhas_por_os, 1))
+    return pd.DataFrame({
+        'OS': oss.astype(str),
+        'CLIENTE': np.array([f"CLIENTE {i:02d}" for i in range(clientes)])[rng.integers(0, clientes, len(oss))],
+        'PROPOSTA': [f"PROP-{os_}" for os_ in oss],
+    })
+
+
+def gerar_historico(linhas, exportacoes, seed=0, linhas_por_os=LINHAS_POR_OS):
+    """
+    Exportações sucessivas de gerar_raw_erp: o comprado de cada linha cresce até o
+    valor final num ritmo próprio (com ruído); a última é a própria gerar_raw_erp
+    """
+    final = gerar_raw_erp(linhas, seed, linhas_por_os)
+    rng = np.random.default_rng(seed + 1)
+    # Fração do comprado já realizada no início do histórico
+    inicio = rng.uniform(0, 0.8, linhas)
+    historico = []
+    for k in range(1, exportacoes + 1):
+        fracao = np.clip(inicio + (1 - inicio) * k / exportacoes + rng.normal(0, 0.02, linhas), 0, 1)
+        fracao = 1.0 if k == exportacoes else fracao
+        realizado = (final['VALORTOTALCOMPRADO'] * fracao).round(2)
+        historico.append(final.assign(VALORTOTALCOMPRADO=realizado, SALDO=(final['PREVISTO'] - realizado).round(2)))
+    return historico
+
+
+def salvar(df, caminho):
+    """Grava no formato indicado pela extensão (xlsx, ods, csv ou parquet)"""
+    if caminho.endswith('.csv'):
+        df.to_csv(caminho, index=False)
+    elif caminho.endswith('.parquet'):
+        df.to_parquet(caminho, index=False)
+    elif caminho.endswith('.ods'):
+        df.to_excel(caminho, index=False, engine='odf')
+    else:
+        df.to_excel(caminho, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera uma planilha RAW-ERP sintética")
+    parser.add_argument('linhas', type=int)
+    parser.add_argument('saida')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--linhas-por-os', type=int, default=LINHAS_POR_OS,
+                        help="Linhas por OS; acima do nº de famílias gera itens repetidos por (OS, FAMÍLIA)")
+    args = parser.parse_args()
+    salvar(gerar_raw_erp(args.linhas, args.seed, args.linhas_por_os), args.saida)
+
+
+if __name__ == '__main__':
+    main()
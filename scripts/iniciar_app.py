@@ -0,0 +1,100 @@
+"""
+Entrada do container
+Sobe o Streamlit e, antes de marcar a réplica como pronta, aquece o processo com
+uma sessão headless (scripts/sessao_streamlit.py): imports pesados, último snapshot,
+agregados combinados e índices de execução ficam no cache do processo, e o primeiro
+visitante depois de um deploy não paga por eles. O HEALTHCHECK da imagem exige
+`/_stcore/health` e o marcador de pronto.
+
+Uso (Dockerfile):
+    python scripts/iniciar_app.py --server.address=0.0.0.0 --server.port=8501
+
+Variáveis: CMV_AQUECER=0 desliga o aquecimento; CMV_PRONTO muda o caminho do marcador.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from sessao_streamlit import APP, SessaoStreamlit
+
+MARCADOR_PADRAO = '/tmp/cmv_pronto'
+PORTA_PADRAO = 8501
+
+# Tempo máximo até o servidor responder no /_stcore/health
+ESPERA_SAUDE = 120
+
+logger = logging.getLogger('cmv.iniciar')
+
+
+def porta_dos_argumentos(argumentos):
+    """Porta de `--server.port=N` ou `--server.port N` (padrão do Streamlit se ausente)"""
+    for i, argumento in enumerate(argumentos):
+        if argumento.startswith('--server.port='):
+            return int(argumento.split('=', 1)[1])
+        if argumento == '--server.port' and i + 1 < len(argumentos):
+            return int(argumentos[i + 1])
+    return PORTA_PADRAO
+
+
+def aguardar_saude(url, processo, timeout=ESPERA_SAUDE):
+    """Espera o servidor responder; False se o processo morrer ou o tempo acabar"""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite and processo.poll() is None:
+        try:
+            with urllib.request.urlopen(f'{url}/_stcore/health', timeout=2) as resposta:
+                if resposta.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.3)
+    return False
+
+
+async def _sessao_de_aquecimento(url):
+    sessao = SessaoStreamlit(url)
+    try:
+        return await sessao.conectar()
+    finally:
+        await sessao.fechar()
+
+
+def aquecer(url):
+    """Uma execução completa do app sem upload (carrega o último snapshot, se houver)"""
+    inicio = time.perf_counter()
+    try:
+        medida = asyncio.run(_sessao_de_aquecimento(url))
+    except Exception as erro:
+        # Réplica sem aquecimento ainda atende; não segura o deploy por causa disso
+        logger.warning("Aquecimento falhou: %s", erro)
+        return None
+    logger.info("Aquecimento concluído em %.1fs (%d KB)", time.perf_counter() - inicio, medida.bytes // 1024)
+    return medida
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    argumentos = sys.argv[1:] if argv is None else argv
+    marcador = os.environ.get('CMV_PRONTO', MARCADOR_PADRAO)
+    if os.path.exists(marcador):
+        os.remove(marcador)
+
+    processo = subprocess.Popen([sys.executable, '-m', 'streamlit', 'run', APP, *argumentos])
+    for sinal in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sinal, lambda numero, _quadro: processo.send_signal(numero))
+
+    url = f'http://127.0.0.1:{porta_dos_argumentos(argumentos)}'
+    if aguardar_saude(url, processo):
+        if os.environ.get('CMV_AQUECER', '1') != '0':
+            aquecer(url)
+        with open(marcador, 'w') as f:
+            f.write(str(processo.pid))
+    return processo.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Latência de interações no app, de ponta a ponta
+Sobe o app num servidor Streamlit real, envia uma exportação sintética por uma sessão
+headless (scripts/sessao_streamlit.py) e mede cada interação: tempo até o fim do
+rerun e bytes reenviados ao navegador. Interações que não disparam rerun aparecem como "-".
+
+Uso:
+    python scripts/medir_interacoes.py --linhas 60000 --linhas-por-os 30
+    python scripts/medir_interacoes.py --app /outra/versao/app.py   # comparar versões
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+
+from dados_sinteticos import gerar_raw_erp, salvar
+from sessao_streamlit import APP, SessaoStreamlit, iniciar_servidor, resumir
+
+ABA_OS = "🎯 OSs por Execução"
+ABA_FAMILIAS = "📦 Visão por Família"
+ABA_EXPORTAR = "📋 Exportar"
+
+
+async def medir(url, arquivo, repeticoes):
+    sessao = SessaoStreamlit(url)
+    await sessao.conectar()
+    with open(arquivo, 'rb') as f:
+        carga = await sessao.enviar_arquivo(sessao.widget(tipo='file_uploader'), os.path.basename(arquivo), f.read())
+    resultados = {'carga inicial (upload)': [carga]}
+
+    def anotar(nome, medida):
+        resultados.setdefault(nome, []).append(medida)
+
+    for _ in range(repeticoes):
+        anotar('filtro de status (sidebar)', await sessao.definir(sessao.widget(chave='filtro_status'), ['ESTOURADO']))
+        anotar('filtro de status (sidebar)', await sessao.definir(sessao.widget(chave='filtro_status'), []))
+
+        try:
+            card = sessao.widget(chave='card_os_')
+        except KeyError:
+            card = None
+        if card is not None:
+            anotar('abrir card de OS', await sessao.definir(card, True))
+            anotar('abrir card de OS', await sessao.definir(card, False))
+        else:
+            anotar('abrir card de OS', None)
+
+        try:
+            abas = sessao.widget(chave='aba')
+        except KeyError:
+            abas = None
+        if abas is not None:
+            anotar('trocar de aba', await sessao.definir(abas, ABA_FAMILIAS))
+            anotar('trocar de aba', await sessao.definir(abas, ABA_OS))
+        else:
+            anotar('trocar de aba', None)
+
+        # Com abas preguiçosas, o botão de download só existe com a aba de exportação aberta
+        if abas is not None:
+            anotar('trocar de aba', await sessao.definir(abas, ABA_EXPORTAR))
+        anotar('baixar CSV por OS', await sessao.clicar(sessao.widget(rotulo='Baixar CSV por OS')))
+        if abas is not None:
+            anotar('trocar de aba', await sessao.definir(abas, ABA_OS))
+
+    await sessao.fechar()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a latência das interações do app")
+    parser.add_argument('--app', default=APP)
+    parser.add_argument('--linhas', type=int, default=60_000)
+    parser.add_argument('--linhas-por-os', type=int, default=30)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, 'cmv_interacoes.csv')
+        salvar(gerar_raw_erp(args.linhas, linhas_por_os=args.linhas_por_os), arquivo)
+        ambiente = {'CMV_DADOS': os.path.join(tmp, 'snapshots'), 'CMV_CACHE': 'nenhum',
+                    'CMV_RELATORIOS': os.path.join(tmp, 'relatorios')}
+        processo, url = iniciar_servidor(args.app, ambiente=ambiente)
+        try:
+            resultados = asyncio.run(medir(url, arquivo, args.repeticoes))
+        finally:
+            processo.terminate()
+            processo.wait()
+
+    print(f"{'Interação':<30} {'p50 (s)':>9} {'p95 (s)':>9} {'KB enviados':>12}  Escopo")
+    for nome, medidas in resultados.items():
+        medidas = [m for m in medidas if m is not None]
+        if not medidas:
+            print(f"{nome:<30} {'-':>9} {'-':>9} {'-':>12}  sem rerun")
+            continue
+        r = resumir(medidas)
+        escopo = 'fragmento' if r['fragmento'] else 'página inteira'
+        print(f"{nome:<30} {r['p50_s']:>9.3f} {r['p95_s']:>9.3f} {r['kb']:>12.1f}  {escopo}")
+
+
+if __name__ == '__main__':
+    main()
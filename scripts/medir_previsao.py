@@ -0,0 +1,94 @@
+"""
+Tempo da previsão de estouro (cmv/previsao.py) com muitas séries
+Compara o ajuste em lote (uma matriz séries × exportações) com um np.polyfit por
+série, medido numa amostra e extrapolado para o total.
+
+Uso:
+    python scripts/medir_previsao.py --series 100000 --exportacoes 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cmv.previsao import ESTOURO_PREVISTO, ajustar_tendencias, montar_historico, prever  # noqa: E402
+from cmv.processamento import CHAVE_DETALHE  # noqa: E402
+
+AMOSTRA_LACO = 2000
+FAMILIAS_POR_OS = 10
+INTERVALO_DIAS = 14
+
+
+def gerar_pontos(series, exportacoes, seed=0):
+    """[(data, DataFrame OS × FAMILIA)] com consumo linear e ruído; 2% das séries somem em algum ponto"""
+    rng = np.random.default_rng(seed)
+    chaves = pd.DataFrame({
+        'EMPRESA': np.where(np.arange(series) % 2, 'ARV', 'ARV SERVICOS'),
+        'OS': (1000 + np.arange(series) // FAMILIAS_POR_OS).astype(str),
+        'FAMILIA': [f"FAMILIA {i % FAMILIAS_POR_OS:02d}" for i in range(series)],
+    })
+    previsto = rng.uniform(1_000, 100_000, series)
+    inicio = previsto * rng.uniform(0, 0.6, series)
+    ritmo = previsto * rng.uniform(0, 0.02, series)
+    datas = pd.date_range(end='2026-01-01', periods=exportacoes, freq=f'{INTERVALO_DIAS}D')
+
+    pontos = []
+    for k, data in enumerate(datas):
+        realizado = inicio + ritmo * INTERVALO_DIAS * k + rng.normal(0, 100, series)
+        ponto = chaves.assign(PREVISTO=previsto, REALIZADO=realizado)
+        if k < exportacoes - 1:
+            ponto = ponto[rng.random(series) > 0.02]
+        pontos.append((data, ponto.reset_index(drop=True)))
+    return pontos
+
+
+def medir(funcao, repeticoes=3):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a previsão de estouro em lote")
+    parser.add_argument('--series', type=int, default=100_000)
+    parser.add_argument('--exportacoes', type=int, default=8)
+    args = parser.parse_args()
+
+    pontos = gerar_pontos(args.series, args.exportacoes)
+    t_matriz, (dias, matriz) = medir(lambda: montar_historico(pontos, CHAVE_DETALHE))
+    t_ajuste, (inclinacao, _) = medir(lambda: ajustar_tendencias(dias, matriz))
+    t_total, previsao = medir(lambda: prever(pontos, CHAVE_DETALHE))
+
+    amostra = matriz[:AMOSTRA_LACO]
+
+    def laco():
+        resultado = np.full(len(amostra), np.nan)
+        for i, linha in enumerate(amostra):
+            presente = ~np.isnan(linha)
+            if presente.sum() >= 2:
+                resultado[i] = np.polyfit(dias[presente], linha[presente], 1)[0]
+        return resultado
+
+    t_laco, inclinacao_laco = medir(laco, repeticoes=1)
+    assert np.allclose(inclinacao_laco, inclinacao[:AMOSTRA_LACO], equal_nan=True)
+
+    print(f"{args.series:,} séries × {args.exportacoes} exportações".replace(',', '.'))
+    print(f"{'Etapa':<40} {'tempo (s)':>10}")
+    print(f"{'matriz séries × exportações':<40} {t_matriz:>10.3f}")
+    print(f"{'ajuste em lote (mínimos quadrados)':<40} {t_ajuste:>10.3f}")
+    print(f"{'prever() completo':<40} {t_total:>10.3f}")
+    print(f"{'np.polyfit por série (extrapolado)':<40} {t_laco * args.series / len(amostra):>10.3f}")
+    print(f"{(previsao['PREVISAO'] == ESTOURO_PREVISTO).sum()} série(s) com estouro previsto")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Tempo do remanejamento sugerido (cmv/rebalanceamento.py) com muitas OSs
+Compara a proposta em lote (todas as OSs de uma vez) com o guloso por OS em laço Python,
+medido numa amostra de OSs e extrapolado para o total.
+
+Uso:
+    python scripts/medir_remanejamento.py --linhas 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cmv.processamento import CHAVE_DETALHE, CHAVE_OS, agregar  # noqa: E402
+from cmv.rebalanceamento import VALOR_MINIMO, folgas_e_deficits, propor_transferencias  # noqa: E402
+from dados_sinteticos import gerar_raw_erp  # noqa: E402
+
+AMOSTRA_LACO = 500
+
+
+def gerar_dados(linhas):
+    """Linhas no formato interno (EMPRESA, OS, FAMILIA, PREVISTO, REALIZADO, SALDO)"""
+    raw = gerar_raw_erp(linhas)
+    return raw.rename(columns={'NUMERO_SERVICO': 'OS', 'VALORTOTALCOMPRADO': 'REALIZADO'}).astype({'OS': str})
+
+
+def laco(detalhe):
+    """Guloso do maior para o menor, uma OS por vez"""
+    folga, deficit = folgas_e_deficits(detalhe)
+    detalhe = detalhe.assign(FOLGA=folga, DEFICIT=deficit)
+    transferencias = []
+    for (empresa, os_num), grupo in detalhe.groupby(CHAVE_OS, sort=False):
+        doadores = grupo[grupo['FOLGA'] > 0].sort_values('FOLGA', ascending=False)[['FAMILIA', 'FOLGA']].values.tolist()
+        receptores = grupo[grupo['DEFICIT'] > 0].sort_values('DEFICIT', ascending=False)[['FAMILIA', 'DEFICIT']].values.tolist()
+        i = j = 0
+        while i < len(doadores) and j < len(receptores):
+            valor = min(doadores[i][1], receptores[j][1])
+            if valor >= VALOR_MINIMO:
+                transferencias.append((empresa, os_num, doadores[i][0], receptores[j][0], round(valor, 2)))
+            doadores[i][1] -= valor
+            receptores[j][1] -= valor
+            i += doadores[i][1] <= 1e-9
+            j += receptores[j][1] <= 1e-9
+    return transferencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o remanejamento sugerido em lote")
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    dados = gerar_dados(args.linhas)
+    inicio = time.perf_counter()
+    resultado = propor_transferencias(dados)
+    t_lote = time.perf_counter() - inicio
+
+    detalhe = agregar(dados, CHAVE_DETALHE)
+    n_oss = len(detalhe[CHAVE_OS].drop_duplicates())
+    amostra_oss = detalhe[CHAVE_OS].drop_duplicates().head(AMOSTRA_LACO)
+    amostra = detalhe.merge(amostra_oss, on=CHAVE_OS)
+    inicio = time.perf_counter()
+    transferencias_laco = laco(amostra)
+    t_laco = time.perf_counter() - inicio
+
+    esperado = resultado['transferencias'].merge(amostra_oss, on=CHAVE_OS)
+    obtido = pd.DataFrame(transferencias_laco, columns=esperado.columns)
+    assert len(obtido) == len(esperado)
+    assert np.allclose(
+        obtido.sort_values(['EMPRESA', 'OS', 'ORIGEM', 'DESTINO'])['VALOR'],
+        esperado.sort_values(['EMPRESA', 'OS', 'ORIGEM', 'DESTINO'])['VALOR'], atol=0.011,
+    )
+
+    por_os = resultado['por_os']
+    print(f"{args.linhas:,} linhas em {n_oss:,} OSs".replace(',', '.'))
+    print(f"{'Etapa':<40} {'tempo (s)':>10}")
+    print(f"{'propor_transferencias() em lote':<40} {t_lote:>10.3f}")
+    print(f"{'guloso por OS (extrapolado)':<40} {t_laco * n_oss / len(amostra_oss):>10.3f}")
+    print(f"{len(resultado['transferencias'])} transferência(s) em {len(por_os)} OS(s) com déficit; "
+          f"{(por_os['DESCOBERTO'] > 0).sum()} sem saldo suficiente")
+
+
+if __name__ == '__main__':
+    main()
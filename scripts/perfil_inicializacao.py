@@ -0,0 +1,139 @@
+"""
+Perfil de inicialização do app
+1. Tempo de import (python -X importtime) dos módulos que o app.py importa, por pacote
+2. Partida a frio com um snapshot sintético: tempo até o /_stcore/health e latência da
+   primeira e da segunda sessão, com `streamlit run` puro e com scripts/iniciar_app.py
+   (aquecimento antes de marcar a réplica como pronta)
+
+Uso:
+    python scripts/perfil_inicializacao.py --linhas 200000
+    python scripts/perfil_inicializacao.py --so-imports
+"""
+
+import argparse
+import ast
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados_sinteticos import gerar_raw_erp, salvar  # noqa: E402
+from sessao_streamlit import APP, RAIZ, SessaoStreamlit, iniciar_servidor, porta_livre  # noqa: E402
+
+from cmv.monitor import ingerir_arquivo  # noqa: E402
+
+TOP_IMPORTS = 15
+
+
+def modulos_do_app(app=APP):
+    """Módulos importados no nível de topo do app.py, na ordem do arquivo"""
+    with open(app, encoding='utf-8') as f:
+        arvore = ast.parse(f.read())
+    modulos = []
+    for no in arvore.body:
+        if isinstance(no, ast.Import):
+            modulos += [alias.name for alias in no.names]
+        elif isinstance(no, ast.ImportFrom) and no.module:
+            modulos.append(no.module)
+    return list(dict.fromkeys(modulos))
+
+
+def perfil_imports(modulos):
+    """[(ms acumulados, módulo)] dos imports de primeiro nível dos pacotes do app, do mais caro ao mais barato"""
+    pacotes = {m.split('.')[0] for m in modulos}
+    codigo = '; '.join(f'import {m}' for m in modulos)
+    saida = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+    ).stderr
+    tempos = []
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, acumulado, nome = linha[len('import time:'):].split('|')
+        # Primeiro nível: um espaço de recuo; submódulos vêm com recuo maior
+        if len(nome) - len(nome.lstrip()) == 1 and nome.strip().split('.')[0] in pacotes:
+            tempos.append((int(acumulado) / 1000, nome.strip()))
+    return sorted(tempos, reverse=True)
+
+
+async def _tempo_de_sessao(url):
+    sessao = SessaoStreamlit(url)
+    medida = await sessao.conectar()
+    await sessao.fechar()
+    return medida.segundos
+
+
+def preparar_snapshot(linhas, diretorio):
+    """Exportação sintética processada como o monitor faria (vira o último snapshot)"""
+    arquivo = os.path.join(diretorio, 'cmv_perfil.csv')
+    salvar(gerar_raw_erp(linhas), arquivo)
+    ingerir_arquivo(arquivo, os.path.join(diretorio, 'snapshots'))
+
+
+def partida_streamlit(ambiente):
+    inicio = time.perf_counter()
+    processo, url = iniciar_servidor(ambiente=ambiente)
+    saude = time.perf_counter() - inicio
+    try:
+        return saude, asyncio.run(_tempo_de_sessao(url)), asyncio.run(_tempo_de_sessao(url))
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def partida_aquecida(ambiente, diretorio, timeout=300):
+    porta = porta_livre()
+    marcador = os.path.join(diretorio, 'pronto')
+    processo = subprocess.Popen(
+        [sys.executable, os.path.join(RAIZ, 'scripts', 'iniciar_app.py'),
+         '--server.headless', 'true', f'--server.port={porta}', '--browser.gatherUsageStats', 'false'],
+        env=dict(os.environ, CMV_PRONTO=marcador, **ambiente),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{porta}'
+    inicio = time.perf_counter()
+    try:
+        while not os.path.exists(marcador):
+            if processo.poll() is not None or time.perf_counter() - inicio > timeout:
+                raise RuntimeError("iniciar_app.py não marcou a réplica como pronta")
+            time.sleep(0.2)
+        pronto = time.perf_counter() - inicio
+        return pronto, asyncio.run(_tempo_de_sessao(url)), asyncio.run(_tempo_de_sessao(url))
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de imports e partida a frio do app")
+    parser.add_argument('--linhas', type=int, default=200_000)
+    parser.add_argument('--so-imports', action='store_true')
+    args = parser.parse_args()
+
+    modulos = modulos_do_app()
+    print(f"Imports do app.py ({', '.join(modulos)}):")
+    tempos = perfil_imports(modulos)
+    for ms, nome in tempos[:TOP_IMPORTS]:
+        print(f"  {ms:9.1f} ms  {nome}")
+    print(f"  {sum(ms for ms, _ in tempos):9.1f} ms  total")
+    if args.so_imports:
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        preparar_snapshot(args.linhas, tmp)
+        ambiente = {'CMV_DADOS': os.path.join(tmp, 'snapshots'), 'CMV_CACHE': 'nenhum'}
+        print(f"\nPartida a frio com o último snapshot ({args.linhas:,} linhas):".replace(',', '.'))
+        print(f"{'Modo':<28} {'pronto (s)':>11} {'1ª sessão (s)':>14} {'2ª sessão (s)':>14}")
+        for nome, partida in [('streamlit run', lambda: partida_streamlit(ambiente)),
+                              ('iniciar_app.py (aquecido)', lambda: partida_aquecida(ambiente, tmp))]:
+            pronto, primeira, segunda = partida()
+            print(f"{nome:<28} {pronto:>11.2f} {primeira:>14.2f} {segunda:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Sessão headless do Streamlit
+Fala o mesmo protocolo do navegador (BackMsg/ForwardMsg em protobuf pelo websocket
+/_stcore/stream) para medir reruns de ponta a ponta contra um servidor real:
+tempo até o fim do script e bytes reenviados, inclusive reruns só de fragmentos.
+Usado por scripts/medir_interacoes.py (requer `pip install websockets`).
+"""
+
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from dataclasses import dataclass
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, 'app.py')
+
+FIM_SCRIPT = {
+    ForwardMsg.ScriptFinishedStatus.FINISHED_SUCCESSFULLY,
+    ForwardMsg.ScriptFinishedStatus.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+}
+
+# Estado inicial de widgets com estado no servidor (os demais usam o padrão do próprio widget)
+TIPOS_VALOR = {
+    'multiselect': 'string_array_value',
+    'selectbox': 'string_value',
+    'text_input': 'string_value',
+    'slider': 'double_array_value',
+    'tab_container': 'string_value',
+    'expandable': 'bool_value',
+    'button': 'trigger_value',
+    'download_button': 'trigger_value',
+    'file_uploader': 'file_uploader_state_value',
+}
+
+
+@dataclass
+class Medida:
+    """Um rerun: segundos até o fim do script, mensagens e bytes recebidos, se foi só de fragmento"""
+    segundos: float
+    mensagens: int
+    bytes: int
+    fragmento: bool
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(app=APP, porta=None, ambiente=None, timeout=60):
+    """Sobe `streamlit run` headless numa porta livre; retorna (processo, url base)"""
+    porta = porta or porta_livre()
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', app, '--server.headless', 'true',
+         '--server.port', str(porta), '--server.enableXsrfProtection', 'false',
+         '--server.enableCORS', 'false', '--browser.gatherUsageStats', 'false'],
+        env=dict(os.environ, **(ambiente or {})), cwd=os.path.dirname(app),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{porta}'
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            with urllib.request.urlopen(f'{url}/_stcore/health', timeout=2) as resposta:
+                if resposta.status == 200:
+                    return processo, url
+        except OSError:
+            time.sleep(0.3)
+    processo.kill()
+    raise RuntimeError(f"Servidor não respondeu em {timeout}s")
+
+
+def _chave_usuario(element_id):
+    """Chave do usuário embutida no id do widget ('$$ID-<hash>-<chave>'), se houver"""
+    partes = element_id.split('-', 2)
+    return partes[2] if len(partes) == 3 else None
+
+
+class SessaoStreamlit:
+    """Uma aba do navegador: mantém o estado dos widgets e mede cada rerun"""
+
+    def __init__(self, url):
+        self.url = url
+        self.widgets = {}
+        self.estados = {}
+        self.session_id = None
+        self._ws = None
+
+    async def conectar(self):
+        self._ws = await websockets.connect(
+            self.url.replace('http', 'ws', 1) + '/_stcore/stream', max_size=None,
+            subprotocols=['streamlit'],
+        )
+        return await self.rerun()
+
+    async def fechar(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def _enviar(self, mensagem):
+        await self._ws.send(mensagem.SerializeToString())
+
+    async def rerun(self, fragmento=''):
+        """Envia o estado dos widgets e espera o fim do script (ou do fragmento)"""
+        mensagem = BackMsg()
+        mensagem.rerun_script.widget_states.widgets.extend(self.estados.values())
+        mensagem.rerun_script.fragment_id = fragmento
+        inicio = time.perf_counter()
+        await self._enviar(mensagem)
+        medida = await self._aguardar_fim(inicio, bool(fragmento))
+        # Gatilhos (botões) valem só para o rerun em que foram enviados
+        for widget_id in [i for i, e in self.estados.items() if e.WhichOneof('value') == 'trigger_value']:
+            del self.estados[widget_id]
+        return medida
+
+    async def _aguardar_fim(self, inicio, fragmento):
+        mensagens = total = 0
+        while True:
+            bruto = await self._ws.recv()
+            mensagens += 1
+            total += len(bruto)
+            msg = ForwardMsg()
+            msg.ParseFromString(bruto)
+            tipo = msg.WhichOneof('type')
+            if tipo == 'new_session' and msg.new_session.initialize.session_id:
+                self.session_id = msg.new_session.initialize.session_id
+            elif tipo == 'delta':
+                self._registrar(msg.delta)
+            elif tipo == 'script_finished' and msg.script_finished in FIM_SCRIPT:
+                return Medida(time.perf_counter() - inicio, mensagens, total, fragmento)
+
+    def _registrar(self, delta):
+        """Guarda id, tipo, rótulo e fragmento de cada widget criado pelo delta"""
+        if delta.WhichOneof('type') == 'new_element':
+            tipo = delta.new_element.WhichOneof('type')
+            proto = getattr(delta.new_element, tipo)
+        elif delta.WhichOneof('type') == 'add_block':
+            tipo = delta.add_block.WhichOneof('type')
+            proto = getattr(delta.add_block, tipo) if tipo else None
+        else:
+            return
+        widget_id = getattr(proto, 'id', '')
+        if not widget_id:
+            return
+        self.widgets[widget_id] = {
+            'tipo': tipo,
+            'chave': _chave_usuario(widget_id),
+            'rotulo': getattr(proto, 'label', ''),
+            'fragmento': delta.fragment_id,
+            'sem_rerun': getattr(proto, 'ignore_rerun', False),
+        }
+
+    def widget(self, chave=None, rotulo=None, tipo=None):
+        """Id do widget pela chave (ou prefixo da chave), pelo texto do rótulo ou pelo tipo"""
+        for widget_id, info in reversed(list(self.widgets.items())):
+            if chave is not None and not (info['chave'] or '').startswith(chave):
+                continue
+            if rotulo is not None and rotulo not in info['rotulo']:
+                continue
+            if tipo is not None and info['tipo'] != tipo:
+                continue
+            return widget_id
+        raise KeyError(f"Widget não encontrado: chave={chave} rotulo={rotulo} tipo={tipo}")
+
+    async def definir(self, widget_id, valor):
+        """Altera o valor de um widget e executa o rerun (do fragmento dele, se estiver num)"""
+        info = self.widgets[widget_id]
+        estado = self.estados.get(widget_id) or self._novo_estado(widget_id)
+        campo = TIPOS_VALOR[info['tipo']]
+        if campo == 'string_array_value':
+            del estado.string_array_value.data[:]
+            estado.string_array_value.data.extend(valor)
+        elif campo == 'double_array_value':
+            del estado.double_array_value.data[:]
+            estado.double_array_value.data.extend(valor)
+        else:
+            setattr(estado, campo, valor)
+        return await self.rerun(info['fragmento'])
+
+    async def clicar(self, widget_id):
+        """Clica num botão; None se o botão não dispara rerun (ex.: download com on_click='ignore')"""
+        if self.widgets[widget_id]['sem_rerun']:
+            return None
+        return await self.definir(widget_id, True)
+
+    def _novo_estado(self, widget_id):
+        mensagem = BackMsg()
+        estado = mensagem.rerun_script.widget_states.widgets.add()
+        estado.id = widget_id
+        self.estados[widget_id] = estado
+        return estado
+
+    async def enviar_arquivo(self, widget_id, nome, conteudo):
+        """Upload como no navegador: pede a URL, faz o PUT multipart e atualiza o widget"""
+        pedido = BackMsg()
+        pedido.file_urls_request.request_id = uuid.uuid4().hex
+        pedido.file_urls_request.file_names.append(nome)
+        pedido.file_urls_request.session_id = self.session_id
+        await self._enviar(pedido)
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self._ws.recv())
+            if msg.WhichOneof('type') == 'file_urls_response':
+                urls = msg.file_urls_response.file_urls[0]
+                break
+
+        await asyncio.to_thread(self._put, urls.upload_url, nome, conteudo)
+        estado = self.estados.get(widget_id) or self._novo_estado(widget_id)
+        estado.file_uploader_state_value.Clear()
+        info = estado.file_uploader_state_value.uploaded_file_info.add()
+        info.name = nome
+        info.size = len(conteudo)
+        info.file_id = urls.file_id
+        info.file_urls.CopyFrom(urls)
+        return await self.rerun(self.widgets[widget_id]['fragmento'])
+
+    def _put(self, upload_url, nome, conteudo):
+        fronteira = uuid.uuid4().hex
+        corpo = b''.join([
+            f'--{fronteira}\r\nContent-Disposition: form-data; name="file"; filename="{nome}"\r\n'.encode(),
+            b'Content-Type: application/octet-stream\r\n\r\n', conteudo, f'\r\n--{fronteira}--\r\n'.encode(),
+        ])
+        url = upload_url if upload_url.startswith('http') else self.url + upload_url
+        requisicao = urllib.request.Request(
+            url, data=corpo, method='PUT',
+            headers={'Content-Type': f'multipart/form-data; boundary={fronteira}'},
+        )
+        with urllib.request.urlopen(requisicao, timeout=300) as resposta:
+            resposta.read()
+
+
+def resumir(medidas):
+    """Medidas -> dict com mediana/p95 de segundos e bytes médios (para impressão em JSON)"""
+    tempos = sorted(m.segundos for m in medidas)
+
+    def percentil(p):
+        return tempos[min(len(tempos) - 1, int(round(p * (len(tempos) - 1))))]
+
+    return {
+        'n': len(medidas),
+        'p50_s': round(percentil(0.5), 3),
+        'p95_s': round(percentil(0.95), 3),
+        'kb': round(sum(m.bytes for m in medidas) / len(medidas) / 1024, 1),
+        'fragmento': all(m.fragmento for m in medidas),
+    }
+
+
+if __name__ == '__main__':
+    async def _demo():
+        processo, url = iniciar_servidor()
+        try:
+            sessao = SessaoStreamlit(url)
+            print(json.dumps(resumir([await sessao.conectar()])))
+            await sessao.fechar()
+        finally:
+            processo.terminate()
+
+    asyncio.run(_demo())
@@ -0,0 +1,248 @@
+"""
+Teste de carga com sessões simultâneas
+Sobe o app num servidor Streamlit real e, para cada quantidade de sessões pedida, roda
+essas sessões headless ao mesmo tempo (scripts/sessao_streamlit.py). Cada sessão faz o
+roteiro de um comprador: upload de uma planilha sintética, filtro de status, abrir e
+fechar um card de OS, trocar de aba e gerar os relatórios na aba de exportação.
+
+Relatório por quantidade de sessões:
+- p50/p95/máximo dos reruns, no total e por interação;
+- CPU do servidor e dos processos filhos;
+- RSS de pico e RSS a mais por sessão.
+
+Cada nível usa um servidor novo, sem serviços externos.
+
+Uso:
+    python scripts/teste_carga.py --sessoes 1 2 4 8 --linhas 20000
+    python scripts/teste_carga.py --sessoes 4 --formato csv --distintos --json carga.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+
+from dados_sinteticos import gerar_raw_erp, salvar
+from sessao_streamlit import APP, SessaoStreamlit, iniciar_servidor, resumir
+
+ABA_OS = "🎯 OSs por Execução"
+ABA_FAMILIAS = "📦 Visão por Família"
+ABA_EXPORTAR = "📋 Exportar"
+
+# Intervalo de amostragem de CPU/RSS do servidor (s)
+AMOSTRAGEM = 0.2
+
+TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGINA = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _ler_stat(pid):
+    """(pid pai, segundos de CPU, RSS em bytes) de /proc/<pid>/stat"""
+    with open(f'/proc/{pid}/stat') as f:
+        campos = f.read().rsplit(')', 1)[1].split()
+    # Após o nome: estado(0) ppid(1) ... utime(11) stime(12) cutime(13) cstime(14) ... rss(21)
+    cpu = sum(int(c) for c in campos[11:15]) / TICKS
+    return int(campos[1]), cpu, int(campos[21]) * PAGINA
+
+
+def medir_arvore(pid):
+    """(segundos de CPU, RSS em bytes) do processo e dos descendentes vivos"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        raiz = psutil.Process(pid)
+        processos = [raiz] + raiz.children(recursive=True)
+        cpu = rss = 0.0
+        for processo in processos:
+            try:
+                tempos = processo.cpu_times()
+                cpu += tempos.user + tempos.system + tempos.children_user + tempos.children_system
+                rss += processo.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return cpu, rss
+
+    estados = {}
+    for nome in os.listdir('/proc'):
+        if nome.isdigit():
+            try:
+                estados[int(nome)] = _ler_stat(nome)
+            except (OSError, IndexError, ValueError):
+                pass
+    filhos = {}
+    for filho, (pai, _, _) in estados.items():
+        filhos.setdefault(pai, []).append(filho)
+    cpu = rss = 0
+    pendentes = [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        if atual in estados:
+            cpu += estados[atual][1]
+            rss += estados[atual][2]
+        pendentes += filhos.get(atual, [])
+    return cpu, rss
+
+
+class MonitorServidor:
+    """Amostra CPU e RSS da árvore de processos do servidor numa thread"""
+
+    def __init__(self, pid, intervalo=AMOSTRAGEM):
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico_rss = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def _amostrar(self):
+        while not self._parar.is_set():
+            self.pico_rss = max(self.pico_rss, medir_arvore(self.pid)[1])
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self.cpu_inicio, self.rss_inicio = medir_arvore(self.pid)
+        self.inicio = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._parar.set()
+        self._thread.join()
+        cpu_fim, rss_fim = medir_arvore(self.pid)
+        self.segundos = time.perf_counter() - self.inicio
+        self.cpu = cpu_fim - self.cpu_inicio
+        self.pico_rss = max(self.pico_rss, rss_fim)
+
+
+async def roteiro(url, arquivo, repeticoes, relatorios):
+    """Uma sessão de comprador; retorna {interação: [Medida]}"""
+    medidas = {}
+
+    def anotar(nome, medida):
+        if medida is not None:
+            medidas.setdefault(nome, []).append(medida)
+
+    sessao = SessaoStreamlit(url)
+    anotar('abrir o app', await sessao.conectar())
+    with open(arquivo, 'rb') as f:
+        anotar('upload', await sessao.enviar_arquivo(
+            sessao.widget(tipo='file_uploader'), os.path.basename(arquivo), f.read()))
+
+    for _ in range(repeticoes):
+        anotar('filtro de status', await sessao.definir(sessao.widget(chave='filtro_status'), ['ESTOURADO']))
+        anotar('filtro de status', await sessao.definir(sessao.widget(chave='filtro_status'), []))
+
+        card = sessao.widget(chave='card_os_')
+        anotar('card de OS', await sessao.definir(card, True))
+        anotar('card de OS', await sessao.definir(card, False))
+
+        abas = sessao.widget(chave='aba')
+        anotar('trocar de aba', await sessao.definir(abas, ABA_FAMILIAS))
+        anotar('trocar de aba', await sessao.definir(abas, ABA_EXPORTAR))
+        if relatorios:
+            anotar('gerar relatórios', await sessao.clicar(sessao.widget(chave='gerar_relatorios')))
+        anotar('trocar de aba', await sessao.definir(abas, ABA_OS))
+
+    await sessao.fechar()
+    return medidas
+
+
+async def rodar_sessoes(url, arquivos, repeticoes, relatorios):
+    resultados = await asyncio.gather(*(roteiro(url, arquivo, repeticoes, relatorios) for arquivo in arquivos))
+    juntas = {}
+    for medidas in resultados:
+        for nome, lista in medidas.items():
+            juntas.setdefault(nome, []).extend(lista)
+    return juntas
+
+
+def preparar_planilhas(pasta, linhas, formato, quantidade):
+    """Planilhas sintéticas (uma por sessão com --distintos, senão a mesma para todas)"""
+    arquivos = []
+    for seed in range(quantidade):
+        arquivo = os.path.join(pasta, f'cmv_carga_{seed}.{formato}')
+        salvar(gerar_raw_erp(linhas, seed=seed), arquivo)
+        arquivos.append(arquivo)
+    return arquivos
+
+
+def medir_nivel(args, n, planilhas, tmp):
+    ambiente = {
+        'CMV_DADOS': os.path.join(tmp, f'snapshots_{n}'),
+        'CMV_CACHE': args.cache,
+        'CMV_RELATORIOS': os.path.join(tmp, f'relatorios_{n}'),
+    }
+    arquivos = [planilhas[i % len(planilhas)] for i in range(n)]
+    processo, url = iniciar_servidor(args.app, ambiente=ambiente)
+    try:
+        with MonitorServidor(processo.pid) as monitor:
+            medidas = asyncio.run(rodar_sessoes(url, arquivos, args.repeticoes, not args.sem_relatorios))
+    finally:
+        processo.terminate()
+        processo.wait()
+
+    todas = [m for lista in medidas.values() for m in lista]
+    total = resumir(todas)
+    return {
+        'sessoes': n,
+        'reruns': total['n'],
+        'p50_s': total['p50_s'],
+        'p95_s': total['p95_s'],
+        'max_s': round(max(m.segundos for m in todas), 3),
+        'duracao_s': round(monitor.segundos, 1),
+        'cpu_pct': round(100 * monitor.cpu / monitor.segundos, 1),
+        'cpu_por_sessao_s': round(monitor.cpu / n, 2),
+        'rss_pico_mb': round(monitor.pico_rss / 2**20, 1),
+        'rss_por_sessao_mb': round((monitor.pico_rss - monitor.rss_inicio) / 2**20 / n, 1),
+        'interacoes': {nome: resumir(lista) for nome, lista in medidas.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sessões simultâneas contra o app: latência, CPU e memória")
+    parser.add_argument('--app', default=APP)
+    parser.add_argument('--sessoes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--linhas', type=int, default=20_000)
+    parser.add_argument('--formato', choices=['xlsx', 'csv', 'parquet'], default='xlsx')
+    parser.add_argument('--distintos', action='store_true', help="Uma planilha diferente por sessão")
+    parser.add_argument('--repeticoes', type=int, default=2, help="Voltas do roteiro por sessão")
+    parser.add_argument('--cache', default='nenhum', help="CMV_CACHE do servidor (padrão: %(default)s)")
+    parser.add_argument('--sem-relatorios', action='store_true', help="Não gera relatórios na exportação")
+    parser.add_argument('--json', default=None, help="Grava os resultados completos neste arquivo")
+    args = parser.parse_args()
+
+    niveis = []
+    with tempfile.TemporaryDirectory() as tmp:
+        quantidade = max(args.sessoes) if args.distintos else 1
+        planilhas = preparar_planilhas(tmp, args.linhas, args.formato, quantidade)
+        for n in args.sessoes:
+            nivel = medir_nivel(args, n, planilhas, tmp)
+            niveis.append(nivel)
+            print(f"{n} sessão(ões): p95 {nivel['p95_s']:.2f}s em {nivel['duracao_s']:.0f}s", flush=True)
+
+    print(f"\n{args.linhas:,} linhas ({args.formato}) por planilha".replace(',', '.'))
+    print(f"{'Sessões':>7} {'reruns':>7} {'p50 (s)':>8} {'p95 (s)':>8} {'máx (s)':>8} "
+          f"{'CPU (%)':>8} {'CPU/sessão (s)':>15} {'RSS pico (MB)':>14} {'RSS/sessão (MB)':>16}")
+    for nivel in niveis:
+        print(f"{nivel['sessoes']:>7} {nivel['reruns']:>7} {nivel['p50_s']:>8.2f} {nivel['p95_s']:>8.2f} "
+              f"{nivel['max_s']:>8.2f} {nivel['cpu_pct']:>8.1f} {nivel['cpu_por_sessao_s']:>15.2f} "
+              f"{nivel['rss_pico_mb']:>14.1f} {nivel['rss_por_sessao_mb']:>16.1f}")
+
+    print("\np95 por interação (s)")
+    nomes = list(dict.fromkeys(nome for nivel in niveis for nome in nivel['interacoes']))
+    print(f"{'Interação':<20}" + ''.join(f"{nivel['sessoes']:>8}" for nivel in niveis))
+    for nome in nomes:
+        valores = [nivel['interacoes'].get(nome, {}).get('p95_s') for nivel in niveis]
+        print(f"{nome:<20}" + ''.join(f"{v:>8.2f}" if v is not None else f"{'-':>8}" for v in valores))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(niveis, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Teste de réplicas com cache compartilhado
+Sobe duas instâncias do app (processos separados, como duas réplicas atrás do Traefik)
+apontando para o mesmo CMV_CACHE e envia o mesmo arquivo às duas: a segunda precisa
+reaproveitar a leitura da primeira e mostrar os mesmos totais. É a verificação do
+container com o app inteiro; a regressão do cache e dos snapshots compartilhados fica em
+tests/test_replicas.py.
+
+Uso:
+    python scripts/teste_replicas.py                    # cache em pasta
+    python scripts/teste_replicas.py --backend sqlite
+    python scripts/teste_replicas.py --backend redis    # fakeredis local (ou --redis-url)
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from dados_sinteticos import gerar_raw_erp, salvar  # noqa: E402
+
+APP = os.path.join(RAIZ, 'app.py')
+AVISO_CACHE = 'cache compartilhado'
+
+
+def rodar_replica(arquivo):
+    """Executa o app via AppTest, envia o arquivo e imprime o resultado em JSON (processo filho)"""
+    from streamlit.testing.v1 import AppTest
+
+    inicio = time.perf_counter()
+    at = AppTest.from_file(APP, default_timeout=300).run()
+    with open(arquivo, 'rb') as f:
+        at.file_uploader[0].upload(os.path.basename(arquivo), f.read()).run()
+
+    print(json.dumps({
+        'pid': os.getpid(),
+        'segundos': round(time.perf_counter() - inicio, 2),
+        'excecoes': [str(e.value) for e in at.exception],
+        'do_cache': any(AVISO_CACHE in c.value for c in at.caption),
+        'metricas': {m.label: m.value for m in at.metric},
+    }))
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_fakeredis():
+    """Servidor compatível com Redis em memória (pacote fakeredis) numa thread; retorna a URL"""
+    from fakeredis import TcpFakeServer
+
+    porta = porta_livre()
+    servidor = TcpFakeServer(('127.0.0.1', porta), server_type='redis')
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f'redis://127.0.0.1:{porta}/0'
+
+
+def executar(nome, arquivo, ambiente):
+    processo = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--replica', arquivo],
+        env=ambiente, capture_output=True, text=True, check=False,
+    )
+    if processo.returncode != 0:
+        raise SystemExit(f"Réplica {nome} falhou:\n{processo.stderr}")
+    resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+    print(f"Réplica {nome} (pid {resultado['pid']}): {resultado['segundos']}s, "
+          f"cache {'reaproveitado' if resultado['do_cache'] else 'vazio'}")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Duas réplicas do app contra o mesmo cache")
+    parser.add_argument('--backend', choices=['arquivo', 'sqlite', 'redis'], default='arquivo')
+    parser.add_argument('--redis-url', help="Redis real (padrão: fakeredis local)")
+    parser.add_argument('--linhas', type=int, default=5_000)
+    parser.add_argument('--replica', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.replica:
+        rodar_replica(args.replica)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        arquivo = os.path.join(tmp, 'cmv_replicas.xlsx')
+        salvar(gerar_raw_erp(args.linhas), arquivo)
+
+        if args.backend == 'arquivo':
+            url = 'arquivo://' + os.path.join(tmp, 'cache')
+        elif args.backend == 'sqlite':
+            url = 'sqlite://' + os.path.join(tmp, 'cache.db')
+        else:
+            url = args.redis_url or iniciar_fakeredis()
+
+        ambiente = dict(os.environ, CMV_CACHE=url, CMV_DADOS=os.path.join(tmp, 'snapshots'))
+        print(f"Backend: {url}")
+        primeira = executar('A', arquivo, ambiente)
+        segunda = executar('B', arquivo, ambiente)
+
+    falhas = []
+    if primeira['excecoes'] or segunda['excecoes']:
+        falhas.append(f"exceções no app: {primeira['excecoes'] + segunda['excecoes']}")
+    if primeira['do_cache']:
+        falhas.append("a réplica A não deveria encontrar o arquivo no cache")
+    if not segunda['do_cache']:
+        falhas.append("a réplica B não reaproveitou o cache")
+    if primeira['metricas'] != segunda['metricas']:
+        falhas.append(f"métricas diferentes: {primeira['metricas']} x {segunda['metricas']}")
+
+    if falhas:
+        raise SystemExit("FALHOU: " + "; ".join(falhas))
+    print(f"OK: {len(segunda['metricas'])} métricas iguais nas duas réplicas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import json
+import os
+
+import pandas as pd
+
+from cmv.alertas import gerar_alertas
+from cmv.processamento import LIMITES_PADRAO
+from cmv.snapshots import salvar_snapshot
+
+
+def exportacao(realizado):
+    return pd.DataFrame({
+        'EMPRESA': 'E', 'OS': ['1', '1', '2'], 'FAMILIA': ['F1', 'F2', 'F1'],
+        'PREVISTO': 100.0, 'REALIZADO': realizado, 'SALDO': [100.0 - r for r in realizado],
+    })
+
+
+def snapshots(diretorio):
+    salvar_snapshot(exportacao([50.0, 10.0, 40.0]), 'a' * 64, 'raw_erp', 'e0.xlsx', 1.0, diretorio)
+    salvar_snapshot(exportacao([95.0, 10.0, 75.0]), 'b' * 64, 'raw_erp', 'e1.xlsx', 2.0, diretorio)
+    return diretorio
+
+
+def test_transicoes_para_critico(tmp_path):
+    resumo = gerar_alertas(snapshots(str(tmp_path / 'snap')), str(tmp_path / 'saida'))
+
+    transicoes = pd.read_csv(tmp_path / 'saida' / resumo['arquivo'], dtype={'OS': str})
+    assert resumo['oss'] == 0 and resumo['familias'] == 1
+    assert transicoes[['OS', 'FAMILIA', 'RISCO_ANTES', 'RISCO_DEPOIS', 'DELTA_REALIZADO']].values.tolist() == [
+        ['1', 'F1', 'OK', 'CRÍTICO', 45.0]]
+
+
+def test_limites_e_todas_diferentes_nao_reaproveitam_o_alerta(tmp_path):
+    diretorio, saida = snapshots(str(tmp_path / 'snap')), str(tmp_path / 'saida')
+    limites = {'ATENÇÃO': 10.0, 'CRÍTICO': 20.0, 'ESTOURADO': 30.0}
+
+    padrao = gerar_alertas(diretorio, saida)
+    todas = gerar_alertas(diretorio, saida, todas=True)
+    proprios = gerar_alertas(diretorio, saida, limites)
+
+    assert padrao['limites'] == LIMITES_PADRAO and not padrao['todas']
+    assert todas['todas'] and (todas['oss'], todas['familias']) == (1, 2)
+    assert proprios['limites'] == limites
+    assert len({padrao['arquivo'], todas['arquivo'], proprios['arquivo']}) == 3
+    # O mesmo critério reaproveita o alerta gravado
+    assert gerar_alertas(diretorio, saida, limites) == proprios
+    with open(os.path.join(saida, proprios['arquivo'].replace('.csv', '.json')), encoding='utf-8') as f:
+        assert json.load(f)['limites'] == limites
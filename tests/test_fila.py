@@ -0,0 +1,51 @@
+import time
+from concurrent.futures import Future
+
+import pandas as pd
+import pytest
+
+import cmv.ingestao
+from cmv.fila import FilaLeitura
+from cmv.ingestao import IngestaoPlanilha, combinar_parciais, processar_conteudo
+from cmv.processamento import compactar
+
+CSV = (
+    'EMPRESA,NUMERO_SERVICO,FAMILIA,PREVISTO,VALORTOTALCOMPRADO,SALDO\n'
+    + ''.join(f'E,{i % 7},F{i % 3},100,{i},{100 - i}\n' for i in range(60))
+).encode('utf-8')
+
+
+@pytest.fixture
+def fila():
+    fila = FilaLeitura(workers=1)
+    yield fila
+    fila.encerrar()
+
+
+def test_sessoes_com_o_mesmo_upload_compartilham_a_leitura(fila):
+    sessoes = [IngestaoPlanilha(CSV, 'dados.csv', tamanho_lote=10, fila=fila).iniciar() for _ in range(2)]
+    for sessao in sessoes:
+        sessao.aguardar()
+
+    esperado, _ = processar_conteudo(CSV, nome='dados.csv')
+    assert [sessao.erro for sessao in sessoes] == [None, None]
+    assert sorted(sessao.leitura_compartilhada for sessao in sessoes) == [False, True]
+    for sessao in sessoes:
+        pd.testing.assert_frame_equal(sessao.resultado(), esperado)
+
+
+def test_fila_compactada_guarda_so_o_parcial_combinado(fila, monkeypatch):
+    monkeypatch.setattr(cmv.ingestao, 'LINHAS_PARCIAIS', 5)
+    fila._tarefas['h'] = fila._nova_tarefa(Future(), compactado=True)
+    dados, _ = processar_conteudo(CSV, nome='dados.csv')
+    lotes = [compactar(dados.iloc[i:i + 10]) for i in range(0, 60, 10)]
+    for n, lote in enumerate(lotes, 1):
+        fila._avisos.put(('h', ('csv', lote, 10 * n, 60)))
+
+    limite = time.monotonic() + 10
+    while (estado := fila.estado('h'))['linhas_lidas'] < 60 or len(estado['lotes']) > 1:
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+    assert len(estado['lotes']) == 1
+    pd.testing.assert_frame_equal(estado['lotes'][0], combinar_parciais(lotes))
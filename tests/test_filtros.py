@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from cmv.filtros import IndiceBitmap, desempacotar, filtrar_status, indexar_status, selecionar_status
+from cmv.previsao import ESTOURO_PREVISTO
+
+EXTRAS = {ESTOURO_PREVISTO: 'PREVISAO'}
+
+
+def test_status_pelos_bitsets_guardados_igual_ao_isin():
+    rng = np.random.default_rng(0)
+    por_os = pd.DataFrame({
+        'OS': np.arange(1000).astype(str),
+        'RISCO': rng.choice(['OK', 'ATENÇÃO', 'CRÍTICO', 'ESTOURADO', 'SEM ORÇAMENTO'], 1000),
+        'PREVISAO': rng.choice(['', ESTOURO_PREVISTO], 1000),
+    })
+    indice = indexar_status(por_os, EXTRAS)
+    for status in [['CRÍTICO'], ['OK', 'ESTOURADO'], ['ATENÇÃO', ESTOURO_PREVISTO], ['INEXISTENTE']]:
+        pd.testing.assert_frame_equal(por_os[selecionar_status(indice, status)],
+                                      filtrar_status(por_os, status, EXTRAS))
+
+
+def test_indice_de_muitos_valores_seleciona_pelas_posicoes():
+    valores = np.arange(5000).astype(str)
+    indice = IndiceBitmap(np.tile(valores, 3))
+    assert indice.bitsets is None
+    linhas = desempacotar(indice.selecionar(['7', '4999', 'x']), 15000)
+    assert np.flatnonzero(linhas).tolist() == [7, 4999, 5007, 9999, 10007, 14999]
@@ -0,0 +1,47 @@
+from io import BytesIO
+
+import pytest
+from openpyxl import Workbook
+
+from cmv.ingestao import processar_em_lotes
+from cmv.leitores import abrir
+from cmv.processamento import processar_planilha
+
+CABECALHO = ['EMPRESA', 'NUMERO_SERVICO', 'FAMILIA', 'PREVISTO', 'VALORTOTALCOMPRADO', 'SALDO']
+
+
+def planilha(linhas):
+    wb = Workbook()
+    ws = wb.active
+    for linha in [CABECALHO] + linhas:
+        ws.append(linha)
+    arquivo = BytesIO()
+    wb.save(arquivo)
+    return arquivo.getvalue()
+
+
+@pytest.mark.parametrize('tamanho_lote', [1, 2, 5000])
+def test_linhas_em_branco_mantem_os_inteira(tamanho_lote):
+    conteudo = planilha([
+        ['E', 1001, 'F1', 100, 50, 50],
+        [None] * 6,
+        ['E', 1002, 'F2', 100, 80, 20],
+    ])
+    lotes = processar_em_lotes(conteudo, tamanho_lote, nome='dados.xlsx', backend='openpyxl')
+    oss = [os_num for _, df_lote, _, _ in lotes for os_num in df_lote['OS']]
+
+    assert oss == ['1001', '1002']
+    assert oss == processar_planilha(BytesIO(conteudo))['OS'].tolist()
+
+
+def test_lote_do_openpyxl_nao_converte_os_para_float():
+    # Segundo lote sem o cabeçalho: só números e uma linha em branco
+    conteudo = planilha([['E', 1001, 'F1', 100, 50, 50], [None] * 6, ['E', 1002, 'F2', 100, 80, 20]])
+    leitura = abrir(conteudo, nome='dados.xlsx', tamanho_lote=2, backend='openpyxl')
+    try:
+        lotes = list(leitura.blocos)
+    finally:
+        leitura.fechar()
+
+    assert lotes[1][1].tolist()[1] == 1002
+    assert isinstance(lotes[1][1].tolist()[1], int)
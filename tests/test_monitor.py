@@ -0,0 +1,50 @@
+import os
+
+from cmv.monitor import MonitorPasta
+from cmv.snapshots import listar_snapshots, ultimo_snapshot
+
+CABECALHO = 'EMPRESA,NUMERO_SERVICO,FAMILIA,PREVISTO,VALORTOTALCOMPRADO,SALDO\n'
+
+
+def exportar(pasta, nome, realizado, mtime):
+    caminho = os.path.join(pasta, nome)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(CABECALHO + f'E,1,F1,100,{realizado},{100 - realizado}\nE,2,F1,100,10,90\n')
+    os.utime(caminho, (mtime, mtime))
+
+
+def processar(pasta, diretorio):
+    MonitorPasta(pasta, diretorio, estabilidade=0, workers=3).executar(uma_vez=True)
+    return {meta['origem']: meta for meta in listar_snapshots(diretorio)}
+
+
+def test_base_do_incremental_segue_o_mtime_das_exportacoes(tmp_path):
+    pasta, diretorio = str(tmp_path / 'exportacoes'), str(tmp_path / 'snap')
+    os.makedirs(pasta)
+    # Mesmo lote, gravados em paralelo
+    for i, nome in enumerate(['c.csv', 'a.csv', 'd.csv']):
+        exportar(pasta, nome, 10 * (i + 1), {'a.csv': 1000, 'c.csv': 2000, 'd.csv': 4000}[nome])
+    metas = processar(pasta, diretorio)
+    assert metas['a.csv']['base'] is None
+    assert metas['c.csv']['base_origem'] == 'a.csv'
+    assert metas['d.csv']['base_origem'] == 'c.csv'
+
+    # Exportação atrasada: a base é a anterior a ela, não a última gravada
+    exportar(pasta, 'b.csv', 70, 1500)
+    assert processar(pasta, diretorio)['b.csv']['base_origem'] == 'a.csv'
+
+
+def test_mesmo_conteudo_com_outro_nome_atualiza_meta_e_ultimo(tmp_path):
+    pasta, diretorio = str(tmp_path / 'exportacoes'), str(tmp_path / 'snap')
+    os.makedirs(pasta)
+    exportar(pasta, 'a.csv', 10, 1000)
+    exportar(pasta, 'b.csv', 20, 2000)
+    processar(pasta, diretorio)
+
+    exportar(pasta, 'a_copia.csv', 10, 3000)
+    processar(pasta, diretorio)
+    metas = listar_snapshots(diretorio)
+
+    assert [meta['origem'] for meta in metas] == ['b.csv', 'a_copia.csv']
+    assert ultimo_snapshot(diretorio)['hash'] == metas[-1]['hash']
+    assert ultimo_snapshot(diretorio)['origem_mtime'] == metas[-1]['origem_mtime'] == 3000
@@ -0,0 +1,13 @@
+import numpy as np
+import pandas as pd
+
+from cmv.processamento import texto_os
+
+
+def test_texto_os_normaliza_so_numeros_inteiros():
+    serie = pd.Series([1001.0, 1002, 'A1.0', ' 77.0 ', 12.5], dtype=object)
+    assert texto_os(serie).tolist() == ['1001', '1002', 'A1.0', '77.0', '12.5']
+
+
+def test_texto_os_coluna_float_com_vazios():
+    assert texto_os(pd.Series([1001.0, np.nan, 1002.0])).tolist()[::2] == ['1001', '1002']
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from cmv.projetos import SEM_CLIENTE, enriquecer
+
+
+def test_cadastro_da_empresa_vence_e_o_sem_empresa_completa():
+    df = pd.DataFrame({'EMPRESA': ['A', 'B', 'A', 'A'], 'OS': ['1', '1', '2', '3'], 'VALOR': [1, 2, 3, 4]},
+                      index=[10, 11, 12, 13])
+    projetos = pd.DataFrame({
+        'EMPRESA': ['', 'A', 'B'],
+        'OS': ['1', '1', '2'],
+        'CLIENTE': ['GERAL', None, 'SÓ DA B'],
+        'PROPOSTA': ['P-GERAL', 'P-A', None],
+    })
+
+    enriquecido = enriquecer(df, projetos)
+
+    assert enriquecido['CLIENTE'].tolist() == ['GERAL', 'GERAL', SEM_CLIENTE, SEM_CLIENTE]
+    assert enriquecido['PROPOSTA'].tolist() == ['P-A', 'P-GERAL', '', '']
+    pd.testing.assert_frame_equal(enriquecido[df.columns], df)
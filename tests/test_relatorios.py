@@ -0,0 +1,54 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from cmv.processamento import classificar_familias, classificar_os
+from cmv.relatorios import ARQUIVO_CARTEIRA, empacotar, gerar_relatorios, nome_arquivo
+
+
+def agregados_de(oss, realizado):
+    dados = pd.DataFrame({
+        'EMPRESA': 'E', 'OS': oss, 'FAMILIA': 'F1',
+        'PREVISTO': 100.0, 'REALIZADO': realizado, 'SALDO': [100.0 - r for r in realizado],
+    })
+    return {'dados': dados, 'por_os': classificar_os(dados), 'por_familia': classificar_familias(dados)}
+
+
+def test_oss_que_viram_o_mesmo_nome_tem_arquivos_distintos(tmp_path):
+    agregados = agregados_de(['1159/1160', '1159_1160'], [50.0, 95.0])
+
+    assert nome_arquivo('E', '1159/1160') != nome_arquivo('E', '1159_1160')
+    resultado = gerar_relatorios(agregados, str(tmp_path), workers=1)
+    assert resultado['gerados'] == 2
+    for os_num in ['1159/1160', '1159_1160']:
+        assert os.path.exists(os.path.join(resultado['diretorio'], nome_arquivo('E', os_num)))
+    # Nova geração sem mudança: nada a renderizar
+    assert gerar_relatorios(agregados, str(tmp_path), workers=1)['gerados'] == 0
+
+
+def test_geracoes_simultaneas_de_datasets_diferentes_nao_se_misturam(tmp_path):
+    # Mesmo número de OS, dados diferentes, mesma pasta base, ao mesmo tempo
+    geracoes = {
+        'a': agregados_de(['1', '2'], [12.0, 34.0]),
+        'b': agregados_de(['1', '3'], [98.0, 76.0]),
+    }
+
+    def gerar(nome):
+        resultado = gerar_relatorios(geracoes[nome], str(tmp_path), workers=1, hash_dataset=nome * 64)
+        return resultado, zipfile.ZipFile(io.BytesIO(empacotar(resultado)))
+
+    with ThreadPoolExecutor(2) as executor:
+        (res_a, zip_a), (res_b, zip_b) = executor.map(gerar, ['a', 'b'])
+
+    assert res_a['diretorio'] != res_b['diretorio']
+    assert sorted(zip_a.namelist()) == sorted([ARQUIVO_CARTEIRA, nome_arquivo('E', '1'), nome_arquivo('E', '2')])
+    assert sorted(zip_b.namelist()) == sorted([ARQUIVO_CARTEIRA, nome_arquivo('E', '1'), nome_arquivo('E', '3')])
+    os_a = zip_a.read(nome_arquivo('E', '1')).decode('utf-8')
+    os_b = zip_b.read(nome_arquivo('E', '1')).decode('utf-8')
+    assert '>12%<' in os_a and '>98%<' not in os_a
+    assert '>98%<' in os_b and '>12%<' not in os_b
+    assert 'OS 2' in zip_a.read(ARQUIVO_CARTEIRA).decode('utf-8')
+    assert 'OS 3' in zip_b.read(ARQUIVO_CARTEIRA).decode('utf-8')
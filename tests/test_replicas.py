@@ -0,0 +1,104 @@
+"""
+Duas réplicas do app (processos separados) com o mesmo CMV_CACHE e o mesmo volume de
+snapshots: o que uma grava a outra enxerga. scripts/teste_replicas.py faz o mesmo com o
+app inteiro (AppTest), como verificação manual do container.
+"""
+
+import multiprocessing
+import os
+import socket
+import threading
+
+import pandas as pd
+import pytest
+
+from cmv.cache import abrir_cache, chave
+from cmv.ingestao import IngestaoPlanilha
+from cmv.snapshots import carregar_snapshot, marcar_ultimo, salvar_snapshot, ultimo_snapshot
+
+CSV = (
+    'EMPRESA,NUMERO_SERVICO,FAMILIA,PREVISTO,VALORTOTALCOMPRADO,SALDO\n'
+    'E,1,F1,100,50,50\nE,1,F2,200,210,-10\nE,2,F1,300,30,270\n'
+).encode('utf-8')
+
+
+def replica(url, diretorio, gravar):
+    """Lê o upload com o cache compartilhado e, se `gravar`, publica o snapshot (processo filho)"""
+    os.environ['CMV_CACHE'] = url
+    ingestao = IngestaoPlanilha(CSV, 'exportacao.csv', cache=abrir_cache()).iniciar()
+    ingestao.aguardar()
+    if gravar:
+        meta = salvar_snapshot(ingestao.resultado(), ingestao.hash, ingestao.formato,
+                               origem='exportacao.csv', origem_mtime=1000.0, diretorio=diretorio)
+        marcar_ultimo(meta, diretorio)
+    ultimo = ultimo_snapshot(diretorio)
+    return {
+        'erro': ingestao.erro,
+        'do_cache': ingestao.do_cache,
+        'dados': ingestao.resultado(),
+        'ultimo': ultimo['hash'] if ultimo else None,
+        'por_os': carregar_snapshot(ultimo['hash'], diretorio)['particoes']['E']['por_os'] if ultimo else None,
+    }
+
+
+def gravar_e_ler(url, barreira, nome, outro):
+    """Grava chaves próprias, espera a outra réplica e lê as dela (processo filho)"""
+    cache = abrir_cache(url)
+    for i in range(50):
+        cache.guardar(chave('teste', nome, i), {'replica': nome, 'i': i})
+    barreira.wait()
+    return [cache.obter(chave('teste', outro, i)) for i in range(50)]
+
+
+@pytest.fixture
+def contexto():
+    return multiprocessing.get_context('spawn')
+
+
+@pytest.fixture
+def url_cache(request, tmp_path):
+    """URL do cache compartilhado; o redis é um fakeredis escutando em TCP neste processo"""
+    if request.param != 'redis':
+        yield {'sqlite': 'sqlite://' + str(tmp_path / 'cache.db'),
+               'arquivo': 'arquivo://' + str(tmp_path / 'cache')}[request.param]
+        return
+    from fakeredis import TcpFakeServer
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        porta = s.getsockname()[1]
+    servidor = TcpFakeServer(('127.0.0.1', porta), server_type='redis')
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield f'redis://127.0.0.1:{porta}/0'
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.mark.parametrize('url_cache', ['sqlite', 'arquivo', 'redis'], indirect=True)
+def test_segunda_replica_reaproveita_cache_e_snapshot(tmp_path, contexto, url_cache):
+    url = url_cache
+    diretorio = str(tmp_path / 'snapshots')
+
+    with contexto.Pool(1) as pool:
+        primeira = pool.apply(replica, (url, diretorio, True))
+    with contexto.Pool(1) as pool:
+        segunda = pool.apply(replica, (url, diretorio, False))
+
+    assert primeira['erro'] is None and segunda['erro'] is None
+    assert not primeira['do_cache'] and segunda['do_cache']
+    pd.testing.assert_frame_equal(primeira['dados'], segunda['dados'])
+    assert segunda['ultimo'] == primeira['ultimo'] is not None
+    pd.testing.assert_frame_equal(primeira['por_os'], segunda['por_os'])
+
+
+@pytest.mark.parametrize('url_cache', ['sqlite', 'redis'], indirect=True)
+def test_replicas_gravando_ao_mesmo_tempo(contexto, url_cache):
+    url = url_cache
+    with contexto.Manager() as manager, contexto.Pool(2) as pool:
+        barreira = manager.Barrier(2)
+        a = pool.apply_async(gravar_e_ler, (url, barreira, 'a', 'b'))
+        b = pool.apply_async(gravar_e_ler, (url, barreira, 'b', 'a'))
+        lidos_por_a, lidos_por_b = a.get(timeout=120), b.get(timeout=120)
+
+    assert lidos_por_a == [{'replica': 'b', 'i': i} for i in range(50)]
+    assert lidos_por_b == [{'replica': 'a', 'i': i} for i in range(50)]